@@ -0,0 +1,431 @@
+"""
+准入控制、请求时限与过载保护
+
+- 限流：按API密钥（RATE_LIMIT_KEY_HEADER请求头）或客户端IP的令牌桶，RATE_LIMIT为补充速率，
+  每个请求按文本长度计费（每 RATE_LIMIT_COST_CHARS 个字符多消耗一个令牌），超出时返回429。
+  令牌桶状态保存在SQLite文件中（默认位于 /dev/shm 内存文件系统），同一主机的worker共享。
+- 长文本名额：文本长度达到 ADMISSION_HEAVY_CHARS 的请求同时最多 ADMISSION_MAX_HEAVY 个（跨worker），
+  超出时返回503，避免少数超长文本占满所有worker导致所有人的p99恶化。
+- 请求时限：每个请求的截止时间为 REQUEST_TIMEOUT 秒（客户端可用 X-Request-Timeout 请求头缩短）。
+  按本进程观测到的分词速度估算耗时，预计无法在截止时间前完成的请求在分词前就返回503；
+  批量和流式分词在超过截止时间后提前结束剩余部分。
+
+所有拒绝响应都带 Retry-After 响应头。状态文件读写失败时只记录日志并放行请求。
+
+使用方法：
+from admission import setup_admission, admit, release, check_deadline, Rejected
+"""
+
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from flask import g, has_app_context
+
+import metrics
+from config import parse_rate_limit
+
+# 分词速度估算：只采样不少于该字符数的分词（短文本的耗时以固定开销为主），按指数移动平均更新
+THROUGHPUT_MIN_CHARS = 1000
+THROUGHPUT_SMOOTHING = 0.2
+
+_controller = None
+
+
+class Rejected(Exception):
+    """请求未被准入（或在截止时间前无法完成）"""
+
+    def __init__(self, status, message, retry_after=1, reason='rejected'):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.retry_after = max(1, int(math.ceil(retry_after)))
+        self.reason = reason
+
+
+class Ticket:
+    """已准入请求的截止时间和占用的长文本名额"""
+
+    __slots__ = ('deadline', 'slot_id')
+
+    def __init__(self, deadline, slot_id=None):
+        self.deadline = deadline
+        self.slot_id = slot_id
+
+
+class ThroughputEstimator:
+    """按分词模式估算本进程的分词速度（字符/秒）"""
+
+    def __init__(self):
+        self._rates = {}
+        self._lock = threading.Lock()
+
+    def observe(self, mode, chars, seconds):
+        if chars < THROUGHPUT_MIN_CHARS or seconds <= 0:
+            return
+        rate = chars / seconds
+        with self._lock:
+            previous = self._rates.get(mode)
+            self._rates[mode] = rate if previous is None else previous + THROUGHPUT_SMOOTHING * (rate - previous)
+
+    def estimate(self, work):
+        """
+        Args:
+            work (dict): {分词模式: 字符数}
+
+        Returns:
+            float: 预计分词秒数（尚无采样的模式不计入）；所有模式都没有采样时返回None
+        """
+        total = None
+        for mode, chars in work.items():
+            rate = self._rates.get(mode)
+            if rate:
+                total = (total or 0.0) + chars / rate
+        return total
+
+    def stats(self):
+        with self._lock:
+            return {mode: round(rate) for mode, rate in self._rates.items()}
+
+
+class AdmissionStore:
+    """
+    基于SQLite文件的跨进程准入状态（令牌桶和长文本名额）
+
+    每次更新在一个IMMEDIATE事务中完成读-改-写，多个worker并发时不会超发令牌。
+    每个线程持有独立连接（fork后自动重建）。
+    """
+
+    def __init__(self, path, prune_interval=1024):
+        self.path = path
+        self.prune_interval = prune_interval
+        self._local = threading.local()
+        self._updates = 0
+        self.errors = 0
+        self._init_schema()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=1, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=OFF')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        try:
+            conn = self._connect()
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS rate_bucket (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS heavy_slot (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    pid INTEGER NOT NULL,
+                    started_at REAL NOT NULL
+                )
+            ''')
+        except sqlite3.Error as e:
+            self.errors += 1
+            logging.warning(f"准入状态初始化失败 {self.path}: {e}")
+
+    def take_tokens(self, key, cost, rate, capacity):
+        """
+        从令牌桶中取出cost个令牌
+
+        Args:
+            key (str): 客户端标识
+            cost (float): 本次消耗的令牌数（不超过capacity）
+            rate (float): 每秒补充的令牌数
+            capacity (float): 桶容量
+
+        Returns:
+            float: 0表示已放行，否则为令牌足够前需要等待的秒数
+        """
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute('SELECT tokens, updated_at FROM rate_bucket WHERE key = ?', (key,)).fetchone()
+                tokens = capacity if row is None else min(capacity, row[0] + (now - row[1]) * rate)
+                if tokens >= cost:
+                    tokens -= cost
+                    wait = 0.0
+                else:
+                    wait = (cost - tokens) / rate
+                conn.execute('INSERT OR REPLACE INTO rate_bucket (key, tokens, updated_at) VALUES (?, ?, ?)',
+                             (key, tokens, now))
+                self._updates += 1
+                if self._updates % self.prune_interval == 0:
+                    # 长时间未访问的桶已经补满，删除后与不存在等价
+                    conn.execute('DELETE FROM rate_bucket WHERE updated_at < ?', (now - capacity / rate,))
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            return wait
+        except sqlite3.Error as e:
+            self.errors += 1
+            logging.warning(f"限流状态读写失败，放行请求: {e}")
+            return 0.0
+
+    def acquire_slot(self, limit, stale_after):
+        """
+        占用一个长文本名额
+
+        Args:
+            limit (int): 名额总数
+            stale_after (float): 超过该秒数的名额视为泄漏（如worker被杀死）并回收
+
+        Returns:
+            int: 名额编号；名额已满时返回None（状态读写失败时返回0表示放行）
+        """
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.execute('DELETE FROM heavy_slot WHERE started_at < ?', (now - stale_after,))
+                in_use = conn.execute('SELECT COUNT(*) FROM heavy_slot').fetchone()[0]
+                slot_id = None
+                if in_use < limit:
+                    slot_id = conn.execute('INSERT INTO heavy_slot (pid, started_at) VALUES (?, ?)',
+                                           (os.getpid(), now)).lastrowid
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            return slot_id
+        except sqlite3.Error as e:
+            self.errors += 1
+            logging.warning(f"长文本名额读写失败，放行请求: {e}")
+            return 0
+
+    def release_slot(self, slot_id):
+        """释放长文本名额"""
+        if not slot_id:
+            return
+        try:
+            self._connect().execute('DELETE FROM heavy_slot WHERE id = ?', (slot_id,))
+        except sqlite3.Error as e:
+            self.errors += 1
+            logging.warning(f"释放长文本名额失败: {e}")
+
+    def slots_in_use(self):
+        try:
+            return self._connect().execute('SELECT COUNT(*) FROM heavy_slot').fetchone()[0]
+        except sqlite3.Error:
+            return None
+
+
+class AdmissionController:
+    """按配置执行限流、长文本名额和请求时限检查"""
+
+    def __init__(self, store, rate_limit=None, burst=0, cost_chars=1000, timeout=30,
+                 heavy_chars=20000, max_heavy=0, key_header='X-API-Key'):
+        self.store = store
+        self.rate_limit = rate_limit
+        self.cost_chars = cost_chars
+        self.timeout = timeout
+        self.heavy_chars = heavy_chars
+        self.max_heavy = max_heavy
+        self.key_header = key_header
+        self.estimator = ThroughputEstimator()
+        if rate_limit is not None:
+            count, period = rate_limit
+            self.rate = count / period
+            self.capacity = float(burst or count)
+        else:
+            self.rate = self.capacity = None
+
+    def client_key(self, headers, remote_addr):
+        """客户端标识：提供了API密钥时按密钥（只保存摘要），否则按IP"""
+        api_key = headers.get(self.key_header) if self.key_header else None
+        if api_key:
+            return 'key:' + hashlib.sha1(api_key.encode('utf-8')).hexdigest()[:16]
+        return f"ip:{remote_addr or 'unknown'}"
+
+    def cost(self, chars):
+        """请求消耗的令牌数：1 + 每cost_chars个字符1个，不超过桶容量（否则永远无法通过）"""
+        return min(self.capacity, 1 + chars // self.cost_chars)
+
+    def request_timeout(self, headers):
+        """请求时限：REQUEST_TIMEOUT，客户端可通过 X-Request-Timeout 请求头缩短"""
+        timeout = self.timeout
+        requested = headers.get('X-Request-Timeout')
+        if requested:
+            try:
+                value = float(requested)
+            except ValueError:
+                value = 0
+            if value > 0:
+                timeout = min(timeout, value) if timeout else value
+        return timeout
+
+    def admit(self, headers, remote_addr, work):
+        """
+        准入检查
+
+        Args:
+            headers: 请求头
+            remote_addr (str): 客户端IP
+            work (dict): 请求的待分词字符数 {分词模式: 字符数}
+
+        Returns:
+            Ticket: 截止时间和占用的名额
+
+        Raises:
+            Rejected: 超出限流（429）、预计无法在时限内完成或长文本名额已满（503）
+        """
+        now = time.time()
+        timeout = self.request_timeout(headers)
+        deadline = now + timeout if timeout else None
+        chars = sum(work.values())
+
+        estimate = self.estimator.estimate(work)
+        if timeout and estimate is not None and estimate > timeout:
+            raise Rejected(503, f"预计处理时间 {estimate:.1f}s 超过请求时限 {timeout:g}s", timeout, 'deadline')
+
+        if self.rate is not None:
+            wait = self.store.take_tokens(self.client_key(headers, remote_addr), self.cost(chars),
+                                          self.rate, self.capacity)
+            if wait > 0:
+                raise Rejected(429, "请求过于频繁，请稍后重试", wait, 'rate_limit')
+
+        slot_id = None
+        if self.max_heavy and chars >= self.heavy_chars:
+            slot_id = self.store.acquire_slot(self.max_heavy, stale_after=max(timeout or 0, 60) * 2)
+            if slot_id is None:
+                raise Rejected(503, "长文本请求过多，请稍后重试", estimate or 1, 'heavy')
+        return Ticket(deadline, slot_id)
+
+    def release(self, ticket):
+        """请求结束后释放长文本名额"""
+        if ticket is not None and ticket.slot_id:
+            self.store.release_slot(ticket.slot_id)
+            ticket.slot_id = None
+
+    def stats(self):
+        return {
+            'rate_limit': f"{self.rate * 60:g}/minute" if self.rate is not None else None,
+            'burst': self.capacity,
+            'request_timeout': self.timeout,
+            'heavy_chars': self.heavy_chars,
+            'max_heavy': self.max_heavy,
+            'heavy_in_use': self.store.slots_in_use() if self.max_heavy else None,
+            'throughput_chars_per_sec': self.estimator.stats(),
+            'state_errors': self.store.errors
+        }
+
+
+def setup_admission(app_config):
+    """根据配置创建准入控制器"""
+    global _controller
+    store = AdmissionStore(app_config.ADMISSION_STATE_PATH)
+    _controller = AdmissionController(
+        store,
+        rate_limit=parse_rate_limit(app_config.RATE_LIMIT) if app_config.RATE_LIMIT_ENABLED else None,
+        burst=app_config.RATE_LIMIT_BURST,
+        cost_chars=app_config.RATE_LIMIT_COST_CHARS,
+        timeout=app_config.REQUEST_TIMEOUT,
+        heavy_chars=app_config.ADMISSION_HEAVY_CHARS,
+        max_heavy=app_config.ADMISSION_MAX_HEAVY,
+        key_header=app_config.RATE_LIMIT_KEY_HEADER
+    )
+    logging.info(f"准入控制 - 限流: {app_config.RATE_LIMIT if app_config.RATE_LIMIT_ENABLED else '不启用'}, "
+                 f"请求时限: {app_config.REQUEST_TIMEOUT or '不限'}s, "
+                 f"长文本名额: {app_config.ADMISSION_MAX_HEAVY or '不限'}, 状态文件: {store.path}")
+
+
+def admit(headers, remote_addr, work):
+    """
+    准入检查，通过后把截止时间记录到当前请求
+
+    Args:
+        headers: 请求头
+        remote_addr (str): 客户端IP
+        work (dict): 请求的待分词字符数 {分词模式: 字符数}
+
+    Returns:
+        Ticket: 请求结束后交给release；未初始化时返回None
+
+    Raises:
+        Rejected: 请求未被准入
+    """
+    if _controller is None:
+        return None
+    try:
+        ticket = _controller.admit(headers, remote_addr, work)
+    except Rejected as e:
+        metrics.observe_admission_rejected(e.reason)
+        raise
+    set_deadline(ticket.deadline)
+    return ticket
+
+
+def release(ticket):
+    """释放请求占用的名额"""
+    if _controller is not None:
+        _controller.release(ticket)
+
+
+def observe_throughput(mode, chars, seconds):
+    """记录一次实际分词的字符数和耗时，用于估算后续请求的耗时"""
+    if _controller is not None:
+        _controller.estimator.observe(mode, chars, seconds)
+
+
+def set_deadline(deadline):
+    """把截止时间（time.time()时间戳，None表示不限）记录到当前请求"""
+    if has_app_context():
+        g.deadline = deadline
+
+
+def get_deadline():
+    """当前请求的截止时间；不在请求上下文中或不限时返回None"""
+    if not has_app_context():
+        return None
+    return g.get('deadline')
+
+
+def deadline_passed():
+    """当前请求是否已超过截止时间"""
+    deadline = get_deadline()
+    return deadline is not None and time.time() >= deadline
+
+
+def check_deadline(work):
+    """
+    分词前检查：已超时或预计无法在截止时间前完成时提前结束
+
+    Args:
+        work (dict): 待分词字符数 {分词模式: 字符数}
+
+    Raises:
+        Rejected: 503
+    """
+    deadline = get_deadline()
+    if deadline is None or _controller is None:
+        return
+    remaining = deadline - time.time()
+    estimate = _controller.estimator.estimate(work)
+    if remaining <= 0 or (estimate is not None and estimate > remaining):
+        metrics.observe_admission_rejected('deadline')
+        raise Rejected(503, "请求无法在时限内完成", estimate or 1, 'deadline')
+
+
+def get_admission_stats():
+    """准入控制配置和状态"""
+    return _controller.stats() if _controller is not None else None
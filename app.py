@@ -8,17 +8,43 @@
 3. 调用API：POST http://localhost:5000/api/tokenize
 """
 
+import atexit
+import codecs
 import logging
 import json
 import uuid
 import time
+import threading
+import weakref
+from itertools import chain
 from functools import wraps
-from flask import Flask, request, jsonify, render_template
+from concurrent.futures import CancelledError, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from flask import (Flask, Response, g, request, jsonify, render_template, stream_with_context,
+                   has_request_context)
 from flask.views import MethodView
 from flask_cors import CORS
 import jieba
 from config import config
-from models import init_db, save_request_log, get_stats
+from models import (init_db, setup_log_writer, enqueue_request_log, get_stats, get_log_writer_stats,
+                    configure_retention, run_retention)
+from cache import (TokenCache, SharedCache, SingleFlight, CacheSnapshotter, load_snapshot, make_cache_key,
+                   key_namespace, compact_value, expand_value, locate_tokens)
+from dictionary import DictionaryManager, format_memory_usage
+from splitter import iter_segments, split_text, split_sentences
+from multicut import cut_modes
+from terms import TermFilter, TermCounter, load_stopwords
+from keywords import (IdfIndex, TEXTRANK_POS, default_idf_path, analyse_stopwords, extract_tfidf,
+                      extract_textrank)
+from tenants import TenantPool
+from formats import (MIME_MSGPACK, MIME_TOKENS, negotiate, parse_fields, wants_field, select_fields,
+                     encode_msgpack, encode_token_lists)
+import metrics
+from profiling import (stage, record_stage, get_stage_timings, format_server_timing, setup_profiling,
+                       start_profile, finish_profile)
+from workers import setup_workers, get_pool, pool_size, reset_pool, retire_pool
+from admission import (Rejected, setup_admission, admit, release, check_deadline, deadline_passed, get_deadline,
+                       observe_throughput, get_admission_stats)
 
 class RequestAdapter(logging.LoggerAdapter):
     """请求日志适配器，自动添加request_id"""
@@ -29,25 +55,40 @@ class RequestAdapter(logging.LoggerAdapter):
 
 # ===== 统一工具函数 =====
 
-# 简单内存缓存（全局变量，将在应用启动时初始化）
-_token_cache = {}
-_cache_max_size = 1000  # 默认值，将在setup_logging中更新
-_cache_hits = 0
-_cache_misses = 0
+# 分词结果缓存（LRU，容量在setup_logging中按配置调整）
+_token_cache = TokenCache(max_entries=1000)
+_shared_cache = None  # 可选的跨worker共享缓存（L2）
+_single_flight = None  # 合并并发的相同未命中，启用缓存且COALESCE_ENABLED时创建
+_snapshotter = None  # L1缓存快照，配置了CACHE_SNAPSHOT_PATH时创建
+_warmup_stats = None  # 最近一次启动预热的结果
+_sentence_min_length = 0  # 按句缓存的最小文本长度，0表示按整段文本缓存
+_compact_cache = True  # 缓存条目是否保存为紧凑格式（CACHE_COMPACT）
+_sentence_stats = {'documents': 0, 'sentences': 0, 'hits': 0}  # 按句缓存的计数（当前进程）
+
+# 多模式结果在缓存键中使用的模式名（一个条目保存 {分词模式: 分词结果}）
+MULTI_MODE_KEY = '多模式'
+# 词性标注结果（{'words': [...], 'flags': [...]}）的缓存键模式
+POS_MODE_KEY = '词性'
 _cache_enabled = True
 
-def create_response(success=True, data=None, message=None, code=200):
+# 词典管理器（当前分词器和词典版本，支持热加载），在setup_jieba中创建
+_dictionary = None
+_tenants = None  # 多词典租户池，配置了TENANT_DICTS时创建
+_stopwords = frozenset()  # 词频统计默认使用的停用词（STOPWORDS_PATH）
+_pos_taggers = weakref.WeakKeyDictionary()  # 分词器 -> 词性标注器
+_pos_taggers_lock = threading.Lock()
+_keyword_stopwords = frozenset()  # 关键词提取使用的停用词（jieba.analyse默认停用词和STOPWORDS_PATH）
+_idf_paths = {}  # 租户名（None表示默认词典） -> IDF文件路径
+_idf_cache_dir = None
+_idf_indexes = {}  # IDF文件路径 -> IdfIndex
+_idf_lock = threading.Lock()
+
+def response_envelope(success=True, data=None, message=None, code=200):
     """
-    创建统一格式的API响应
-
-    Args:
-        success (bool): 操作是否成功
-        data (any): 响应数据
-        message (str): 响应消息
-        code (int): HTTP状态码
+    构建统一格式的响应体（未编码）
 
     Returns:
-        tuple: (json_response, status_code)
+        dict: 包含success、code、timestamp以及可选的data、message
     """
     response = {
         'success': success,
@@ -61,7 +102,42 @@ def create_response(success=True, data=None, message=None, code=200):
     if message is not None:
         response['message'] = message
 
-    return jsonify(response), code
+    return response
+
+def create_response(success=True, data=None, message=None, code=200):
+    """
+    创建统一格式的API响应
+
+    Args:
+        success (bool): 操作是否成功
+        data (any): 响应数据
+        message (str): 响应消息
+        code (int): HTTP状态码
+
+    Returns:
+        tuple: (json_response, status_code)
+    """
+    response = response_envelope(success, data, message, code)
+
+    # 客户端通过Accept请求MessagePack时返回二进制编码，否则返回JSON
+    with stage('serialize'):
+        if has_request_context() and negotiate(request.accept_mimetypes) == MIME_MSGPACK:
+            return Response(encode_msgpack(response), mimetype=MIME_MSGPACK), code
+        return jsonify(response), code
+
+def create_tokens_response(token_lists, headers=None):
+    """
+    创建长度前缀二进制格式的分词结果响应（Accept: application/x-jieba-tokens）
+
+    Args:
+        token_lists (list): 分词结果列表，失败条目为None
+        headers (dict): 附加的响应头（如模式、词数）
+
+    Returns:
+        Response: 二进制响应
+    """
+    with stage('serialize'):
+        return Response(encode_token_lists(token_lists), mimetype=MIME_TOKENS, headers=headers)
 
 def create_error_response(message, code=400, details=None):
     """
@@ -82,27 +158,89 @@ def create_error_response(message, code=400, details=None):
         data={'error_details': details} if details else None
     )
 
-def get_cache_key(text, mode):
-    """生成缓存键"""
-    return f"{mode}:{hash(text)}"
+def get_cache_key(text, mode, version=None):
+    """生成缓存键（模式 + 词典版本 + 文本内容摘要），词典更新后旧版本的条目不再命中"""
+    return make_cache_key(text, mode, version)
+
+def current_dictionary(tenant=None):
+    """
+    取得分词器和词典版本（缓存命名空间）
+
+    Args:
+        tenant (str): 租户名，None表示默认词典
+
+    Returns:
+        tuple: (jieba.Tokenizer, 版本字符串)；未创建词典管理器时为 (jieba.dt, None)
+
+    Raises:
+        ValueError: 租户不存在
+    """
+    if tenant is not None:
+        if _tenants is None:
+            raise ValueError(f"未知的词典: {tenant}")
+        return _tenants.get(tenant)
+    if _dictionary is None:
+        return jieba.dt, None
+    return _dictionary.current()
+
+def dictionary_version():
+    """当前默认词典版本"""
+    return current_dictionary()[1]
+
+def is_current_version(version):
+    """词典版本（缓存命名空间）是否仍然有效，分词期间词典被重载时结果不写入缓存"""
+    if version and _tenants is not None and '@' in version:
+        return _tenants.is_current(version)
+    return dictionary_version() == version
+
+def refresh_dictionary():
+    """按检查间隔发现其他worker触发的词典重载或词典文件变化（只读取版本文件，不阻塞请求）"""
+    if _dictionary is not None:
+        _dictionary.check()
+    # 处理请求的进程才保存缓存快照（preload时主进程只做启动预热）
+    if _snapshotter is not None:
+        _snapshotter.ensure_started()
+
+def _on_dictionary_swap(old_version, new_version):
+    """
+    词典替换后：清理L1中旧版本的条目，卸载租户词典，并换用新进程池使子进程使用新词典
+
+    旧进程池执行完已提交的任务再关闭，正在使用它的请求不受影响。
+    """
+    metrics.observe_dictionary_load('default', _dictionary.load_seconds)
+    if old_version is None:
+        return
+    if _tenants is not None:
+        _tenants.clear()
+
+    def is_stale(key):
+        namespace = key_namespace(key)
+        return namespace == old_version or (namespace is not None and '@' in namespace
+                                            and not is_current_version(namespace))
+
+    removed = _token_cache.discard_if(is_stale)
+    retire_pool()
+    logging.info(f"词典版本 {old_version} -> {new_version}，已清理旧版本缓存 {removed} 条")
 
 def get_from_cache(cache_key):
-    """从缓存获取结果"""
-    global _cache_hits, _cache_misses
-    if cache_key in _token_cache:
-        _cache_hits += 1
-        return _token_cache[cache_key]
-    _cache_misses += 1
-    return None
-
-def set_cache(cache_key, tokens):
-    """设置缓存"""
-    global _cache_max_size
-    if len(_token_cache) >= _cache_max_size:
-        # 简单的LRU：删除第一个元素
-        oldest_key = next(iter(_token_cache))
-        del _token_cache[oldest_key]
-    _token_cache[cache_key] = tokens
+    """从缓存获取结果（先查进程内L1，未命中再查共享L2并回填L1；紧凑格式的条目还原为词语列表）"""
+    result = _token_cache.get(cache_key)
+    metrics.observe_cache('l1', result is not None)
+    if result is None and _shared_cache is not None:
+        result = _shared_cache.get(cache_key)
+        metrics.observe_cache('l2', result is not None)
+        if result is not None:
+            _token_cache.set(cache_key, result)
+    return expand_value(result)
+
+def set_cache(cache_key, tokens, text=None):
+    """设置缓存（同时写入L1和L2；启用CACHE_COMPACT且给出原文时保存为紧凑格式）"""
+    value = compact_value(text, tokens) if _compact_cache and text is not None else tokens
+    _token_cache.set(cache_key, value)
+    metrics.observe_cache_evictions('l1', _token_cache.evictions + _token_cache.expirations)
+    if _shared_cache is not None:
+        _shared_cache.set(cache_key, value)
+        metrics.observe_cache_evictions('l2', _shared_cache.evictions)
 
 def validate_input_text(text):
     """
@@ -153,9 +291,15 @@ def log_request_info(func):
 
         # 记录请求开始
         logging.info(f"[{request_id}] {request.method} {request.path} - 开始处理")
+        metrics.IN_FLIGHT.inc()
+        profiler = start_profile(request.headers)
 
         try:
-            result = func(*args, **kwargs)
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                if profiler is not None:
+                    finish_profile(profiler, time.time() - start_time, f"{request.path}-{request_id}")
             duration = time.time() - start_time
 
             # 记录请求完成
@@ -168,20 +312,98 @@ def log_request_info(func):
                         f"(耗时: {duration:.3f}s, 状态码: {status_code})")
 
             # 保存到数据库
+            log_start = time.perf_counter()
             try:
-                data = request.get_json(silent=True) or {}
-                mode = data.get('mode')
-                text_length = len(data.get('text', '')) if 'text' in data else None
-                save_request_log(request.path, request.method, status_code, duration, mode, text_length)
+                # 请求体不是JSON的视图（如流式接口）通过g.log_fields提供日志字段
+                log_fields = getattr(g, 'log_fields', None)
+                if log_fields is not None:
+                    mode = log_fields.get('mode')
+                    text_length = log_fields.get('text_length')
+                else:
+                    data = request.get_json(silent=True) or {}
+                    mode = data.get('mode')
+                    text_length = len(data.get('text', '')) if 'text' in data else None
+                enqueue_request_log(request.path, request.method, status_code, duration, mode, text_length)
+                metrics.observe_request(request.path, request.method, status_code, duration, mode, text_length)
             except Exception as e:
                 logging.warning(f"保存请求日志失败: {e}")
+            record_stage('log', time.perf_counter() - log_start)
 
             return result
         except Exception as e:
             duration = time.time() - start_time
             logging.error(f"[{request_id}] {request.method} {request.path} - 错误 "
                          f"(耗时: {duration:.3f}s): {str(e)}")
+            metrics.observe_request(request.path, request.method, 500, duration)
             raise
+        finally:
+            metrics.IN_FLIGHT.dec()
+
+    return wrapper
+
+def request_text_work(data):
+    """
+    JSON请求体中的待分词字符数（单条text、批量items或词频统计的texts），用于准入控制
+
+    Returns:
+        dict: {分词模式: 字符数}
+    """
+    work = {}
+    default_mode = data.get('mode', '精确')
+    modes = data.get('modes')
+    if isinstance(modes, list) and modes and isinstance(modes[0], str):
+        # 多模式请求只构建一次DAG，按一次分词估算
+        default_mode = modes[0]
+    if isinstance(data.get('text'), str) and isinstance(default_mode, str):
+        work[default_mode] = len(data['text'])
+    items = data.get('items')
+    if isinstance(items, list):
+        for item in items:
+            text, mode = (item.get('text'), item.get('mode', default_mode)) if isinstance(item, dict) \
+                else (item, default_mode)
+            if isinstance(text, str) and isinstance(mode, str):
+                work[mode] = work.get(mode, 0) + len(text)
+    texts = data.get('texts')
+    if isinstance(texts, list) and isinstance(default_mode, str):
+        chars = sum(len(text) for text in texts if isinstance(text, str))
+        work[default_mode] = work.get(default_mode, 0) + chars
+    return work
+
+def request_work():
+    """当前请求的待分词字符数 {分词模式: 字符数}（流式接口按请求体字节数估算，中文UTF-8约3字节一个字符）"""
+    if request.path == '/api/tokenize/stream':
+        return {request.args.get('mode', '精确'): (request.content_length or 0) // 3}
+    data = request.get_json(silent=True)
+    return request_text_work(data) if isinstance(data, dict) else {}
+
+def rejection_response(error):
+    """准入拒绝或无法在时限内完成的响应（429/503，带Retry-After）"""
+    response, code = create_error_response(error.message, error.status)
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, code
+
+def admission_control(func):
+    """准入控制装饰器：限流、长文本名额和请求时限（流式响应在响应结束后才释放名额）"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            with stage('admission'):
+                ticket = admit(request.headers, request.remote_addr, request_work())
+        except Rejected as e:
+            logging.info(f"[{getattr(request, 'request_id', 'unknown')}] 请求未被准入: {e.message}")
+            return rejection_response(e)
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException:
+            release(ticket)
+            raise
+        response = result[0] if isinstance(result, tuple) else result
+        if isinstance(response, Response) and response.is_streamed:
+            response.call_on_close(lambda: release(ticket))
+        else:
+            release(ticket)
+        return result
 
     return wrapper
 
@@ -220,48 +442,95 @@ def setup_logging(app_config=None):
     root_logger.setLevel(app_config.get_log_level())
 
     # 初始化缓存配置
-    global _cache_max_size, _cache_enabled
-    _cache_max_size = app_config.CACHE_MAX_SIZE
+    global _cache_enabled, _shared_cache, _single_flight, _snapshotter, _sentence_min_length, _compact_cache
     _cache_enabled = app_config.CACHE_ENABLED
+    _compact_cache = app_config.CACHE_COMPACT
+    _sentence_min_length = app_config.CACHE_SENTENCE_MIN_LENGTH if app_config.CACHE_GRANULARITY == 'sentence' else 0
+    _token_cache.configure(
+        max_entries=app_config.CACHE_MAX_SIZE,
+        max_bytes=app_config.CACHE_MAX_BYTES,
+        ttl=app_config.CACHE_TTL
+    )
+    _shared_cache = None
+    if _cache_enabled and app_config.CACHE_L2_ENABLED:
+        _shared_cache = SharedCache(
+            app_config.CACHE_L2_PATH,
+            max_entries=app_config.CACHE_L2_MAX_SIZE,
+            ttl=app_config.CACHE_L2_TTL
+        )
+        logging.info(f"共享缓存(L2)已启用: {app_config.CACHE_L2_PATH}, 最大条目: {app_config.CACHE_L2_MAX_SIZE}")
+    _single_flight = None
+    if _cache_enabled and app_config.COALESCE_ENABLED:
+        _single_flight = SingleFlight(timeout=app_config.COALESCE_TIMEOUT, shared=_shared_cache)
+    _snapshotter = None
+    if _cache_enabled and app_config.CACHE_SNAPSHOT_PATH:
+        _snapshotter = CacheSnapshotter(
+            _token_cache,
+            app_config.CACHE_SNAPSHOT_PATH,
+            dictionary_version,
+            interval=app_config.CACHE_SNAPSHOT_INTERVAL,
+            max_entries=app_config.CACHE_SNAPSHOT_MAX_ENTRIES
+        )
 
     logging.info(f"日志系统初始化完成，级别: {app_config.LOG_LEVEL}")
-    logging.info(f"缓存配置 - 启用: {_cache_enabled}, 最大大小: {_cache_max_size}")
+    logging.info(f"缓存配置 - 启用: {_cache_enabled}, 最大条目: {app_config.CACHE_MAX_SIZE}, "
+                 f"内存预算: {app_config.CACHE_MAX_BYTES or '不限'}, 过期时间: {app_config.CACHE_TTL or '不过期'}, "
+                 f"粒度: {app_config.CACHE_GRANULARITY}, 紧凑存储: {_compact_cache}")
 
 # 初始化jieba（优化版）
 def setup_jieba(app_config=None):
-    """初始化jieba分词器"""
+    """初始化jieba分词器（立即加载词典，并记录冷启动耗时和内存占用）"""
     if app_config is None:
         from config import get_config
         app_config = get_config()
 
-    # 加载自定义词典（如果配置了）
-    if app_config.JIEBA_DICT_PATH:
-        try:
-            jieba.set_dictionary(app_config.JIEBA_DICT_PATH)
-            logging.info(f"已加载自定义词典: {app_config.JIEBA_DICT_PATH}")
-        except Exception as e:
-            logging.warning(f"加载自定义词典失败: {e}")
+    global _dictionary
+    start_time = time.time()
+    cache_dir = app_config.JIEBA_CACHE_DIR if app_config.JIEBA_PRECOMPILE else None
+    _dictionary = DictionaryManager(
+        app_config.JIEBA_DICT_PATH,
+        app_config.JIEBA_USER_DICT_PATH,
+        cache_dir=cache_dir,
+        version_file=app_config.DICT_VERSION_FILE,
+        check_interval=app_config.DICT_CHECK_INTERVAL,
+        watch_files=app_config.DICT_WATCH_FILES
+    )
+    _dictionary.add_listener(_on_dictionary_swap)
 
-    # 加载用户词典（如果配置了）
-    if app_config.JIEBA_USER_DICT_PATH:
-        try:
-            jieba.load_userdict(app_config.JIEBA_USER_DICT_PATH)
+    global _tenants
+    _tenants = None
+    if app_config.TENANT_DICTS:
+        _tenants = TenantPool(_dictionary, app_config.TENANT_DICTS, max_bytes=app_config.TENANT_MAX_MEMORY)
+        _tenants.add_listener(metrics.observe_dictionary_load)
+        logging.info(f"多词典租户: {', '.join(_tenants.names())}（首次使用时加载）, "
+                     f"内存上限: {app_config.TENANT_MAX_MEMORY or '不限'}")
+
+    # 加载自定义词典和用户词典（如果配置了），优先使用预编译词典文件
+    try:
+        _dictionary.load(tokenizer=jieba.dt)
+        if app_config.JIEBA_DICT_PATH:
+            logging.info(f"已加载自定义词典: {app_config.JIEBA_DICT_PATH}")
+        if app_config.JIEBA_USER_DICT_PATH:
             logging.info(f"已加载用户词典: {app_config.JIEBA_USER_DICT_PATH}")
-        except Exception as e:
-            logging.warning(f"加载用户词典失败: {e}")
+    except Exception as e:
+        logging.warning(f"加载自定义词典失败: {e}")
+        if not jieba.dt.initialized:
+            jieba.dt.dictionary = jieba.DEFAULT_DICT
+            jieba.dt.initialize()
+        _dictionary = None
 
-    # 预热jieba（提高首次分词性能）
+    # 预热jieba（消费生成器，确保各分词路径已实际执行）
     try:
-        jieba.cut("预热", cut_all=False)
-        jieba.cut("预热", cut_all=True)  # 全模式预热
-        jieba.cut_for_search("预热")
-        logging.info("jieba分词器初始化完成并已预热")
+        for mode in app_config.TOKENIZE_MODES:
+            cut_text("预热", mode)
+        logging.info(f"jieba分词器初始化完成并已预热，词典版本: {dictionary_version()}, "
+                     f"耗时: {time.time() - start_time:.3f}s, 内存: {format_memory_usage()}")
     except Exception as e:
         logging.error(f"jieba预热失败: {e}")
 
 
 # 分词核心函数（优化版）
-def jieba_tokenize(text, mode='精确', use_cache=True):
+def jieba_tokenize(text, mode='精确', use_cache=True, parallel=False, tenant=None):
     """
     使用jieba进行中文分词（支持缓存和输入验证）
 
@@ -269,63 +538,1351 @@ def jieba_tokenize(text, mode='精确', use_cache=True):
         text (str): 待分词文本
         mode (str): 分词模式 ('精确', '全模式', '搜索引擎')
         use_cache (bool): 是否使用缓存
+        parallel (bool): 文本长度达到PARALLEL_MIN_LENGTH时是否切段并行分词（仅默认词典）
+        tenant (str): 租户名，None表示默认词典
 
     Returns:
         list: 分词结果列表
 
     Raises:
-        ValueError: 输入验证失败或分词模式不支持
+        ValueError: 输入验证失败、分词模式不支持或租户不存在
+    """
+    text, tokenizer, version, cache_key, cached_result = prepare_tokenize(text, mode, use_cache, tenant)
+    if cached_result is not None:
+        return cached_result
+
+    return coalesced_cut(text, mode, tokenizer, version, cache_key, parallel, tenant)
+
+def prepare_tokenize(text, mode, use_cache=True, tenant=None):
+    """
+    分词前的准备：输入验证、取得分词器和词典版本、查询缓存
+
+    Args:
+        text (str): 待分词文本
+        mode (str): 分词模式
+        use_cache (bool): 是否使用缓存
+        tenant (str): 租户名，None表示默认词典
+
+    Returns:
+        tuple: (去除首尾空白的文本, 分词器, 词典版本, 缓存键, 缓存结果)；
+               不使用缓存时缓存键为None，未命中时缓存结果为None
+
+    Raises:
+        ValueError: 输入验证失败、分词模式不支持或租户不存在
     """
+    from config import get_config
+    # 先检查模式再生成缓存键，客户端传入的任意模式不会进入缓存的按模式统计
+    if mode not in (MULTI_MODE_KEY, POS_MODE_KEY) and (
+            not isinstance(mode, str) or mode not in get_config().TOKENIZE_MODES):
+        raise ValueError(f"不支持的分词模式: {mode}")
+
     # 输入验证
-    is_valid, error_msg = validate_input_text(text)
+    with stage('validate'):
+        is_valid, error_msg = validate_input_text(text)
     if not is_valid:
         raise ValueError(error_msg)
 
     # 去除首尾空白字符
     text = text.strip()
 
-    # 缓存检查
+    # 同时取得分词器和词典版本，词典在处理过程中被替换也不影响本次请求
+    tokenizer, version = current_dictionary(tenant)
+
+    # 缓存检查（按句缓存的长文本在分词阶段逐句查询，整段的缓存键只用于合并并发请求）
+    cache_key = None
+    cached_result = None
     if use_cache and _cache_enabled:
-        cache_key = get_cache_key(text, mode)
-        cached_result = get_from_cache(cache_key)
+        with stage('cache_get'):
+            cache_key = get_cache_key(text, mode, version)
+            if not is_sentence_cached(text, mode):
+                cached_result = get_from_cache(cache_key)
         if cached_result is not None:
             logging.debug(f"缓存命中: {cache_key}")
-            return cached_result
+    return text, tokenizer, version, cache_key, cached_result
+
+def cut_tokens(text, mode, tokenizer, parallel=False, tenant=None):
+    """
+    执行分词并上报分词指标（CPU密集，可在线程池中执行）
+
+    Args:
+        text (str): prepare_tokenize返回的文本
+        mode (str): 分词模式
+        tokenizer (jieba.Tokenizer): prepare_tokenize返回的分词器
+        parallel (bool): 是否允许切段并行分词
+        tenant (str): 租户名，None表示默认词典
+
+    Returns:
+        list: 分词结果列表
+
+    Raises:
+        ValueError: 分词模式不支持
+        Rejected: 无法在请求截止时间前完成
+    """
+    from config import get_config
+    # 已超过请求截止时间或预计无法按时完成时不再分词
+    check_deadline({mode: len(text)})
+
+    # 进程池子进程只加载默认词典，租户请求在当前进程内分词
+    cut_start = time.perf_counter()
+    if parallel and tenant is None and len(text) >= get_config().PARALLEL_MIN_LENGTH:
+        tokens = cut_text_parallel(text, mode)
+    else:
+        tokens = cut_text(text, mode, tokenizer)
+    seconds = time.perf_counter() - cut_start
+    metrics.observe_tokenize(mode, len(tokens), len(text), seconds)
+    observe_throughput(mode, len(text), seconds)
+    return tokens
+
+def store_tokens(cache_key, version, tokens, text=None):
+    """写入缓存（未使用缓存或处理期间词典已更新时不写入，避免旧结果进入新版本的缓存）"""
+    if cache_key is not None and _cache_enabled and tokens and is_current_version(version):
+        with stage('cache_set'):
+            set_cache(cache_key, tokens, text)
+        logging.debug(f"缓存设置: {cache_key}")
+
+def cut_and_store(text, mode, tokenizer, version, cache_key, parallel=False, tenant=None):
+    """分词并写入缓存（按句缓存的长文本只对未命中的句子分词）"""
+    if cache_key is not None and is_sentence_cached(text, mode):
+        return cut_sentences(text, mode, tokenizer, version, parallel, tenant)
+    tokens = cut_tokens(text, mode, tokenizer, parallel, tenant)
+    store_tokens(cache_key, version, tokens, text)
+    return tokens
+
+def is_sentence_cached(text, mode):
+    """文本是否按句缓存（CACHE_GRANULARITY=sentence且长度达到CACHE_SENTENCE_MIN_LENGTH，多模式结果按整段缓存）"""
+    return (bool(_sentence_min_length) and len(text) >= _sentence_min_length
+            and mode not in (MULTI_MODE_KEY, POS_MODE_KEY))
+
+def cut_sentences(text, mode, tokenizer, version, parallel=False, tenant=None):
+    """
+    句级缓存：在句子边界切分（各句分词结果拼接后与整段分词一致），逐句查询缓存，
+    只对未命中的句子分词并按句写入缓存。模板化通知、重复抓取的网页等只有少数句子不同的文档大部分可以命中。
+
+    Args:
+        text (str): 待分词文本
+        mode (str): 分词模式
+        tokenizer (jieba.Tokenizer): 分词器
+        version (str): 词典版本
+        parallel (bool): 未命中的句子足够多时是否使用进程池（仅默认词典）
+        tenant (str): 租户名，None表示默认词典
+
+    Returns:
+        list: 分词结果列表
+
+    Raises:
+        ValueError: 分词模式不支持
+        Rejected: 无法在请求截止时间前完成
+    """
+    sentences = split_sentences(text)
+    keys = [get_cache_key(sentence, mode, version) for sentence in sentences]
+    found = {}
+    with stage('cache_get'):
+        for key in keys:
+            if key not in found:
+                found[key] = get_from_cache(key)
+    misses = {}
+    for sentence, key in zip(sentences, keys):
+        if found[key] is None and key not in misses:
+            misses[key] = sentence
+    _sentence_stats['documents'] += 1
+    _sentence_stats['sentences'] += len(found)
+    _sentence_stats['hits'] += len(found) - len(misses)
+
+    if misses:
+        pairs = [(sentence, mode) for sentence in misses.values()]
+        check_deadline({mode: sum(len(sentence) for sentence in misses.values())})
+        cut_start = time.perf_counter()
+        outcomes = _cut_misses(pairs, tokenizer, use_pool=parallel and tenant is None)
+        _observe_batch_tokenize(pairs, outcomes, time.perf_counter() - cut_start)
+        for key, (tokens, error) in zip(misses, outcomes):
+            if error is not None:
+                if deadline_passed():
+                    metrics.observe_admission_rejected('deadline')
+                    raise Rejected(503, "请求无法在时限内完成", 1, 'deadline')
+                raise ValueError(error)
+            found[key] = tokens
+            store_tokens(key, version, tokens, misses[key])
+    return list(chain.from_iterable(found[key] for key in keys))
+
+def flight_timeout():
+    """等待其他请求分词结果的时限：COALESCE_TIMEOUT，且不超过本请求的剩余时间"""
+    timeout = _single_flight.timeout
+    deadline = get_deadline()
+    if deadline is not None:
+        timeout = min(timeout, max(0.0, deadline - time.time()))
+    return timeout
+
+def join_flight(cache_key):
+    """
+    未命中缓存时加入该缓存键的分词
+
+    Returns:
+        tuple: (Future, 是否为leader)；未启用合并或不使用缓存时为 (None, True)
+    """
+    if cache_key is None or _single_flight is None:
+        return None, True
+    return _single_flight.join(cache_key)
+
+def wait_flight(future):
+    """
+    follower等待同进程leader的分词结果
+
+    Returns:
+        list: 分词结果；超时或leader失败时返回None（调用者自行分词）
+    """
+    with stage('coalesce_wait'):
+        tokens = _single_flight.wait(future, flight_timeout())
+    metrics.observe_coalesced('local' if tokens is not None else 'fallback')
+    return tokens
+
+async def wait_flight_async(future):
+    """wait_flight的异步版本（ASGI模式在事件循环上等待）"""
+    with stage('coalesce_wait'):
+        tokens = await _single_flight.wait_async(future, flight_timeout())
+    metrics.observe_coalesced('local' if tokens is not None else 'fallback')
+    return tokens
+
+def lead_flight(future, text, mode, tokenizer, version, cache_key, parallel=False, tenant=None):
+    """
+    leader：其他worker正在分词同一缓存键时等待其写入共享缓存的结果，否则分词并写入缓存；
+    结束后唤醒本进程中等待的请求（失败时等待者各自分词）
+
+    Returns:
+        list: 分词结果
+    """
+    if future is None:
+        return cut_and_store(text, mode, tokenizer, version, cache_key, parallel, tenant)
+    try:
+        tokens = None
+        leased = _single_flight.acquire_lease(cache_key)
+        if not leased:
+            with stage('coalesce_wait'):
+                value = _single_flight.wait_shared(cache_key, flight_timeout())
+            metrics.observe_coalesced('shared' if value is not None else 'fallback')
+            if value is not None:
+                _token_cache.set(cache_key, value)
+                tokens = expand_value(value)
+        if tokens is None:
+            try:
+                tokens = cut_and_store(text, mode, tokenizer, version, cache_key, parallel, tenant)
+            finally:
+                # 结果写入共享缓存之后才释放租约，轮询的worker不会错过结果
+                if leased:
+                    _single_flight.release_lease(cache_key)
+    except BaseException as e:
+        _single_flight.finish(cache_key, future, error=e)
+        raise
+    _single_flight.finish(cache_key, future, tokens)
+    return tokens
+
+def abandon_flight(cache_key, future, error):
+    """leader未能执行分词（如排队已满、客户端断开）时唤醒等待者，由它们各自分词"""
+    if future is not None:
+        _single_flight.finish(cache_key, future, error=error)
+
+def coalesced_cut(text, mode, tokenizer, version, cache_key, parallel=False, tenant=None):
+    """
+    未命中缓存时分词并写入缓存；同一文本、模式和词典的并发请求只分词一次，其余请求等待结果
+
+    Returns:
+        list: 分词结果列表
+    """
+    future, leader = join_flight(cache_key)
+    if not leader:
+        tokens = wait_flight(future)
+        if tokens is not None:
+            return tokens
+        return cut_and_store(text, mode, tokenizer, version, cache_key, parallel, tenant)
+    return lead_flight(future, text, mode, tokenizer, version, cache_key, parallel, tenant)
+
+def cut_text(text, mode, tokenizer=None):
+    """
+    按模式执行分词并过滤空白词（不做输入验证和缓存，可在进程池中执行）
+
+    Args:
+        text (str): 已验证并去除首尾空白的文本
+        mode (str): 分词模式 ('精确', '全模式', '搜索引擎')
+        tokenizer (jieba.Tokenizer): 使用的分词器，None表示当前词典的分词器
+
+    Returns:
+        list: 分词结果列表
 
+    Raises:
+        ValueError: 分词模式不支持
+    """
+    if tokenizer is None:
+        tokenizer = current_dictionary()[0]
     mode_mapping = {
-        '精确': jieba.cut,
-        '全模式': lambda text: jieba.cut(text, cut_all=True),
-        '搜索引擎': jieba.cut_for_search
+        '精确': tokenizer.cut,
+        '全模式': lambda text: tokenizer.cut(text, cut_all=True),
+        '搜索引擎': tokenizer.cut_for_search
     }
 
     if mode not in mode_mapping:
         raise ValueError(f"不支持的分词模式: {mode}")
 
-    # 执行分词
     cut_func = mode_mapping[mode]
+    start = time.perf_counter()
     tokens = list(cut_func(text))
+    filter_start = time.perf_counter()
 
     # 过滤空白字符
-    tokens = [token.strip() for token in tokens if token.strip()]
+    result = [token.strip() for token in tokens if token.strip()]
+    record_stage('cut', filter_start - start)
+    record_stage('filter', time.perf_counter() - filter_start)
+    return result
 
-    # 设置缓存
-    if use_cache and _cache_enabled and tokens:
-        set_cache(cache_key, tokens)
-        logging.debug(f"缓存设置: {cache_key}")
+def cut_text_modes(text, modes, tokenizer=None):
+    """
+    一次分词计算多个模式并过滤空白词（每个词块只构建一次DAG，搜索引擎模式由精确模式派生）
 
-    return tokens
+    Args:
+        text (str): 已验证并去除首尾空白的文本
+        modes (list): 分词模式列表
+        tokenizer (jieba.Tokenizer): 使用的分词器，None表示当前词典的分词器
+
+    Returns:
+        dict: {分词模式: 分词结果列表}
+    """
+    if tokenizer is None:
+        tokenizer = current_dictionary()[0]
+    start = time.perf_counter()
+    raw = cut_modes(text, modes, tokenizer)
+    filter_start = time.perf_counter()
+    results = {mode: [token.strip() for token in tokens if token.strip()] for mode, tokens in raw.items()}
+    record_stage('cut', filter_start - start)
+    record_stage('filter', time.perf_counter() - filter_start)
+    return results
+
+def jieba_tokenize_modes(text, modes, use_cache=True, tenant=None):
+    """
+    同一文本的多个分词模式（一次分词，结果作为一个缓存条目按模式保存）
+
+    缓存条目缺少部分模式时只计算缺少的模式并合并回条目。
+
+    Args:
+        text (str): 待分词文本
+        modes (list): 分词模式列表（已去重）
+        use_cache (bool): 是否使用缓存
+        tenant (str): 租户名，None表示默认词典
+
+    Returns:
+        dict: {分词模式: 分词结果列表}，按modes的顺序
+
+    Raises:
+        ValueError: 输入验证失败、分词模式不支持或租户不存在
+        Rejected: 无法在请求截止时间前完成
+    """
+    from config import get_config
+    supported = get_config().TOKENIZE_MODES
+    for mode in modes:
+        if mode not in supported:
+            raise ValueError(f"不支持的分词模式: {mode}")
+
+    text, tokenizer, version, cache_key, entry = prepare_tokenize(text, MULTI_MODE_KEY, use_cache, tenant)
+    entry = entry or {}
+    missing = [mode for mode in modes if mode not in entry]
+    if missing:
+        check_deadline({missing[0]: len(text)})
+        cut_start = time.perf_counter()
+        computed = cut_text_modes(text, missing, tokenizer)
+        seconds = time.perf_counter() - cut_start
+        for mode, tokens in computed.items():
+            metrics.observe_tokenize(mode, len(tokens), len(text), seconds / len(computed))
+        entry = dict(entry, **computed)
+        store_tokens(cache_key, version, entry, text)
+    return {mode: entry[mode] for mode in modes}
+
+def cut_text_parallel(text, mode):
+    """
+    把长文本在安全边界切段，交给进程池并行分词后按顺序拼接
+
+    切分点只选在jieba独立处理的字符块交界处，结果与cut_text完全一致；
+    未启用进程池或文本无法切分时退回串行分词。
+
+    Args:
+        text (str): 已验证并去除首尾空白的文本
+        mode (str): 分词模式
+
+    Returns:
+        list: 分词结果列表
+
+    Raises:
+        ValueError: 分词模式不支持
+    """
+    from config import get_config
+    app_config = get_config()
+    if mode not in app_config.TOKENIZE_MODES:
+        raise ValueError(f"不支持的分词模式: {mode}")
+
+    pool = get_pool()
+    if pool is None:
+        return cut_text(text, mode)
+
+    # 每个子进程分到约两段，段长不低于PARALLEL_MIN_PIECE_LENGTH以摊薄进程间通信开销
+    piece_length = max(app_config.PARALLEL_MIN_PIECE_LENGTH, -(-len(text) // (pool_size() * 2)))
+    pieces = split_text(text, piece_length)
+    if len(pieces) < 2:
+        return cut_text(text, mode)
+
+    try:
+        futures = [pool.submit(cut_text, piece, mode) for piece in pieces]
+        tokens = []
+        for future in futures:
+            tokens.extend(future.result())
+        return tokens
+    except (RuntimeError, CancelledError) as e:
+        # 子进程异常退出（BrokenProcessPool），或取得的进程池已因词典热加载被替换而不再接受任务
+        logging.warning(f"分词进程池不可用，改为串行分词: {e}")
+        if isinstance(e, BrokenProcessPool):
+            reset_pool()
+        return cut_text(text, mode)
+
+def cut_text_batch(pairs, tokenizer=None):
+    """
+    对一组 (text, mode) 逐条分词，单条失败不影响其他条目（进程池任务单元）
+
+    Args:
+        pairs (list): [(text, mode), ...]
+        tokenizer (jieba.Tokenizer): 使用的分词器，None表示当前词典的分词器
+
+    Returns:
+        list: [(tokens, error_message), ...]，与输入顺序一致
+    """
+    if tokenizer is None:
+        tokenizer = current_dictionary()[0]
+    results = []
+    for text, mode in pairs:
+        # 超过请求截止时间后剩余条目不再分词（进程池子进程中没有请求上下文，不做检查）
+        if deadline_passed():
+            results.append((None, "超过请求时限，未处理"))
+            continue
+        try:
+            results.append((cut_text(text, mode, tokenizer), None))
+        except ValueError as e:
+            results.append((None, str(e)))
+    return results
+
+def _cut_misses(pairs, tokenizer=None, use_pool=True):
+    """对缓存未命中的条目分词，条目足够多且启用进程池时分块并行执行"""
+    from config import get_config
+    pool = get_pool() if use_pool else None
+    if pool is None or len(pairs) < get_config().BATCH_POOL_MIN_ITEMS:
+        return cut_text_batch(pairs, tokenizer)
+
+    # 每个子进程分到若干块，减少进程间通信次数
+    chunk_size = max(1, -(-len(pairs) // (pool_size() * 4)))
+    chunks = [pairs[i:i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    try:
+        futures = [pool.submit(cut_text_batch, chunk) for chunk in chunks]
+        results = []
+        for future in futures:
+            results.extend(future.result())
+        return results
+    except (RuntimeError, CancelledError) as e:
+        # 子进程异常退出（BrokenProcessPool），或取得的进程池已因词典热加载被替换而不再接受任务
+        logging.warning(f"分词进程池不可用，改为进程内分词: {e}")
+        if isinstance(e, BrokenProcessPool):
+            reset_pool()
+        return cut_text_batch(pairs, tokenizer)
+
+def _observe_batch_tokenize(pairs, outcomes, seconds):
+    """按模式汇总批量分词的词数和字符数，耗时按字符数比例分摊到各模式"""
+    totals = {}  # mode -> [词数, 字符数]
+    for (text, mode), (tokens, _) in zip(pairs, outcomes):
+        if tokens is not None:
+            counts = totals.setdefault(mode, [0, 0])
+            counts[0] += len(tokens)
+            counts[1] += len(text)
+    total_chars = sum(chars for _, chars in totals.values()) or 1
+    for mode, (token_count, char_count) in totals.items():
+        mode_seconds = seconds * char_count / total_chars
+        metrics.observe_tokenize(mode, token_count, char_count, mode_seconds)
+        observe_throughput(mode, char_count, mode_seconds)
+
+class BatchPlan:
+    """批量分词的中间状态：已确定的结果、去重后的条目和缓存未命中的条目"""
+
+    __slots__ = ('results', 'unique', 'resolved', 'misses', 'tokenizer', 'version', 'use_cache', 'tenant')
+
+    def __init__(self, size, tokenizer, version, use_cache, tenant):
+        self.results = [None] * size
+        self.unique = {}  # (text, mode) -> 输入下标列表
+        self.resolved = {}  # (text, mode) -> (tokens, error_message)
+        self.misses = []
+        self.tokenizer = tokenizer
+        self.version = version
+        self.use_cache = use_cache
+        self.tenant = tenant
+
+    @property
+    def miss_chars(self):
+        """缓存未命中条目的总字符数"""
+        return sum(len(text) for text, _ in self.misses)
+
+def jieba_tokenize_batch(items, use_cache=True, tenant=None):
+    """
+    批量分词：合并重复条目，每个唯一条目只查询一次缓存，未命中的交给进程池
+
+    Args:
+        items (list): [(text, mode), ...]
+        use_cache (bool): 是否使用缓存
+        tenant (str): 租户名，None表示默认词典（租户条目不使用进程池）
+
+    Returns:
+        list: 与输入顺序一致的 (tokens, error_message) 列表
+
+    Raises:
+        ValueError: 租户不存在
+    """
+    plan = plan_batch(items, use_cache, tenant)
+    return complete_batch(plan, cut_batch(plan))
+
+def plan_batch(items, use_cache=True, tenant=None):
+    """
+    批量分词的准备：逐条验证、合并重复条目并查询缓存
+
+    Args:
+        items (list): [(text, mode), ...]
+        use_cache (bool): 是否使用缓存
+        tenant (str): 租户名，None表示默认词典
+
+    Returns:
+        BatchPlan: 中间状态，未命中条目在misses中
+
+    Raises:
+        ValueError: 租户不存在
+    """
+    from config import get_config
+    supported = get_config().TOKENIZE_MODES
+    tokenizer, version = current_dictionary(tenant)
+    plan = BatchPlan(len(items), tokenizer, version, use_cache and _cache_enabled, tenant)
+
+    validate_start = time.perf_counter()
+    for index, (text, mode) in enumerate(items):
+        # 模式来自客户端输入，可能不是字符串，先检查再作为去重和缓存的键
+        if not isinstance(mode, str) or mode not in supported:
+            plan.results[index] = (None, f"不支持的分词模式: {mode}")
+            continue
+        is_valid, error_msg = validate_input_text(text)
+        if not is_valid:
+            plan.results[index] = (None, error_msg)
+            continue
+        plan.unique.setdefault((text.strip(), mode), []).append(index)
+    record_stage('validate', time.perf_counter() - validate_start)
+
+    cache_start = time.perf_counter()
+    for key in plan.unique:
+        text, mode = key
+        if plan.use_cache:
+            cached_result = get_from_cache(get_cache_key(text, mode, version))
+            if cached_result is not None:
+                plan.resolved[key] = (cached_result, None)
+                continue
+        plan.misses.append(key)
+    record_stage('cache_get', time.perf_counter() - cache_start)
+    return plan
+
+def cut_batch(plan):
+    """
+    对批量请求中缓存未命中的条目分词（CPU密集，可在线程池中执行）
+
+    Returns:
+        list: 与plan.misses顺序一致的 (tokens, error_message) 列表
+
+    Raises:
+        Rejected: 无法在请求截止时间前完成
+    """
+    if not plan.misses:
+        return []
+    work = {}
+    for text, mode in plan.misses:
+        work[mode] = work.get(mode, 0) + len(text)
+    check_deadline(work)
+    cut_start = time.perf_counter()
+    outcomes = _cut_misses(plan.misses, plan.tokenizer, use_pool=plan.tenant is None)
+    _observe_batch_tokenize(plan.misses, outcomes, time.perf_counter() - cut_start)
+    return outcomes
+
+def complete_batch(plan, outcomes):
+    """
+    写入新分词结果的缓存，并按输入顺序展开结果
+
+    Returns:
+        list: 与输入顺序一致的 (tokens, error_message) 列表
+    """
+    if plan.misses:
+        cacheable = plan.use_cache and is_current_version(plan.version)
+        with stage('cache_set'):
+            for key, outcome in zip(plan.misses, outcomes):
+                plan.resolved[key] = outcome
+                tokens = outcome[0]
+                if cacheable and tokens:
+                    set_cache(get_cache_key(*key, plan.version), tokens, key[0])
+
+    results = plan.results
+    for key, indexes in plan.unique.items():
+        for index in indexes:
+            results[index] = plan.resolved[key]
+
+    return results
+
+def setup_terms(app_config):
+    """加载词频统计默认使用的停用词（STOPWORDS_PATH）"""
+    global _stopwords
+    _stopwords = load_stopwords(app_config.STOPWORDS_PATH)
+
+def default_stopwords():
+    """STOPWORDS_PATH 配置的停用词"""
+    return _stopwords
+
+def _pos_tagger(tokenizer):
+    """取得分词器对应的词性标注器（构建时要读取一遍词典文件，按分词器缓存）"""
+    tagger = _pos_taggers.get(tokenizer)
+    if tagger is None:
+        from jieba import posseg
+        with _pos_taggers_lock:
+            tagger = _pos_taggers.get(tokenizer)
+            if tagger is None:
+                tagger = _pos_taggers[tokenizer] = posseg.POSTokenizer(tokenizer)
+    return tagger
+
+def term_words(text, mode, term_filter, tokenizer=None):
+    """
+    分词并按条件过滤出参与词频统计的词
+
+    按词性过滤时使用jieba.posseg标注词性（精确模式，未登录词的切分可能与不标注词性时略有不同）。
+
+    Args:
+        text (str): 已验证并去除首尾空白的文本
+        mode (str): 分词模式
+        term_filter (TermFilter): 过滤条件
+        tokenizer (jieba.Tokenizer): 使用的分词器，None表示当前词典的分词器
+
+    Returns:
+        list: 过滤后的词
+    """
+    if tokenizer is None:
+        tokenizer = current_dictionary()[0]
+    if term_filter.pos is None:
+        accepts = term_filter.accepts
+        return [word for word in cut_text(text, mode, tokenizer) if accepts(word)]
+    words = []
+    for pair in _pos_tagger(tokenizer).cut(text):
+        word = pair.word.strip()
+        if word and term_filter.accepts(word, pair.flag):
+            words.append(word)
+    return words
+
+def count_terms_chunk(items, mode, term_filter, tokenizer=None):
+    """
+    统计一组文本的词频（进程池任务单元，只返回计数而不是词语列表）
+
+    Args:
+        items (list): [(text, 出现次数), ...]
+        mode (str): 分词模式
+        term_filter (TermFilter): 过滤条件
+        tokenizer (jieba.Tokenizer): 使用的分词器，None表示当前词典的分词器
+
+    Returns:
+        TermCounter: 词频计数
+    """
+    counter = TermCounter()
+    for text, weight in items:
+        counter.add(term_words(text, mode, term_filter, tokenizer), weight)
+    return counter
+
+def _count_misses(items, mode, term_filter, tokenizer=None, use_pool=True):
+    """统计缓存未命中的文本，条目足够多且启用进程池时分块并行，各块的计数完成一个合并一个"""
+    from config import get_config
+    pool = get_pool() if use_pool else None
+    if pool is None or len(items) < get_config().BATCH_POOL_MIN_ITEMS:
+        return count_terms_chunk(items, mode, term_filter, tokenizer)
+
+    chunk_size = max(1, -(-len(items) // (pool_size() * 4)))
+    chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+    counter = TermCounter()
+    try:
+        futures = [pool.submit(count_terms_chunk, chunk, mode, term_filter) for chunk in chunks]
+        for future in as_completed(futures):
+            counter.merge(future.result())
+        return counter
+    except (RuntimeError, CancelledError) as e:
+        # 子进程异常退出（BrokenProcessPool），或取得的进程池已因词典热加载被替换而不再接受任务
+        logging.warning(f"分词进程池不可用，改为进程内统计词频: {e}")
+        if isinstance(e, BrokenProcessPool):
+            reset_pool()
+        return count_terms_chunk(items, mode, term_filter, tokenizer)
+
+def aggregate_terms(texts, mode, term_filter, use_cache=True, tenant=None):
+    """
+    词频统计：分词后只累计词频，不返回各文本的词语列表
+
+    相同文本只分词一次；不按词性过滤时先用缓存中的分词结果计数，未命中的文本交给进程池，
+    子进程只返回计数表。未命中文本的分词结果不写入缓存。
+
+    Args:
+        texts (list): 文本列表
+        mode (str): 分词模式
+        term_filter (TermFilter): 过滤条件
+        use_cache (bool): 是否使用缓存
+        tenant (str): 租户名，None表示默认词典（租户请求不使用进程池）
+
+    Returns:
+        tuple: (TermCounter, 无法处理的文本数)
+
+    Raises:
+        ValueError: 分词模式不支持或租户不存在
+        Rejected: 无法在请求截止时间前完成
+    """
+    from config import get_config
+    if mode not in get_config().TOKENIZE_MODES:
+        raise ValueError(f"不支持的分词模式: {mode}")
+    tokenizer, version = current_dictionary(tenant)
+
+    with stage('validate'):
+        unique = {}  # 文本 -> 出现次数
+        failed = 0
+        for text in texts:
+            is_valid, _ = validate_input_text(text)
+            if not is_valid:
+                failed += 1
+                continue
+            text = text.strip()
+            unique[text] = unique.get(text, 0) + 1
+
+    counter = TermCounter()
+    misses = []
+    with stage('cache_get'):
+        for text, weight in unique.items():
+            tokens = None
+            if use_cache and _cache_enabled and term_filter.pos is None:
+                tokens = get_from_cache(get_cache_key(text, mode, version))
+            if tokens is None:
+                misses.append((text, weight))
+            else:
+                counter.add([word for word in tokens if term_filter.accepts(word)], weight)
+
+    if misses:
+        check_deadline({mode: sum(len(text) for text, _ in misses)})
+        counter.merge(_count_misses(misses, mode, term_filter, tokenizer, use_pool=tenant is None))
+    return counter, failed
+
+def setup_keywords(app_config):
+    """配置关键词提取的IDF文件，并在fork worker之前编译和打开默认IDF表"""
+    global _keyword_stopwords, _idf_cache_dir
+    _keyword_stopwords = analyse_stopwords() | default_stopwords()
+    _idf_cache_dir = app_config.JIEBA_CACHE_DIR
+    _idf_paths.clear()
+    _idf_paths[None] = app_config.KEYWORDS_IDF_PATH or default_idf_path()
+    _idf_paths.update(app_config.TENANT_IDF)
+    _idf_indexes.clear()
+    try:
+        index = idf_index()
+        logging.info(f"IDF表已加载: {index.path}, 词条: {len(index)}, 编译文件: {index.compiled_path}")
+    except Exception as e:
+        logging.warning(f"加载IDF表失败，将在首次提取关键词时重试: {e}")
+
+def idf_index(tenant=None):
+    """
+    取得租户使用的IDF表（未单独配置IDF的租户使用默认IDF），首次使用时编译并mmap打开
+
+    Returns:
+        IdfIndex: IDF表，同一IDF文件在进程内只打开一次
+    """
+    path = _idf_paths.get(tenant) or _idf_paths.get(None) or default_idf_path()
+    index = _idf_indexes.get(path)
+    if index is None:
+        with _idf_lock:
+            index = _idf_indexes.get(path)
+            if index is None:
+                from config import get_config
+                cache_dir = _idf_cache_dir or get_config().JIEBA_CACHE_DIR
+                index = _idf_indexes[path] = IdfIndex.load(path, cache_dir)
+    return index
+
+def pos_tags(text, use_cache=True, tenant=None):
+    """
+    词性标注（结果与分词结果一样按词典版本缓存，同一文本的TextRank和按词性过滤的TF-IDF不再重复标注）
+
+    Args:
+        text (str): 待标注文本
+        use_cache (bool): 是否使用缓存
+        tenant (str): 租户名，None表示默认词典
+
+    Returns:
+        tuple: (词语列表, 词性列表)，未过滤空白词
+
+    Raises:
+        ValueError: 输入验证失败或租户不存在
+        Rejected: 无法在请求截止时间前完成
+    """
+    text, tokenizer, version, cache_key, entry = prepare_tokenize(text, POS_MODE_KEY, use_cache, tenant)
+    if entry is None:
+        check_deadline({'精确': len(text)})
+        start = time.perf_counter()
+        words = []
+        flags = []
+        for pair in _pos_tagger(tokenizer).cut(text):
+            words.append(pair.word)
+            flags.append(pair.flag)
+        record_stage('cut', time.perf_counter() - start)
+        entry = {'words': words, 'flags': flags}
+        store_tokens(cache_key, version, entry)
+    return entry['words'], entry['flags']
+
+def extract_keywords(text, method='tfidf', top_k=20, allow_pos=None, stopwords=frozenset(),
+                     use_cache=True, tenant=None):
+    """
+    提取关键词（使用缓存的分词或词性标注结果，不重复分词）
+
+    Args:
+        text (str): 待提取文本
+        method (str): 'tfidf' 或 'textrank'
+        top_k (int): 关键词数，0表示全部
+        allow_pos (list): 只保留这些词性的词，TextRank未指定时为 ns、n、vn、v
+        stopwords (frozenset): 额外的停用词
+        use_cache (bool): 是否使用缓存
+        tenant (str): 租户名，None表示默认词典
+
+    Returns:
+        list: [(词, 权重), ...]，按权重降序
+
+    Raises:
+        ValueError: 输入验证失败、提取方法不支持或租户不存在
+        Rejected: 无法在请求截止时间前完成
+    """
+    stopwords = _keyword_stopwords | stopwords if stopwords else _keyword_stopwords
+    if method == 'textrank':
+        words, flags = pos_tags(text, use_cache, tenant)
+        with stage('keywords'):
+            return extract_textrank(words, flags, top_k, stopwords, allow_pos or TEXTRANK_POS)
+    if method != 'tfidf':
+        raise ValueError(f"不支持的关键词提取方法: {method}")
+
+    index = idf_index(tenant)
+    if allow_pos:
+        words, flags = pos_tags(text, use_cache, tenant)
+    else:
+        # 与 /api/tokenize 共用精确模式的分词缓存
+        words, flags = jieba_tokenize(text, '精确', use_cache, tenant=tenant), None
+    with stage('keywords'):
+        return extract_tfidf(words, index, top_k, stopwords, flags, allow_pos)
+
+def extract_keywords_batch(texts, method='tfidf', top_k=20, allow_pos=None, stopwords=frozenset(),
+                           use_cache=True, tenant=None):
+    """
+    逐条提取关键词，单条失败不影响其他条目（相同文本由缓存命中，只分词一次）
+
+    Returns:
+        list: [(关键词列表, error_message), ...]，与输入顺序一致
+    """
+    outcomes = []
+    for text in texts:
+        try:
+            outcomes.append((extract_keywords(text, method, top_k, allow_pos, stopwords, use_cache, tenant), None))
+        except ValueError as e:
+            outcomes.append((None, str(e)))
+    return outcomes
+
+def iter_request_text(stream, read_size=65536):
+    """
+    增量读取请求体并按UTF-8解码（多字节字符跨块时由增量解码器拼接）
+
+    Args:
+        stream: 请求体输入流
+        read_size (int): 每次读取的字节数
+
+    Yields:
+        str: 解码后的文本块
+
+    Raises:
+        UnicodeDecodeError: 请求体不是合法的UTF-8
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    while True:
+        data = stream.read(read_size)
+        if not data:
+            break
+        text = decoder.decode(data)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+def stream_tokenize_ndjson(chunks, mode, max_segment_length, tokenizer=None, deadline=None):
+    """
+    按句切分增量到达的文本并逐段分词，生成NDJSON行
+
+    每个片段输出一行 {"offset": 片段起始字符位置, "tokens": [...]}，结束时输出一行汇总
+    {"done": true, ...}；解码失败或超过截止时间时输出 {"error": ...} 并结束。
+
+    Args:
+        chunks (iterable): 依次到达的文本块
+        mode (str): 分词模式
+        max_segment_length (int): 单个片段的最大长度
+        tokenizer (jieba.Tokenizer): 使用的分词器，None表示当前默认词典的分词器
+        deadline (float): 截止时间（time.time()时间戳），None表示不限
+
+    Yields:
+        str: NDJSON行
+    """
+    # 整个流使用同一个分词器，期间词典被替换也保持结果一致
+    if tokenizer is None:
+        tokenizer = current_dictionary()[0]
+    count = 0
+    offset = 0
+    segments = 0
+    try:
+        for segment in iter_segments(chunks, max_segment_length):
+            if deadline is not None and time.time() >= deadline:
+                metrics.observe_admission_rejected('deadline')
+                yield json.dumps({'error': '超过请求时限', 'offset': offset}, ensure_ascii=False) + '\n'
+                return
+            cut_start = time.perf_counter()
+            tokens = cut_text(segment, mode, tokenizer)
+            seconds = time.perf_counter() - cut_start
+            metrics.observe_tokenize(mode, len(tokens), len(segment), seconds)
+            observe_throughput(mode, len(segment), seconds)
+            if tokens:
+                yield json.dumps({'offset': offset, 'tokens': tokens}, ensure_ascii=False) + '\n'
+            count += len(tokens)
+            offset += len(segment)
+            segments += 1
+    except UnicodeDecodeError:
+        yield json.dumps({'error': '请求体必须是UTF-8编码的文本', 'offset': offset}, ensure_ascii=False) + '\n'
+        return
+    yield json.dumps({'done': True, 'mode': mode, 'count': count, 'chars': offset, 'segments': segments},
+                     ensure_ascii=False) + '\n'
+
+def get_request_tenant(params):
+    """
+    从请求参数中取出租户名（dict或tenant字段），未指定时返回None
+
+    Raises:
+        ValueError: 租户名不是字符串
+    """
+    tenant = params.get('dict') or params.get('tenant')
+    if tenant is not None and not isinstance(tenant, str):
+        raise ValueError("dict参数必须是字符串")
+    return tenant
+
+def parse_tokenize_request(data, args, default_parallel=False):
+    """
+    解析单条分词请求的参数
+
+    Args:
+        data (dict): JSON请求体
+        args: 查询参数（fields也可以放在查询参数中）
+        default_parallel (bool): 请求未指定parallel时的默认值
+
+    Returns:
+        dict: text、mode、modes（未指定时为None）、offsets、parallel、tenant、fields、echo
+
+    Raises:
+        ValueError: 参数缺失或格式错误
+    """
+    if not data:
+        raise ValueError("请求体不能为空")
+
+    # 验证必需参数
+    text = data.get('text')
+    if not text:
+        raise ValueError("text参数不能为空")
+
+    # 多模式：modes为分词模式列表时一次分词返回每个模式的结果
+    modes = data.get('modes')
+    if modes is not None:
+        if not isinstance(modes, list) or not modes or not all(isinstance(mode, str) for mode in modes):
+            raise ValueError("modes参数必须是非空的分词模式列表")
+        modes = list(dict.fromkeys(modes))
+
+    # 获取分词模式，默认为精确模式
+    mode = data.get('mode', '精确')
+    # 词语在原文中的偏移：只有精确模式的词语按顺序互不重叠，偏移是唯一确定的
+    offsets = bool(data.get('offsets', False))
+    if offsets and (modes is not None or mode != '精确'):
+        raise ValueError("offsets参数仅支持精确模式的单模式分词")
 
-def get_cache_stats():
-    """获取缓存统计信息"""
-    total_requests = _cache_hits + _cache_misses
-    hit_rate = (_cache_hits / total_requests * 100) if total_requests > 0 else 0
     return {
-        'cache_size': len(_token_cache),
-        'cache_hits': _cache_hits,
-        'cache_misses': _cache_misses,
-        'hit_rate': f"{hit_rate:.2f}%",
-        'max_size': _cache_max_size
+        'text': text,
+        'mode': mode,
+        'modes': modes,
+        'offsets': offsets,
+        'parallel': bool(data.get('parallel', default_parallel)),
+        'tenant': get_request_tenant(data),
+        'fields': parse_fields(data.get('fields', args.get('fields'))),
+        'echo': data.get('echo', True) is not False
+    }
+
+def tokenize_result_data(params, tokens):
+    """构建单条分词的响应数据（echo为false时不回显原文，fields只返回选中的字段）"""
+    result_data = {
+        'tokens': tokens,
+        'mode': params['mode'],
+        'count': len(tokens)
     }
+    if params['offsets'] and wants_field(params['fields'], 'offsets'):
+        result_data['offsets'] = token_offsets(params['text'], tokens)
+    if params['echo']:
+        result_data['original_text'] = params['text']
+    if wants_field(params['fields'], 'cache_stats'):
+        result_data['cache_stats'] = get_cache_stats()
+    if params['tenant'] is not None:
+        result_data['dict'] = params['tenant']
+    return select_fields(result_data, params['fields'])
+
+def token_offsets(text, tokens):
+    """
+    精确模式各词在请求原文中的 [起始, 结束) 字符偏移
+
+    Args:
+        text (str): 请求中的原文（未去除首尾空白）
+        tokens (list): 精确模式分词结果
+
+    Returns:
+        list: [[起始, 结束], ...]，与tokens一一对应
+    """
+    stripped = text.strip()
+    lead = len(text) - len(text.lstrip())
+    pairs = iter(locate_tokens(stripped, tokens, contiguous=True))
+    return [[start + lead, end + lead] for start, end in zip(pairs, pairs)]
+
+def tokenize_modes_result_data(params, results):
+    """构建多模式分词的响应数据：results为 {分词模式: {tokens, count}}"""
+    result_data = {
+        'modes': params['modes'],
+        'results': {mode: {'tokens': tokens, 'count': len(tokens)} for mode, tokens in results.items()}
+    }
+    if params['echo']:
+        result_data['original_text'] = params['text']
+    if wants_field(params['fields'], 'cache_stats'):
+        result_data['cache_stats'] = get_cache_stats()
+    if params['tenant'] is not None:
+        result_data['dict'] = params['tenant']
+    return select_fields(result_data, params['fields'])
+
+def parse_batch_request(data, args, max_items):
+    """
+    解析批量分词请求的参数
+
+    Args:
+        data (dict): JSON请求体
+        args: 查询参数
+        max_items (int): 单次请求的最大条数
+
+    Returns:
+        dict: pairs（[(text, mode), ...]）、tenant、fields
+
+    Raises:
+        ValueError: 参数缺失、格式错误或租户不存在
+    """
+    if not data:
+        raise ValueError("请求体不能为空")
+
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        raise ValueError("items参数必须是非空数组")
+
+    if len(items) > max_items:
+        raise ValueError(f"单次批量请求不能超过{max_items}条")
+
+    default_mode = data.get('mode', '精确')
+    tenant = get_request_tenant(data)
+    current_dictionary(tenant)
+    fields = parse_fields(data.get('fields', args.get('fields')))
+
+    pairs = []
+    for item in items:
+        if isinstance(item, dict):
+            pairs.append((item.get('text'), item.get('mode', default_mode)))
+        else:
+            pairs.append((item, default_mode))
+    return {'pairs': pairs, 'tenant': tenant, 'fields': fields}
+
+def parse_terms_request(data, args, max_items):
+    """
+    解析词频统计请求的参数
+
+    Args:
+        data (dict): JSON请求体
+        args: 查询参数（fields也可以放在查询参数中）
+        max_items (int): 单次请求的最大文本数
+
+    Returns:
+        dict: texts、mode、top_k、filter（TermFilter）、tenant、fields
+
+    Raises:
+        ValueError: 参数缺失、格式错误或租户不存在
+    """
+    from config import get_config
+    if not data:
+        raise ValueError("请求体不能为空")
+
+    texts = data.get('texts')
+    if texts is None and isinstance(data.get('text'), str):
+        texts = [data['text']]
+    if not isinstance(texts, list) or not texts:
+        raise ValueError("texts参数必须是非空数组")
+    if len(texts) > max_items:
+        raise ValueError(f"单次词频统计请求不能超过{max_items}条文本")
+
+    mode = data.get('mode', '精确')
+    top_k = data.get('top_k', get_config().TERMS_TOP_K)
+    if not isinstance(top_k, int) or isinstance(top_k, bool) or top_k < 0:
+        raise ValueError("top_k参数必须是非负整数（0表示返回完整的词频表）")
+    min_length = data.get('min_length', 1)
+    if not isinstance(min_length, int) or isinstance(min_length, bool) or min_length < 1:
+        raise ValueError("min_length参数必须是正整数")
+
+    stopwords = data.get('stopwords', [])
+    if not isinstance(stopwords, list) or not all(isinstance(word, str) for word in stopwords):
+        raise ValueError("stopwords参数必须是字符串数组")
+    stopwords = set(stopwords)
+    if data.get('use_stopwords', True) is not False:
+        stopwords |= default_stopwords()
+
+    pos = data.get('pos')
+    if isinstance(pos, str):
+        pos = [item.strip() for item in pos.split(',') if item.strip()]
+    if pos is not None:
+        if not isinstance(pos, list) or not pos or not all(isinstance(item, str) and item for item in pos):
+            raise ValueError("pos参数必须是非空的词性前缀数组，如 [\"n\", \"v\"]")
+        if mode != '精确':
+            raise ValueError("pos参数仅支持精确模式")
+
+    tenant = get_request_tenant(data)
+    current_dictionary(tenant)
+    return {
+        'texts': texts,
+        'mode': mode,
+        'top_k': top_k,
+        'filter': TermFilter(stopwords, min_length, pos),
+        'tenant': tenant,
+        'fields': parse_fields(data.get('fields', args.get('fields')))
+    }
+
+def terms_result_data(params, counter, failed):
+    """构建词频统计的响应数据：terms为 [[词, 词频], ...]，complete表示是否为完整的词频表（可跨节点合并）"""
+    result_data = counter.to_dict(params['top_k'])
+    result_data['mode'] = params['mode']
+    result_data['failed'] = failed
+    if params['tenant'] is not None:
+        result_data['dict'] = params['tenant']
+    return select_fields(result_data, params['fields'])
+
+def parse_keywords_request(data, args, max_items):
+    """
+    解析关键词提取请求的参数
+
+    Args:
+        data (dict): JSON请求体
+        args: 查询参数（fields也可以放在查询参数中）
+        max_items (int): 单次请求的最大文本数
+
+    Returns:
+        dict: texts、batch（是否为texts数组）、method、top_k、with_weight、pos、stopwords、tenant、fields
+
+    Raises:
+        ValueError: 参数缺失、格式错误或租户不存在
+    """
+    from config import get_config
+    if not data:
+        raise ValueError("请求体不能为空")
+
+    texts = data.get('texts')
+    batch = texts is not None
+    if not batch:
+        if 'text' not in data:
+            raise ValueError("缺少text或texts参数")
+        texts = [data['text']]
+    elif not isinstance(texts, list) or not texts:
+        raise ValueError("texts参数必须是非空数组")
+    if len(texts) > max_items:
+        raise ValueError(f"单次关键词提取请求不能超过{max_items}条文本")
+
+    method = data.get('method', 'tfidf')
+    if method not in ('tfidf', 'textrank'):
+        raise ValueError("method参数必须是 tfidf 或 textrank")
+    top_k = data.get('top_k', get_config().KEYWORDS_TOP_K)
+    if not isinstance(top_k, int) or isinstance(top_k, bool) or top_k < 0:
+        raise ValueError("top_k参数必须是非负整数（0表示返回全部关键词）")
+
+    pos = data.get('pos')
+    if isinstance(pos, str):
+        pos = [item.strip() for item in pos.split(',') if item.strip()]
+    if pos is not None and (not isinstance(pos, list) or not pos
+                            or not all(isinstance(item, str) and item for item in pos)):
+        raise ValueError("pos参数必须是非空的词性数组，如 [\"n\", \"v\"]")
+
+    stopwords = data.get('stopwords', [])
+    if not isinstance(stopwords, list) or not all(isinstance(word, str) for word in stopwords):
+        raise ValueError("stopwords参数必须是字符串数组")
+
+    tenant = get_request_tenant(data)
+    current_dictionary(tenant)
+    return {
+        'texts': texts,
+        'batch': batch,
+        'method': method,
+        'top_k': top_k,
+        'with_weight': data.get('with_weight', True) is not False,
+        'pos': pos,
+        'stopwords': frozenset(stopwords),
+        'tenant': tenant,
+        'fields': parse_fields(data.get('fields', args.get('fields')))
+    }
+
+def keywords_result_data(params, outcomes):
+    """
+    构建关键词提取的响应数据：单条文本时为keywords，texts数组时为逐条的results
+
+    Returns:
+        tuple: (响应数据, 失败条数)
+    """
+    def format_keywords(pairs):
+        if params['with_weight']:
+            return [[word, weight] for word, weight in pairs]
+        return [word for word, _ in pairs]
+
+    if params['batch']:
+        results = []
+        failed = 0
+        for index, (pairs, error) in enumerate(outcomes):
+            if error is not None:
+                failed += 1
+                results.append({'index': index, 'success': False, 'error': error})
+            else:
+                results.append({'index': index, 'success': True, 'keywords': format_keywords(pairs)})
+        result_data = {
+            'results': results,
+            'total': len(results),
+            'succeeded': len(results) - failed,
+            'failed': failed
+        }
+    else:
+        failed = 0
+        result_data = {'keywords': format_keywords(outcomes[0][0]), 'count': len(outcomes[0][0])}
+    result_data['method'] = params['method']
+    if params['tenant'] is not None:
+        result_data['dict'] = params['tenant']
+    return select_fields(result_data, params['fields']), failed
+
+def batch_result_data(params, outcomes):
+    """
+    构建批量分词的响应数据
+
+    Returns:
+        tuple: (响应数据, 失败条数)
+    """
+    results = []
+    failed = 0
+    for index, ((_, mode), (tokens, error)) in enumerate(zip(params['pairs'], outcomes)):
+        if error is not None:
+            failed += 1
+            results.append({'index': index, 'success': False, 'mode': mode, 'error': error})
+        else:
+            results.append({'index': index, 'success': True, 'mode': mode,
+                            'tokens': tokens, 'count': len(tokens)})
+
+    result_data = {
+        'results': results,
+        'total': len(results),
+        'succeeded': len(results) - failed,
+        'failed': failed
+    }
+    if wants_field(params['fields'], 'cache_stats'):
+        result_data['cache_stats'] = get_cache_stats()
+    if params['tenant'] is not None:
+        result_data['dict'] = params['tenant']
+    return select_fields(result_data, params['fields']), failed
+
+def get_cache_stats():
+    """
+    获取缓存统计信息（顶层为进程内L1，l2为共享缓存，coalesce为请求合并，snapshot为快照，
+    warmup为启动预热结果，sentences为按句缓存的计数，未启用时为None）
+    """
+    stats = _token_cache.stats()
+    stats['l2'] = _shared_cache.stats() if _shared_cache is not None else None
+    stats['coalesce'] = _single_flight.stats() if _single_flight is not None else None
+    stats['snapshot'] = _snapshotter.stats() if _snapshotter is not None else None
+    stats['warmup'] = _warmup_stats
+    stats['sentences'] = dict(_sentence_stats, min_length=_sentence_min_length) if _sentence_min_length else None
+    return stats
+
+def warm_from_corpus(path, modes, limit):
+    """
+    用预热语料文件（每行一条文本）分词并写入缓存
+
+    Returns:
+        int: 分词的文本条数（按模式计）
+    """
+    count = 0
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line_number, line in enumerate(f):
+                if limit and line_number >= limit:
+                    break
+                text = line.strip()
+                if not text:
+                    continue
+                for mode in modes:
+                    try:
+                        jieba_tokenize(text, mode)
+                        count += 1
+                    except ValueError as e:
+                        logging.debug(f"预热语料第 {line_number + 1} 行已跳过: {e}")
+    except OSError as e:
+        logging.warning(f"读取预热语料失败 {path}: {e}")
+    return count
+
+def warm_cache(app_config=None):
+    """
+    启动预热L1缓存：依次加载缓存快照、L2中命中次数最多的条目和预热语料
+
+    只加载当前词典版本的条目，词典更新后的旧快照直接作废。
+
+    Returns:
+        dict: 各来源加载的条目数和耗时；未启用缓存时返回None
+    """
+    if app_config is None:
+        from config import get_config
+        app_config = get_config()
+
+    global _warmup_stats
+    if not _cache_enabled:
+        return None
+    start = time.perf_counter()
+    version = dictionary_version()
+    result = {'snapshot': 0, 'l2': 0, 'corpus': 0}
+
+    if app_config.CACHE_SNAPSHOT_PATH:
+        result['snapshot'] = _token_cache.load(load_snapshot(app_config.CACHE_SNAPSHOT_PATH, version))
+    if app_config.CACHE_WARM_FROM_L2 and _shared_cache is not None:
+        entries = [(key, value) for key, value in _shared_cache.hottest(app_config.CACHE_WARM_FROM_L2)
+                   if key_namespace(key) == version]
+        result['l2'] = _token_cache.load(entries)
+    if app_config.CACHE_WARM_CORPUS:
+        result['corpus'] = warm_from_corpus(app_config.CACHE_WARM_CORPUS, app_config.CACHE_WARM_MODES,
+                                            app_config.CACHE_WARM_LIMIT)
+    if _snapshotter is not None:
+        _snapshotter.mark_saved()
+
+    result['cache_size'] = len(_token_cache)
+    result['seconds'] = round(time.perf_counter() - start, 3)
+    _warmup_stats = result
+    if result['snapshot'] or result['l2'] or result['corpus']:
+        logging.info(f"缓存预热完成 - 快照: {result['snapshot']}条, L2: {result['l2']}条, "
+                     f"语料: {result['corpus']}条, 缓存条目: {result['cache_size']}, 耗时: {result['seconds']:.3f}s")
+    return result
+
+def save_cache_snapshot():
+    """保存最后一次缓存快照（进程退出时自动调用）"""
+    if _snapshotter is not None:
+        _snapshotter.stop()
+
+atexit.register(save_cache_snapshot)
 
 # 创建Flask应用（优化版）
 def create_app(config_name='default'):
@@ -335,14 +1892,42 @@ def create_app(config_name='default'):
     # 获取配置对象
     app_config = config[config_name]
     app.config.from_object(app_config)
+    # 中文直接以UTF-8输出，不转义为\uXXXX（转义后体积约为三倍）
+    app.json.ensure_ascii = app_config.JSON_ENSURE_ASCII
 
     # 设置日志和jieba（使用配置对象）
     setup_logging(app_config)
     setup_jieba(app_config)
+    warm_cache(app_config)
+    setup_workers(app_config)
+    setup_terms(app_config)
+    setup_keywords(app_config)
+    setup_admission(app_config)
+    setup_profiling(
+        sample_rate=app_config.PROFILE_SAMPLE_RATE,
+        min_duration=app_config.PROFILE_MIN_DURATION,
+        directory=app_config.PROFILE_DIR,
+        header_enabled=app_config.PROFILE_HEADER_ENABLED,
+        max_files=app_config.PROFILE_MAX_FILES
+    )
 
     # 初始化数据库
     init_db()
-    logging.info("数据库初始化完成")
+    configure_retention(
+        days=app_config.LOG_RETENTION_DAYS,
+        archive_path=app_config.LOG_ARCHIVE_PATH,
+        minute_rollup_hours=app_config.ROLLUP_MINUTE_RETENTION_HOURS
+    )
+    run_retention()
+    setup_log_writer(
+        enabled=app_config.LOG_DB_ASYNC,
+        max_queue_size=app_config.LOG_QUEUE_MAX_SIZE,
+        flush_interval=app_config.LOG_FLUSH_INTERVAL,
+        batch_size=app_config.LOG_BATCH_SIZE,
+        policy=app_config.LOG_QUEUE_POLICY,
+        retention_interval=app_config.LOG_RETENTION_INTERVAL
+    )
+    logging.info(f"数据库初始化完成，请求日志写入方式: {'后台批量' if app_config.LOG_DB_ASYNC else '同步'}")
 
     # 根据配置启用CORS
     if app_config.ENABLE_CORS:
@@ -367,43 +1952,45 @@ def register_routes(app):
     class TokenizeAPI(MethodView):
         """中文分词API视图（优化版）"""
 
-        decorators = [log_request_info, request_id_logger()]
+        decorators = [admission_control, log_request_info, request_id_logger()]
 
         def post(self):
             """处理分词请求"""
             try:
                 # 获取请求数据
                 data = request.get_json()
-                if not data:
-                    return create_error_response("请求体不能为空", 400)
-
-                # 验证必需参数
-                text = data.get('text')
-                if not text:
-                    return create_error_response("text参数不能为空", 400)
-
-                # 获取分词模式，默认为精确模式
-                mode = data.get('mode', '精确')
+                params = parse_tokenize_request(data, request.args, app.config['PARALLEL_TOKENIZE'])
+                mode = params['mode']
+
+                if params['modes']:
+                    results = jieba_tokenize_modes(params['text'], params['modes'], tenant=params['tenant'])
+                    if negotiate(request.accept_mimetypes, binary=True) == MIME_TOKENS:
+                        # 按modes的顺序返回各模式的分词结果
+                        counts = ','.join(str(len(tokens)) for tokens in results.values())
+                        return create_tokens_response(list(results.values()), headers={'X-Token-Count': counts})
+                    return create_response(
+                        success=True,
+                        data=tokenize_modes_result_data(params, results),
+                        message=f"成功处理多模式分词请求，模式: {', '.join(params['modes'])}",
+                        code=200
+                    )
 
                 # 执行分词
-                tokens = jieba_tokenize(text, mode)
-
-                # 返回结果
-                result_data = {
-                    'tokens': tokens,
-                    'mode': mode,
-                    'count': len(tokens),
-                    'original_text': text,
-                    'cache_stats': get_cache_stats()
-                }
+                tokens = jieba_tokenize(params['text'], mode, parallel=params['parallel'],
+                                        tenant=params['tenant'])
+
+                if negotiate(request.accept_mimetypes, binary=True) == MIME_TOKENS:
+                    return create_tokens_response([tokens], headers={'X-Token-Count': str(len(tokens))})
 
                 return create_response(
                     success=True,
-                    data=result_data,
+                    data=tokenize_result_data(params, tokens),
                     message=f"成功处理分词请求，模式: {mode}, 词汇数: {len(tokens)}",
                     code=200
                 )
 
+            except Rejected as e:
+                return rejection_response(e)
             except ValueError as e:
                 return create_error_response(str(e), 400)
             except Exception as e:
@@ -428,7 +2015,17 @@ def register_routes(app):
                         'description': '执行中文分词',
                         'parameters': {
                             'text': '待分词文本（必需，最大10000字符）',
-                            'mode': '分词模式（可选）：精确、全模式、搜索引擎'
+                            'mode': '分词模式（可选）：精确、全模式、搜索引擎',
+                            'offsets': '为true时返回各词在原文中的字符偏移（可选，仅精确模式）',
+                            'parallel': '长文本是否切段并行分词（可选，需启用进程池）',
+                            'dict': '使用的领域词典/租户名（可选，也可用tenant字段）',
+                            'fields': '只返回指定字段，逗号分隔或数组（可选，也可用查询参数），如 tokens,count',
+                            'echo': '为false时不回显original_text（可选）'
+                        },
+                        'formats': {
+                            'Accept: application/json': 'UTF-8 JSON（默认）',
+                            'Accept: application/msgpack': 'MessagePack（需安装msgpack）',
+                            'Accept: application/x-jieba-tokens': '长度前缀的二进制分词结果'
                         },
                         'example': {
                             'request': {'text': '我爱北京天安门', 'mode': '精确'},
@@ -452,6 +2049,48 @@ def register_routes(app):
                                 }
                             }
                         }
+                    },
+                    'POST /api/tokenize/batch': {
+                        'description': '批量执行中文分词，重复文本只计算一次',
+                        'parameters': {
+                            'items': '待分词条目数组（必需），元素为 {text, mode} 或字符串',
+                            'mode': '条目未指定模式时使用的默认模式（可选）',
+                            'dict': '使用的领域词典/租户名（可选）',
+                            'fields': '只返回指定字段（可选），如 results,failed'
+                        }
+                    },
+                    'POST /api/tokenize/stream': {
+                        'description': '流式分词：请求体为UTF-8纯文本，按句返回NDJSON，适合超长文档',
+                        'parameters': {
+                            'mode': '分词模式（查询参数，可选）',
+                            'dict': '使用的领域词典/租户名（查询参数，可选）'
+                        }
+                    },
+                    'POST /api/terms': {
+                        'description': '词频统计：对一组文本分词，只返回词频最高的词或完整的词频表',
+                        'parameters': {
+                            'texts': '文本数组（必需，也可用单个text）',
+                            'mode': '分词模式（可选）',
+                            'top_k': '返回词频最高的K个词（可选，0表示完整的词频表）',
+                            'min_length': '词的最小字符数（可选）',
+                            'stopwords': '额外的停用词数组（可选）',
+                            'use_stopwords': '为false时不使用STOPWORDS_PATH配置的停用词（可选）',
+                            'pos': '只统计这些词性前缀的词（可选，仅精确模式），如 ["n", "v"]',
+                            'dict': '使用的领域词典/租户名（可选）'
+                        }
+                    },
+                    'POST /api/keywords': {
+                        'description': '关键词提取（TF-IDF或TextRank），与分词接口共用分词缓存',
+                        'parameters': {
+                            'text': '待提取文本（单条）',
+                            'texts': '文本数组（批量，与text二选一）',
+                            'method': 'tfidf（默认）或 textrank',
+                            'top_k': '关键词数（可选，0表示全部）',
+                            'with_weight': '是否返回权重（可选，默认true）',
+                            'pos': '只保留这些词性的词（可选），如 ["n", "vn"]',
+                            'stopwords': '额外的停用词数组（可选）',
+                            'dict': '使用的领域词典/租户名（可选，租户可配置单独的IDF文件）'
+                        }
                     }
                 },
                 'supported_modes': ['精确', '全模式', '搜索引擎'],
@@ -468,10 +2107,214 @@ def register_routes(app):
                 code=200
             )
 
+    class BatchTokenizeAPI(MethodView):
+        """批量中文分词API视图"""
+
+        decorators = [admission_control, log_request_info, request_id_logger()]
+
+        def post(self):
+            """处理批量分词请求，单条失败只在对应结果中返回错误"""
+            try:
+                data = request.get_json()
+                try:
+                    params = parse_batch_request(data, request.args, app.config['BATCH_MAX_ITEMS'])
+                except ValueError as e:
+                    return create_error_response(str(e), 400)
+
+                outcomes = jieba_tokenize_batch(params['pairs'], tenant=params['tenant'])
+
+                if negotiate(request.accept_mimetypes, binary=True) == MIME_TOKENS:
+                    failed = sum(1 for _, error in outcomes if error is not None)
+                    return create_tokens_response([tokens for tokens, _ in outcomes],
+                                                  headers={'X-Failed-Count': str(failed)})
+
+                result_data, failed = batch_result_data(params, outcomes)
+                return create_response(
+                    success=True,
+                    data=result_data,
+                    message=f"成功处理批量分词请求，条数: {len(outcomes)}, 失败: {failed}",
+                    code=200
+                )
+
+            except Rejected as e:
+                return rejection_response(e)
+            except Exception as e:
+                logging.error(f"服务器内部错误: {str(e)}")
+                return create_error_response("服务器内部错误", 500)
+
+    class StreamTokenizeAPI(MethodView):
+        """流式中文分词API视图（NDJSON输出）"""
+
+        decorators = [admission_control, log_request_info, request_id_logger()]
+
+        def post(self):
+            """增量读取纯文本请求体，按句分词并逐行返回结果"""
+            mode = request.args.get('mode', '精确')
+            if mode not in app.config['TOKENIZE_MODES']:
+                return create_error_response(f"不支持的分词模式: {mode}", 400)
+            try:
+                tokenizer = current_dictionary(get_request_tenant(request.args))[0]
+            except ValueError as e:
+                return create_error_response(str(e), 400)
+            g.log_fields = {'mode': mode, 'text_length': request.content_length}
+
+            chunks = iter_request_text(request.stream, app.config['STREAM_READ_SIZE'])
+            try:
+                first_chunk = next(chunks, None)
+            except UnicodeDecodeError:
+                return create_error_response("请求体必须是UTF-8编码的文本", 400)
+            if first_chunk is None:
+                return create_error_response("请求体不能为空", 400)
+
+            lines = stream_tokenize_ndjson(chain([first_chunk], chunks), mode,
+                                           app.config['STREAM_MAX_SEGMENT_LENGTH'], tokenizer, get_deadline())
+            return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+    class TermsAPI(MethodView):
+        """词频统计API视图"""
+
+        decorators = [admission_control, log_request_info, request_id_logger()]
+
+        def post(self):
+            """对一组文本分词并返回词频最高的词或完整的词频表（不返回各文本的分词结果）"""
+            try:
+                data = request.get_json()
+                try:
+                    params = parse_terms_request(data, request.args, app.config['BATCH_MAX_ITEMS'])
+                    g.log_fields = {
+                        'mode': params['mode'],
+                        'text_length': sum(len(text) for text in params['texts'] if isinstance(text, str))
+                    }
+                    counter, failed = aggregate_terms(params['texts'], params['mode'], params['filter'],
+                                                      tenant=params['tenant'])
+                except ValueError as e:
+                    return create_error_response(str(e), 400)
+
+                return create_response(
+                    success=True,
+                    data=terms_result_data(params, counter, failed),
+                    message=f"成功统计词频，文本数: {counter.documents}, 不同的词: {len(counter.counts)}",
+                    code=200
+                )
+
+            except Rejected as e:
+                return rejection_response(e)
+            except Exception as e:
+                logging.error(f"服务器内部错误: {str(e)}")
+                return create_error_response("服务器内部错误", 500)
+
+    class KeywordsAPI(MethodView):
+        """关键词提取API视图"""
+
+        decorators = [admission_control, log_request_info, request_id_logger()]
+
+        def post(self):
+            """提取单条文本或一组文本的关键词，批量时单条失败只在对应结果中返回错误"""
+            try:
+                data = request.get_json()
+                try:
+                    params = parse_keywords_request(data, request.args, app.config['BATCH_MAX_ITEMS'])
+                    g.log_fields = {
+                        'mode': '精确',
+                        'text_length': sum(len(text) for text in params['texts'] if isinstance(text, str))
+                    }
+                    outcomes = extract_keywords_batch(params['texts'], params['method'], params['top_k'],
+                                                      params['pos'], params['stopwords'], tenant=params['tenant'])
+                    if not params['batch'] and outcomes[0][1] is not None:
+                        raise ValueError(outcomes[0][1])
+                except ValueError as e:
+                    return create_error_response(str(e), 400)
+
+                result_data, failed = keywords_result_data(params, outcomes)
+                return create_response(
+                    success=True,
+                    data=result_data,
+                    message=f"成功提取关键词，文本数: {len(outcomes)}, 失败: {failed}",
+                    code=200
+                )
+
+            except Rejected as e:
+                return rejection_response(e)
+            except Exception as e:
+                logging.error(f"服务器内部错误: {str(e)}")
+                return create_error_response("服务器内部错误", 500)
+
     # 注册API路由
     tokenize_view = TokenizeAPI.as_view('tokenize_api')
     app.add_url_rule('/api/tokenize', view_func=tokenize_view, methods=['GET', 'POST'])
 
+    batch_view = BatchTokenizeAPI.as_view('batch_tokenize_api')
+    app.add_url_rule('/api/tokenize/batch', view_func=batch_view, methods=['POST'])
+
+    stream_view = StreamTokenizeAPI.as_view('stream_tokenize_api')
+    app.add_url_rule('/api/tokenize/stream', view_func=stream_view, methods=['POST'])
+
+    terms_view = TermsAPI.as_view('terms_api')
+    app.add_url_rule('/api/terms', view_func=terms_view, methods=['POST'])
+
+    keywords_view = KeywordsAPI.as_view('keywords_api')
+    app.add_url_rule('/api/keywords', view_func=keywords_view, methods=['POST'])
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def add_server_timing(response):
+        """把各阶段耗时写入Server-Timing响应头并上报指标（流式响应只包含响应头发出前的阶段）"""
+        timings = get_stage_timings()
+        if timings:
+            metrics.observe_stages(request.path, timings)
+        if app.config['SERVER_TIMING_ENABLED'] and request.path.startswith('/api/'):
+            total = time.perf_counter() - g.request_start if 'request_start' in g else None
+            response.headers['Server-Timing'] = format_server_timing(timings, total)
+        return response
+
+    @app.before_request
+    def check_dictionary():
+        """按检查间隔发现其他worker触发的词典重载或词典文件变化（只读取版本文件，不阻塞请求）"""
+        if request.path.startswith('/api/'):
+            refresh_dictionary()
+
+    def admin_required(func):
+        """管理接口鉴权：需配置ADMIN_TOKEN，并在X-Admin-Token请求头中提供"""
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            admin_token = app.config['ADMIN_TOKEN']
+            if not admin_token:
+                return create_error_response("管理接口未启用，请配置 ADMIN_TOKEN", 403)
+            if request.headers.get('X-Admin-Token') != admin_token:
+                return create_error_response("管理令牌无效", 401)
+            return func(*args, **kwargs)
+        return wrapper
+
+    class DictionaryAdminAPI(MethodView):
+        """词典管理API视图"""
+
+        decorators = [admin_required, log_request_info, request_id_logger()]
+
+        def get(self):
+            """查看当前词典版本和加载状态"""
+            if _dictionary is None:
+                return create_error_response("词典管理器未初始化", 503)
+            return create_response(success=True, data=_dictionary.stats(), message="词典状态获取成功")
+
+        def post(self):
+            """触发词典重载：在后台构建新分词器，所有worker在检查间隔内跟进"""
+            if _dictionary is None:
+                return create_error_response("词典管理器未初始化", 503)
+            try:
+                target_version = _dictionary.request_reload()
+            except OSError as e:
+                return create_error_response(f"词典重载失败: {e}", 500)
+            data = _dictionary.stats()
+            data['target_version'] = target_version
+            return create_response(success=True, data=data, message="词典重载已开始", code=202)
+
+    dictionary_view = DictionaryAdminAPI.as_view('dictionary_admin_api')
+    app.add_url_rule('/api/admin/dict', view_func=dictionary_view, methods=['GET'])
+    app.add_url_rule('/api/admin/dict/reload', view_func=dictionary_view, methods=['POST'])
+
     # 根路径重定向到API说明
     @app.route('/')
     def index():
@@ -480,8 +2323,11 @@ def register_routes(app):
             'version': '1.0.0',
             'endpoints': {
                 'api': '/api/tokenize',
+                'batch': '/api/tokenize/batch',
+                'stream': '/api/tokenize/stream',
                 'docs': '/api/tokenize (GET)',
-                'dashboard': '/dashboard'
+                'dashboard': '/dashboard',
+                'metrics': '/metrics'
             }
         })
 
@@ -491,11 +2337,21 @@ def register_routes(app):
         stats = get_stats()
         return render_template('dashboard.html', stats=stats, cache_stats=get_cache_stats())
 
+    # Prometheus指标（多进程模式下合并所有worker的指标文件，不访问数据库）
+    @app.route('/metrics')
+    def prometheus_metrics():
+        body, content_type = metrics.render_metrics()
+        return Response(body, content_type=content_type)
+
     # 统计数据API
     @app.route('/api/stats')
     def api_stats():
         stats = get_stats()
         stats['cache'] = get_cache_stats()
+        stats['log_writer'] = get_log_writer_stats()
+        stats['dictionary'] = _dictionary.stats() if _dictionary is not None else None
+        stats['tenants'] = _tenants.stats() if _tenants is not None else None
+        stats['admission'] = get_admission_stats()
         return jsonify(stats)
 
 # 注册错误处理器（优化版）
@@ -0,0 +1,426 @@
+"""
+异步（ASGI）入口
+
+提供与 create_app 相同的API：
+- POST /api/tokenize 和 /api/tokenize/batch 在事件循环上完成请求解析、输入验证、缓存查询、
+  序列化和请求日志入队，只有CPU密集的分词交给有界线程池执行。短文本和长文本使用两条独立的通道，
+  长文本分词不会让短请求排在它后面；通道中排队的任务超过 ASYNC_QUEUE_LIMIT 时直接返回503，
+  而不是无限堆积。
+- 其他路由（流式接口、统计、指标、管理接口、监控面板等）通过asgiref交给Flask应用处理。
+
+keep-alive连接由事件循环管理，空闲连接不占用线程。
+
+使用方法：
+uvicorn --factory asgi:create_asgi_app --workers 4 --port 5000
+gunicorn -c gunicorn.conf.py -k uvicorn.workers.UvicornWorker "asgi:create_asgi_app()"
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.datastructures import Headers, MIMEAccept, MultiDict
+from werkzeug.http import parse_accept_header
+
+import metrics
+from admission import Rejected, admit, release
+from app import (create_app, refresh_dictionary, response_envelope, current_dictionary, get_request_tenant,
+                 parse_tokenize_request, tokenize_result_data, tokenize_modes_result_data, jieba_tokenize_modes,
+                 prepare_tokenize, cut_and_store, join_flight,
+                 wait_flight_async, lead_flight, abandon_flight, parse_batch_request, batch_result_data, plan_batch, cut_batch, complete_batch, request_text_work)
+from config import config
+from formats import MIME_MSGPACK, MIME_TOKENS, negotiate, encode_msgpack, encode_token_lists
+from models import enqueue_request_log
+from profiling import stage, record_stage, get_stage_timings, format_server_timing
+
+
+class ExecutorBusy(Exception):
+    """分词通道排队已满"""
+
+
+class RequestTooLarge(Exception):
+    """请求体超过MAX_CONTENT_LENGTH"""
+
+
+class ClientDisconnected(Exception):
+    """读取请求体时客户端断开连接"""
+
+
+class TokenizeExecutor:
+    """
+    分词执行器：短文本和长文本两条有界线程池通道
+
+    线程池在首次使用时按进程创建（gunicorn preload时主进程中的线程不会被fork到worker中）。
+    每条通道中排队和执行中的任务数不超过 线程数 + queue_limit，超出时抛出ExecutorBusy。
+    """
+
+    LANES = ('short', 'long')
+
+    def __init__(self, short_workers=4, long_workers=1, long_text_length=2000, queue_limit=64):
+        self.long_text_length = long_text_length
+        self.queue_limit = queue_limit
+        self._workers = {'short': short_workers, 'long': long_workers}
+        self._executors = {}
+        self._pid = None
+        self._pending = dict.fromkeys(self.LANES, 0)
+        self._rejected = dict.fromkeys(self.LANES, 0)
+        self._lock = threading.Lock()
+
+    def lane_for(self, chars):
+        """按待分词字符数选择通道"""
+        return 'long' if chars >= self.long_text_length else 'short'
+
+    def _executor(self, lane):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    self._executors = {
+                        name: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"tokenize-{name}")
+                        for name, workers in self._workers.items()
+                    }
+                    self._pending = dict.fromkeys(self.LANES, 0)
+                    self._pid = pid
+        return self._executors[lane]
+
+    def _release(self, lane):
+        with self._lock:
+            self._pending[lane] -= 1
+            pending = self._pending[lane]
+        metrics.observe_executor(lane, pending)
+
+    async def run(self, lane, func, *args):
+        """
+        在指定通道的线程池中执行func，期间不阻塞事件循环
+
+        func在当前上下文的副本中执行，分词各阶段的耗时仍记录到当前请求；
+        从提交到开始执行的等待时间记为queue阶段。
+
+        Raises:
+            ExecutorBusy: 通道排队已满
+        """
+        executor = self._executor(lane)
+        with self._lock:
+            busy = self._pending[lane] >= self._workers[lane] + self.queue_limit
+            if busy:
+                self._rejected[lane] += 1
+            else:
+                self._pending[lane] += 1
+            pending = self._pending[lane]
+        metrics.observe_executor(lane, pending, rejected=busy)
+        if busy:
+            raise ExecutorBusy(lane)
+
+        submitted = time.perf_counter()
+
+        def timed():
+            record_stage('queue', time.perf_counter() - submitted)
+            return func(*args)
+
+        future = executor.submit(contextvars.copy_context().run, timed)
+        # 在任务真正结束（或排队时被取消）后才释放名额，客户端断开也不会让通道超额
+        future.add_done_callback(lambda _: self._release(lane))
+        return await asyncio.wrap_future(future)
+
+    def stats(self):
+        """各通道的线程数、当前任务数和累计拒绝数"""
+        with self._lock:
+            return {lane: {'workers': self._workers[lane], 'pending': self._pending[lane],
+                           'rejected': self._rejected[lane]} for lane in self.LANES}
+
+    def shutdown(self):
+        """关闭本进程创建的线程池（不等待执行中的任务）"""
+        with self._lock:
+            executors, owner = self._executors, self._pid
+            self._executors, self._pid = {}, None
+        if owner == os.getpid():
+            for executor in executors.values():
+                executor.shutdown(wait=False, cancel_futures=True)
+
+
+class AsyncRequest:
+    """在事件循环上处理的请求"""
+
+    __slots__ = ('method', 'path', 'headers', 'args', 'body', 'accept', 'remote_addr', 'request_id', 'log_fields',
+                 'ticket')
+
+    def __init__(self, scope, body):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.headers = Headers([(key.decode('latin-1'), value.decode('latin-1')) for key, value in scope['headers']])
+        self.args = MultiDict(parse_qsl(scope.get('query_string', b'').decode('utf-8', 'replace')))
+        self.body = body
+        self.accept = parse_accept_header(self.headers.get('Accept'), MIMEAccept)
+        self.remote_addr = scope['client'][0] if scope.get('client') else None
+        self.request_id = str(uuid.uuid4())
+        self.log_fields = {}
+        self.ticket = None
+
+    def get_json(self):
+        """
+        解析JSON请求体，并按同步模式的方式记录请求日志字段（mode和text长度）
+
+        Raises:
+            ValueError: 请求体不是合法的JSON
+        """
+        try:
+            data = json.loads(self.body) if self.body else None
+        except ValueError:
+            raise ValueError("请求体必须是合法的JSON")
+        if isinstance(data, dict):
+            self.log_fields = {
+                'mode': data.get('mode'),
+                'text_length': len(data.get('text', '')) if 'text' in data else None
+            }
+        return data
+
+    def admit(self, data):
+        """
+        准入控制（限流、长文本名额和请求时限），截止时间记录到当前请求
+
+        Raises:
+            Rejected: 请求未被准入
+        """
+        work = request_text_work(data) if isinstance(data, dict) else {}
+        with stage('admission'):
+            self.ticket = admit(self.headers, self.remote_addr, work)
+
+
+class TokenizeASGI:
+    """ASGI应用：分词接口在事件循环上处理，其余路由交给Flask应用"""
+
+    def __init__(self, flask_app, executor):
+        self.flask_app = flask_app
+        self.config = flask_app.config
+        self.executor = executor
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.routes = {
+            ('POST', '/api/tokenize'): self.tokenize,
+            ('POST', '/api/tokenize/batch'): self.tokenize_batch
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+            return
+        if scope['type'] == 'http':
+            handler = self.routes.get((scope['method'], scope['path']))
+            if handler is not None:
+                await self._handle(handler, scope, receive, send)
+                return
+        await self.wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _read_body(self, receive):
+        limit = self.config['MAX_CONTENT_LENGTH']
+        chunks = []
+        size = 0
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                raise ClientDisconnected()
+            chunk = message.get('body', b'')
+            size += len(chunk)
+            if limit and size > limit:
+                raise RequestTooLarge()
+            chunks.append(chunk)
+            if not message.get('more_body', False):
+                return b''.join(chunks)
+
+    async def _handle(self, handler, scope, receive, send):
+        """处理一个请求：与同步模式的log_request_info一致地记录日志、指标和Server-Timing"""
+        start_time = time.time()
+        request_start = time.perf_counter()
+        metrics.IN_FLIGHT.inc()
+        # 推入应用上下文，使阶段计时（flask.g）和JSON配置在事件循环和线程池中都可用
+        app_context = self.flask_app.app_context()
+        app_context.push()
+        try:
+            try:
+                request = AsyncRequest(scope, await self._read_body(receive))
+            except ClientDisconnected:
+                return
+            except RequestTooLarge:
+                await self._send(send, *self._error(None, "请求体过大", 413))
+                return
+
+            logging.info(f"[{request.request_id}] {request.method} {request.path} - 开始处理")
+            try:
+                refresh_dictionary()
+                status, content_type, body, headers = await handler(request)
+            except Rejected as e:
+                logging.info(f"[{request.request_id}] 请求未被准入: {e.message}")
+                status, content_type, body, headers = self._error(request, e.message, e.status)
+                headers['Retry-After'] = str(e.retry_after)
+            except ExecutorBusy as e:
+                logging.warning(f"[{request.request_id}] 分词通道 {e} 排队已满，拒绝请求")
+                status, content_type, body, headers = self._error(request, "服务繁忙，请稍后重试", 503)
+                headers['Retry-After'] = '1'
+            except ValueError as e:
+                status, content_type, body, headers = self._error(request, str(e), 400)
+            except Exception as e:
+                logging.error(f"[{request.request_id}] {request.method} {request.path} - 错误: {e}", exc_info=True)
+                status, content_type, body, headers = self._error(request, "服务器内部错误", 500)
+            finally:
+                release(request.ticket)
+
+            duration = time.time() - start_time
+            logging.info(f"[{request.request_id}] {request.method} {request.path} - 完成 "
+                         f"(耗时: {duration:.3f}s, 状态码: {status})")
+            log_start = time.perf_counter()
+            try:
+                mode = request.log_fields.get('mode')
+                text_length = request.log_fields.get('text_length')
+                enqueue_request_log(request.path, request.method, status, duration, mode, text_length)
+                metrics.observe_request(request.path, request.method, status, duration, mode, text_length)
+            except Exception as e:
+                logging.warning(f"保存请求日志失败: {e}")
+            record_stage('log', time.perf_counter() - log_start)
+
+            timings = get_stage_timings()
+            if timings:
+                metrics.observe_stages(request.path, timings)
+            if self.config['SERVER_TIMING_ENABLED']:
+                headers['Server-Timing'] = format_server_timing(timings, time.perf_counter() - request_start)
+        finally:
+            app_context.pop()
+            metrics.IN_FLIGHT.dec()
+        await self._send(send, status, content_type, body, headers)
+
+    async def _send(self, send, status, content_type, body, headers):
+        raw_headers = [(b'content-type', content_type.encode('latin-1')),
+                       (b'content-length', str(len(body)).encode('latin-1'))]
+        if self.config['ENABLE_CORS']:
+            raw_headers.append((b'access-control-allow-origin', b'*'))
+        raw_headers.extend((key.lower().encode('latin-1'), value.encode('latin-1')) for key, value in headers.items())
+        await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+    def _response(self, request, success=True, data=None, message=None, code=200):
+        """
+        编码统一格式的响应（客户端请求MessagePack时返回二进制编码，否则返回JSON）
+
+        Returns:
+            tuple: (状态码, Content-Type, 响应体, 附加响应头)
+        """
+        with stage('serialize'):
+            envelope = response_envelope(success, data, message, code)
+            if request is not None and negotiate(request.accept) == MIME_MSGPACK:
+                return code, MIME_MSGPACK, encode_msgpack(envelope), {}
+            return code, 'application/json', (self.flask_app.json.dumps(envelope) + '\n').encode('utf-8'), {}
+
+    def _error(self, request, message, code):
+        return self._response(request, success=False, message=message, code=code)
+
+    def _tokens_response(self, token_lists, headers):
+        with stage('serialize'):
+            return 200, MIME_TOKENS, encode_token_lists(token_lists), headers
+
+    async def _load_tenant(self, data):
+        """租户词典首次使用时需要从磁盘加载，放到长文本通道中执行，避免阻塞事件循环"""
+        tenant = get_request_tenant(data) if isinstance(data, dict) else None
+        if tenant is not None:
+            await self.executor.run('long', current_dictionary, tenant)
+
+    async def _cut(self, text, mode, tokenizer, version, cache_key, params):
+        """未命中缓存时分词：同一缓存键已有请求在分词时在事件循环上等待其结果，否则交给线程池"""
+        lane = self.executor.lane_for(len(text))
+        args = (text, mode, tokenizer, version, cache_key, params['parallel'], params['tenant'])
+        future, leader = join_flight(cache_key)
+        if not leader:
+            tokens = await wait_flight_async(future)
+            if tokens is not None:
+                return tokens
+            return await self.executor.run(lane, cut_and_store, *args)
+        try:
+            return await self.executor.run(lane, lead_flight, future, *args)
+        except BaseException as e:
+            abandon_flight(cache_key, future, e)
+            raise
+
+    async def tokenize(self, request):
+        """POST /api/tokenize"""
+        data = request.get_json()
+        request.admit(data)
+        params = parse_tokenize_request(data, request.args, self.config['PARALLEL_TOKENIZE'])
+        mode = params['mode']
+        await self._load_tenant(data)
+        if params['modes']:
+            return await self._tokenize_modes(request, params)
+
+        text, tokenizer, version, cache_key, tokens = prepare_tokenize(params['text'], mode, tenant=params['tenant'])
+        if tokens is None:
+            tokens = await self._cut(text, mode, tokenizer, version, cache_key, params)
+
+        if negotiate(request.accept, binary=True) == MIME_TOKENS:
+            return self._tokens_response([tokens], {'X-Token-Count': str(len(tokens))})
+        return self._response(request, data=tokenize_result_data(params, tokens),
+                              message=f"成功处理分词请求，模式: {mode}, 词汇数: {len(tokens)}")
+
+    async def _tokenize_modes(self, request, params):
+        """多模式分词：缓存查询和分词一起交给线程池"""
+        results = await self.executor.run(self.executor.lane_for(len(params['text'])), jieba_tokenize_modes,
+                                          params['text'], params['modes'], True, params['tenant'])
+        if negotiate(request.accept, binary=True) == MIME_TOKENS:
+            counts = ','.join(str(len(tokens)) for tokens in results.values())
+            return self._tokens_response(list(results.values()), {'X-Token-Count': counts})
+        return self._response(request, data=tokenize_modes_result_data(params, results),
+                              message=f"成功处理多模式分词请求，模式: {', '.join(params['modes'])}")
+
+    async def tokenize_batch(self, request):
+        """POST /api/tokenize/batch"""
+        data = request.get_json()
+        request.admit(data)
+        await self._load_tenant(data)
+        params = parse_batch_request(data, request.args, self.config['BATCH_MAX_ITEMS'])
+
+        plan = plan_batch(params['pairs'], tenant=params['tenant'])
+        outcomes = []
+        if plan.misses:
+            outcomes = await self.executor.run(self.executor.lane_for(plan.miss_chars), cut_batch, plan)
+        outcomes = complete_batch(plan, outcomes)
+
+        if negotiate(request.accept, binary=True) == MIME_TOKENS:
+            failed = sum(1 for _, error in outcomes if error is not None)
+            return self._tokens_response([tokens for tokens, _ in outcomes], {'X-Failed-Count': str(failed)})
+        result_data, failed = batch_result_data(params, outcomes)
+        return self._response(request, data=result_data,
+                              message=f"成功处理批量分词请求，条数: {len(outcomes)}, 失败: {failed}")
+
+
+def create_asgi_app(config_name='default'):
+    """
+    ASGI应用工厂函数（初始化过程与create_app相同）
+
+    Returns:
+        TokenizeASGI: ASGI应用
+    """
+    flask_app = create_app(config_name)
+    app_config = config[config_name]
+    executor = TokenizeExecutor(
+        short_workers=app_config.ASYNC_SHORT_WORKERS,
+        long_workers=app_config.ASYNC_LONG_WORKERS,
+        long_text_length=app_config.ASYNC_LONG_TEXT_LENGTH,
+        queue_limit=app_config.ASYNC_QUEUE_LIMIT
+    )
+    logging.info(f"异步模式已启用 - 短文本线程: {app_config.ASYNC_SHORT_WORKERS}, "
+                 f"长文本线程: {app_config.ASYNC_LONG_WORKERS}, 长文本阈值: {app_config.ASYNC_LONG_TEXT_LENGTH}字, "
+                 f"排队上限: {app_config.ASYNC_QUEUE_LIMIT}")
+    return TokenizeASGI(flask_app, executor)
@@ -0,0 +1,281 @@
+"""
+进程内微基准测试
+
+通过Flask测试客户端驱动应用，并直接调用核心函数，覆盖：
+- 短文本（20字）、中等文本（1000字）、长文本（12万字）
+- 精确、全模式、搜索引擎三种模式
+- 缓存冷（每次调用前清空缓存）和缓存热（重复同一文本）两种情况
+- 批量接口、流式接口和请求日志写入路径
+
+每个场景报告吞吐量、p50/p99延迟和单次调用的峰值内存分配（tracemalloc），结果写入JSON文件；
+指定基线文件时与基线比较，p50延迟、吞吐量或峰值内存的退化超过阈值则以非零状态退出。
+
+使用方法（在仓库根目录执行）：
+python benchmarks/bench.py --output bench.json
+python benchmarks/bench.py --save-baseline benchmarks/baseline.json
+python benchmarks/bench.py --baseline benchmarks/baseline.json --threshold 0.15
+python benchmarks/bench.py --filter 'cut/|tokenize_warm' --min-time 1
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import re
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+sys.path.insert(0, BENCH_DIR)
+
+from corpus import TEXT_SIZES, load_sentences, make_text, make_texts  # noqa: E402
+
+MODES = ('精确', '全模式', '搜索引擎')
+
+# 峰值内存的绝对变化小于该值时不视为退化（避免小分配的噪声）
+MEMORY_NOISE_BYTES = 64 * 1024
+
+
+def prepare_environment(workdir):
+    """把数据库和日志文件放到临时目录（必须在导入应用模块之前调用）"""
+    os.environ['DB_PATH'] = os.path.join(workdir, 'bench_stats.db')
+    os.environ['LOG_FILE'] = os.path.join(workdir, 'bench.log')
+    os.environ['FLASK_ENV'] = 'benchmark'
+
+
+def create_benchmark_app():
+    """
+    基于测试配置创建应用：启用缓存（以测量缓存冷热两种情况）并放宽文本长度限制
+
+    Returns:
+        tuple: (Flask应用, app模块)
+    """
+    import app as app_module
+    from config import config, TestingConfig
+
+    class BenchmarkConfig(TestingConfig):
+        CACHE_ENABLED = True
+        MAX_TEXT_LENGTH = 1000000
+        LOG_LEVEL = 'WARNING'
+        SERVER_TIMING_ENABLED = False
+
+    config['benchmark'] = BenchmarkConfig
+    return app_module.create_app('benchmark'), app_module
+
+
+def percentile(sorted_values, pct):
+    """已排序数据的百分位数（线性插值）"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def measure(func, setup=None, chars=0, min_iterations=5, min_time=0.5, max_iterations=5000):
+    """
+    重复执行func直到达到最少次数和最短时间，统计延迟分布
+
+    Args:
+        func (callable): 被测操作
+        setup (callable): 每次执行前的准备（不计入耗时），如清空缓存
+        chars (int): 每次操作处理的字符数，用于计算字符吞吐量
+        min_iterations (int): 最少执行次数
+        min_time (float): 最短总耗时（秒）
+        max_iterations (int): 最多执行次数
+
+    Returns:
+        dict: 次数、吞吐量、延迟分位数和峰值内存
+    """
+    # 预热一次，避免首次调用的一次性开销计入结果
+    if setup:
+        setup()
+    func()
+
+    latencies = []
+    total = 0.0
+    while len(latencies) < max_iterations and (len(latencies) < min_iterations or total < min_time):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        latencies.append(elapsed)
+        total += elapsed
+
+    # 单独执行一次测量峰值内存分配（tracemalloc会显著拖慢执行，不与计时混在一起）
+    if setup:
+        setup()
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'iterations': len(latencies),
+        'total_seconds': round(total, 6),
+        'ops_per_sec': round(len(latencies) / total, 3) if total else None,
+        'chars_per_sec': round(chars * len(latencies) / total, 1) if total and chars else None,
+        'mean_ms': round(total / len(latencies) * 1000, 4),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 4),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 4),
+        'peak_memory_bytes': peak
+    }
+
+
+def build_scenarios(app, app_module):
+    """
+    构建全部基准场景
+
+    Returns:
+        list: [(场景名, func, setup, 每次操作字符数), ...]
+    """
+    from datetime import datetime
+    from models import enqueue_request_log, save_request_logs
+
+    sentences = load_sentences()
+    texts = {size: make_text(sentences, length, seed=1) for size, length in TEXT_SIZES.items()}
+    client = app.test_client()
+    clear_cache = app_module._token_cache.clear
+    scenarios = []
+
+    for size, text in texts.items():
+        for mode in MODES:
+            suffix = f"{size}/{mode}"
+            scenarios.append((f"cut/{suffix}", lambda t=text, m=mode: app_module.cut_text(t, m), None, len(text)))
+            tokenize = (lambda t=text, m=mode: app_module.jieba_tokenize(t, m))
+            scenarios.append((f"tokenize_cold/{suffix}", tokenize, clear_cache, len(text)))
+            scenarios.append((f"tokenize_warm/{suffix}", tokenize, None, len(text)))
+
+            if size == 'long':
+                continue
+            body = {'text': text, 'mode': mode}
+
+            def post(b=body):
+                response = client.post('/api/tokenize', json=b)
+                assert response.status_code == 200, response.data
+            scenarios.append((f"http_tokenize_cold/{suffix}", post, clear_cache, len(text)))
+            scenarios.append((f"http_tokenize_warm/{suffix}", post, None, len(text)))
+
+    batch_items = make_texts(sentences, TEXT_SIZES['short'], 100, seed=2)
+
+    def post_batch():
+        response = client.post('/api/tokenize/batch', json={'items': batch_items})
+        assert response.status_code == 200, response.data
+    scenarios.append(("http_batch_cold/short x100", post_batch, clear_cache, sum(map(len, batch_items))))
+
+    long_bytes = texts['long'].encode('utf-8')
+
+    def post_stream():
+        response = client.post('/api/tokenize/stream', data=long_bytes, content_type='text/plain; charset=utf-8')
+        assert response.status_code == 200 and b'"done": true' in response.data[-200:], response.data[-200:]
+    scenarios.append(("http_stream/long/精确", post_stream, None, len(texts['long'])))
+
+    def enqueue_log():
+        enqueue_request_log('/api/tokenize', 'POST', 200, 0.001, '精确', 20)
+    scenarios.append(("request_log/enqueue", enqueue_log, None, 0))
+
+    log_rows = [(datetime.now(), '/api/tokenize', 'POST', 200, 0.001, '精确', 20)] * 500
+
+    def save_logs():
+        save_request_logs(log_rows)
+    scenarios.append(("request_log/save_batch x500", save_logs, None, 0))
+    return scenarios
+
+
+def compare(results, baseline, threshold):
+    """
+    与基线比较，返回退化描述列表
+
+    Args:
+        results (dict): 本次结果 {场景名: 指标}
+        baseline (dict): 基线结果 {场景名: 指标}
+        threshold (float): 允许的相对退化比例，如0.15表示15%
+
+    Returns:
+        list: 退化描述
+    """
+    regressions = []
+    for name, current in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if base['p50_ms'] and current['p50_ms'] > base['p50_ms'] * (1 + threshold):
+            regressions.append(f"{name}: p50 {base['p50_ms']:.3f}ms -> {current['p50_ms']:.3f}ms")
+        if base['ops_per_sec'] and current['ops_per_sec'] < base['ops_per_sec'] * (1 - threshold):
+            regressions.append(f"{name}: 吞吐量 {base['ops_per_sec']:.1f}/s -> {current['ops_per_sec']:.1f}/s")
+        memory_delta = current['peak_memory_bytes'] - base['peak_memory_bytes']
+        if memory_delta > MEMORY_NOISE_BYTES and current['peak_memory_bytes'] > base['peak_memory_bytes'] * (1 + threshold):
+            regressions.append(f"{name}: 峰值内存 {base['peak_memory_bytes']} -> {current['peak_memory_bytes']} 字节")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='jieba分词服务微基准测试')
+    parser.add_argument('--output', default='bench_output.json', help='结果JSON文件路径')
+    parser.add_argument('--baseline', help='与该基线JSON文件比较')
+    parser.add_argument('--save-baseline', help='把本次结果另存为基线文件')
+    parser.add_argument('--threshold', type=float, default=0.2, help='允许的相对退化比例（默认0.2即20%%）')
+    parser.add_argument('--filter', help='只运行名称匹配该正则的场景')
+    parser.add_argument('--min-time', type=float, default=0.5, help='每个场景的最短计时（秒）')
+    parser.add_argument('--min-iterations', type=int, default=5, help='每个场景的最少执行次数')
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix='jieba-bench-')
+    prepare_environment(workdir)
+    app, app_module = create_benchmark_app()
+    import jieba
+
+    pattern = re.compile(args.filter) if args.filter else None
+    results = {}
+    for name, func, setup, chars in build_scenarios(app, app_module):
+        if pattern and not pattern.search(name):
+            continue
+        results[name] = measure(func, setup, chars, min_iterations=args.min_iterations, min_time=args.min_time)
+        r = results[name]
+        print(f"{name:40s} {r['ops_per_sec']:>12.1f} ops/s  p50 {r['p50_ms']:>10.3f}ms  "
+              f"p99 {r['p99_ms']:>10.3f}ms  峰值内存 {r['peak_memory_bytes'] / 1024:>9.1f}KB", flush=True)
+
+    report = {
+        'meta': {
+            'timestamp': int(time.time()),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'jieba': jieba.__version__,
+            'cpu_count': os.cpu_count(),
+            'max_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        },
+        'results': results
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.output}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"基线已保存到 {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"发现 {len(regressions)} 项超过阈值 {args.threshold:.0%} 的性能退化：")
+            for line in regressions:
+                print(f"  - {line}")
+            return 1
+        print(f"与基线相比未发现超过阈值 {args.threshold:.0%} 的性能退化")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
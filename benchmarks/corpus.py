@@ -0,0 +1,66 @@
+"""
+基准测试语料
+
+corpus.txt收录新闻、科技、法律、医疗、电商、文学、财经等领域的中文段落（含数字、英文和标点），
+按给定长度和随机种子确定性地拼接出测试文本，保证多次运行使用完全相同的输入。
+
+使用方法：
+from corpus import load_sentences, make_text, make_texts
+"""
+
+import os
+import random
+import re
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus.txt')
+
+# 基准测试使用的文本长度档位（字符）
+TEXT_SIZES = {
+    'short': 20,
+    'medium': 1000,
+    'long': 120000
+}
+
+_SENTENCE_END = re.compile(r'(?<=[。！？；])')
+
+
+def load_sentences(path=CORPUS_PATH):
+    """
+    读取语料并按句切分
+
+    Returns:
+        list: 句子列表（保留句末标点）
+    """
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    sentences = []
+    for line in text.splitlines():
+        sentences.extend(s for s in _SENTENCE_END.split(line.strip()) if s)
+    return sentences
+
+
+def make_text(sentences, length, seed=0):
+    """
+    随机拼接句子，截取为恰好length个字符的文本
+
+    Args:
+        sentences (list): load_sentences的结果
+        length (int): 目标字符数
+        seed (int): 随机种子，相同种子生成相同文本
+
+    Returns:
+        str: 生成的文本
+    """
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    while total < length:
+        sentence = rng.choice(sentences)
+        parts.append(sentence)
+        total += len(sentence)
+    return ''.join(parts)[:length].strip() or sentences[0][:length]
+
+
+def make_texts(sentences, length, count, seed=0):
+    """生成count段互不相同（种子不同）的文本"""
+    return [make_text(sentences, length, seed * 100003 + i) for i in range(count)]
@@ -0,0 +1,363 @@
+"""
+基于请求日志的流量回放压测
+
+从 request_log 表读取真实流量的接口、模式和文本长度分布，用基准语料生成相同长度的合成文本，
+对本地启动的gunicorn实例（依次使用不同的worker数）发起请求，报告延迟分位数、错误率和饱和吞吐量，
+用于在部署前确定 WORKER_PROCESSES。
+
+两种方式：
+- sample：按日志分布随机抽样，在不同并发度下闭环压测（每个线程收到响应后立即发下一个请求），
+  吞吐量不再随并发增长时即为该worker数的饱和吞吐量
+- replay：按日志中的时间间隔（可用--speed加速）开环回放，观察真实到达节奏下的延迟
+
+被测实例使用临时目录中的数据库和日志，不会写入被读取的日志库。
+日志中分词模式不受支持的请求（客户端传入的无效模式）不回放，只报告跳过的条数，避免400响应计入错误率。
+
+使用方法（在仓库根目录执行）：
+python benchmarks/replay.py --db jieba_stats.db --workers 1,2,4 --concurrency 1,4,8,16
+python benchmarks/replay.py --db jieba_stats.db --mode replay --speed 5 --workers 4
+"""
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, REPO_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from config import get_config  # noqa: E402
+from corpus import load_sentences, make_text  # noqa: E402
+
+# 可以回放的接口
+REPLAYABLE_ENDPOINTS = ('/api/tokenize', '/api/tokenize/batch', '/api/tokenize/stream')
+
+
+def load_traffic(db_path, since=None, limit=None):
+    """
+    读取请求日志
+
+    Args:
+        db_path (str): 请求日志数据库
+        since (str): 只读取该时间之后的日志（如 "2025-01-01 00:00:00"）
+        limit (int): 最多读取最近的多少条
+
+    Returns:
+        list: 按时间排序的 {timestamp, endpoint, method, mode, text_length} 字典
+    """
+    sql = 'SELECT timestamp, endpoint, method, mode, text_length FROM request_log WHERE endpoint IN (?, ?, ?)'
+    params = list(REPLAYABLE_ENDPOINTS)
+    if since:
+        sql += ' AND timestamp >= ?'
+        params.append(since)
+    sql += ' ORDER BY id DESC'
+    if limit:
+        sql += ' LIMIT ?'
+        params.append(limit)
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(sql, params).fetchall()
+    finally:
+        conn.close()
+    traffic = [{
+        'timestamp': datetime.fromisoformat(timestamp).timestamp(),
+        'endpoint': endpoint,
+        'method': method,
+        'mode': mode,
+        'text_length': text_length
+    } for timestamp, endpoint, method, mode, text_length in reversed(rows)]
+    return traffic
+
+
+def filter_valid_modes(traffic, modes):
+    """
+    去掉分词模式不受支持的日志条目（未记录模式的条目按默认模式回放）
+
+    Args:
+        traffic (list): load_traffic的结果
+        modes: 支持的分词模式
+
+    Returns:
+        tuple: (可回放的条目列表, 跳过的条数)
+    """
+    kept = [row for row in traffic if row['mode'] is None or row['mode'] in modes]
+    return kept, len(traffic) - len(kept)
+
+
+class RequestFactory:
+    """根据日志条目生成请求（文本为与原请求长度相同的合成文本）"""
+
+    def __init__(self, traffic, batch_size=20, seed=0):
+        self.sentences = load_sentences()
+        self.batch_size = batch_size
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+        lengths = [row['text_length'] for row in traffic
+                   if row['endpoint'] == '/api/tokenize' and row['text_length']]
+        self.short_lengths = lengths or [20]
+
+    def _text(self, length):
+        with self._lock:
+            seed = self.rng.getrandbits(32)
+        return make_text(self.sentences, max(1, length), seed)
+
+    def build(self, row):
+        """
+        Returns:
+            tuple: (method, path, body, content_type)；body为None表示GET
+        """
+        endpoint, mode = row['endpoint'], row['mode'] or '精确'
+        if row['method'] == 'GET':
+            return 'GET', endpoint, None, None
+        if endpoint == '/api/tokenize/stream':
+            # 流式接口记录的是请求体字节数，中文UTF-8约3字节一个字符
+            text = self._text((row['text_length'] or 30000) // 3)
+            path = f"{endpoint}?{urllib.parse.urlencode({'mode': mode})}"
+            return 'POST', path, text.encode('utf-8'), 'text/plain; charset=utf-8'
+        if endpoint == '/api/tokenize/batch':
+            with self._lock:
+                lengths = [self.rng.choice(self.short_lengths) for _ in range(self.batch_size)]
+            body = {'items': [self._text(length) for length in lengths], 'mode': mode}
+        else:
+            body = {'text': self._text(row['text_length'] or 20), 'mode': mode}
+        return 'POST', endpoint, json.dumps(body, ensure_ascii=False).encode('utf-8'), 'application/json'
+
+
+def send(base_url, request_spec, timeout):
+    """
+    发送一个请求
+
+    Returns:
+        tuple: (耗时秒数, 是否成功)
+    """
+    method, path, body, content_type = request_spec
+    req = urllib.request.Request(base_url + path, data=body, method=method)
+    if content_type:
+        req.add_header('Content-Type', content_type)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            response.read()
+            ok = response.status < 400
+    except (urllib.error.URLError, OSError):
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def percentile(sorted_values, pct):
+    """已排序数据的百分位数（最近秩）"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def summarize(results, elapsed):
+    """汇总延迟分位数、错误率和吞吐量"""
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, ok in results if not ok)
+    return {
+        'requests': len(results),
+        'errors': errors,
+        'error_rate': round(errors / len(results), 4) if results else 0.0,
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_rps': round(len(results) / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p90_ms': round(percentile(latencies, 90) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0
+    }
+
+
+def run_closed_loop(base_url, specs, concurrency, timeout):
+    """concurrency个线程循环发送specs中的请求，直到全部发完"""
+    iterator = iter(specs)
+    lock = threading.Lock()
+    results = []
+
+    def worker():
+        while True:
+            with lock:
+                spec = next(iterator, None)
+            if spec is None:
+                return
+            outcome = send(base_url, spec, timeout)
+            with lock:
+                results.append(outcome)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(results, time.perf_counter() - start)
+
+
+def run_open_loop(base_url, traffic, factory, speed, max_in_flight, timeout):
+    """按日志时间间隔（除以speed）发送请求，不等待前一个请求完成"""
+    results = []
+    lock = threading.Lock()
+    lag = []
+
+    def task(spec):
+        outcome = send(base_url, spec, timeout)
+        with lock:
+            results.append(outcome)
+
+    origin = traffic[0]['timestamp']
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        for row in traffic:
+            spec = factory.build(row)
+            due = start + (row['timestamp'] - origin) / speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                lag.append(-delay)
+            executor.submit(task, spec)
+    summary = summarize(results, time.perf_counter() - start)
+    summary['max_schedule_lag_ms'] = round(max(lag) * 1000, 2) if lag else 0.0
+    return summary
+
+
+def start_server(workers, port, workdir, extra_env=None):
+    """
+    在本地启动gunicorn实例并等待就绪
+
+    Returns:
+        subprocess.Popen: gunicorn主进程
+    """
+    env = dict(os.environ)
+    env.update({
+        'WORKER_PROCESSES': str(workers),
+        'BIND': f"127.0.0.1:{port}",
+        'DB_PATH': os.path.join(workdir, f"replay_stats_{workers}.db"),
+        'LOG_FILE': os.path.join(workdir, f"replay_{workers}.log"),
+        'PROMETHEUS_MULTIPROC_DIR': os.path.join(workdir, f"prometheus_{workers}"),
+        'FLASK_ENV': env.get('FLASK_ENV', 'production'),
+        'SECRET_KEY': env.get('SECRET_KEY', 'replay-load-test'),
+        'LOG_LEVEL': env.get('LOG_LEVEL', 'WARNING')
+    })
+    env.update(extra_env or {})
+    output = open(os.path.join(workdir, f"gunicorn_{workers}.out"), 'wb')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--access-logfile', '/dev/null',
+         'app:create_app()'],
+        cwd=REPO_DIR, env=env, stdout=output, stderr=subprocess.STDOUT)
+
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn启动失败，详见 {output.name}")
+        latency, ok = send(base_url, ('GET', '/api/tokenize', None, None), timeout=2)
+        if ok:
+            return process
+        time.sleep(0.5)
+    stop_server(process)
+    raise RuntimeError("等待gunicorn就绪超时")
+
+
+def stop_server(process):
+    """关闭gunicorn实例"""
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='基于请求日志的流量回放压测')
+    parser.add_argument('--db', default=os.environ.get('DB_PATH', 'jieba_stats.db'), help='请求日志数据库')
+    parser.add_argument('--since', help='只使用该时间之后的日志')
+    parser.add_argument('--limit', type=int, default=100000, help='最多读取最近的多少条日志')
+    parser.add_argument('--mode', choices=('sample', 'replay'), default='sample')
+    parser.add_argument('--workers', default='1,2,4', help='依次测试的worker数，逗号分隔')
+    parser.add_argument('--concurrency', default='1,2,4,8,16', help='sample方式下依次测试的并发度')
+    parser.add_argument('--requests', type=int, default=500, help='sample方式下每个并发度发送的请求数')
+    parser.add_argument('--speed', type=float, default=1.0, help='replay方式的回放倍速')
+    parser.add_argument('--max-in-flight', type=int, default=64, help='replay方式的最大并发请求数')
+    parser.add_argument('--batch-size', type=int, default=20, help='批量接口每个请求的条数')
+    parser.add_argument('--timeout', type=float, default=30.0, help='单个请求超时（秒）')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='replay_report.json')
+    args = parser.parse_args(argv)
+
+    traffic, skipped = filter_valid_modes(load_traffic(args.db, args.since, args.limit),
+                                          get_config().TOKENIZE_MODES)
+    if skipped:
+        print(f"跳过 {skipped} 条分词模式不受支持的请求日志")
+    if not traffic:
+        print(f"{args.db} 中没有可回放的请求日志")
+        return 1
+    endpoints = {}
+    for row in traffic:
+        endpoints[row['endpoint']] = endpoints.get(row['endpoint'], 0) + 1
+    print(f"读取 {len(traffic)} 条请求日志: {endpoints}")
+
+    factory = RequestFactory(traffic, batch_size=args.batch_size, seed=args.seed)
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix='jieba-replay-')
+    base_url = f"http://127.0.0.1:{args.port}"
+    report = {'mode': args.mode, 'db': args.db, 'traffic_size': len(traffic), 'skipped_invalid_mode': skipped,
+              'endpoints': endpoints, 'runs': []}
+
+    for workers in [int(value) for value in args.workers.split(',')]:
+        process = start_server(workers, args.port, workdir)
+        try:
+            run = {'workers': workers}
+            if args.mode == 'sample':
+                levels = []
+                for concurrency in [int(value) for value in args.concurrency.split(',')]:
+                    specs = [factory.build(row) for row in rng.choices(traffic, k=args.requests)]
+                    summary = run_closed_loop(base_url, specs, concurrency, args.timeout)
+                    summary['concurrency'] = concurrency
+                    levels.append(summary)
+                    print(f"workers={workers} 并发={concurrency:<3d} {summary['throughput_rps']:>8.1f} req/s  "
+                          f"p50 {summary['p50_ms']:>8.1f}ms  p99 {summary['p99_ms']:>8.1f}ms  "
+                          f"错误率 {summary['error_rate']:.2%}", flush=True)
+                best = max(levels, key=lambda level: level['throughput_rps'])
+                run.update({'levels': levels, 'saturation_rps': best['throughput_rps'],
+                            'saturation_concurrency': best['concurrency']})
+            else:
+                summary = run_open_loop(base_url, traffic, factory, args.speed, args.max_in_flight, args.timeout)
+                run.update(summary)
+                print(f"workers={workers} 回放 {summary['requests']} 个请求 {summary['throughput_rps']:.1f} req/s  "
+                      f"p50 {summary['p50_ms']:.1f}ms  p99 {summary['p99_ms']:.1f}ms  "
+                      f"错误率 {summary['error_rate']:.2%}  最大调度延迟 {summary['max_schedule_lag_ms']:.1f}ms",
+                      flush=True)
+            report['runs'].append(run)
+        finally:
+            stop_server(process)
+
+    if args.mode == 'sample':
+        print("各worker数的饱和吞吐量：")
+        for run in report['runs']:
+            print(f"  workers={run['workers']}: {run['saturation_rps']:.1f} req/s (并发 {run['saturation_concurrency']})")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"报告已写入 {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
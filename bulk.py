@@ -0,0 +1,611 @@
+"""
+离线批量分词
+
+对大规模语料分词，不经过HTTP接口。输入为每行一条文本的纯文本文件或JSONL文件（任意大小，流式读取），
+输出为JSONL，每行对应一条输入。文本的规范化与接口一致（去除首尾空白、过滤空白词），
+词典按与服务相同的配置加载（JIEBA_DICT_PATH、JIEBA_USER_DICT_PATH等环境变量），不受MAX_TEXT_LENGTH限制。
+
+处理流程：
+- 读取线程按行读取输入，每chunk_size条（或累计chunk_bytes字节）组成一个分块，放入有界任务队列
+- 多个分词进程各自解析、分词并把结果序列化为JSONL，放入有界结果队列
+- 主线程写出结果：默认按输入顺序写出；--unordered 时按完成顺序写出，不等待慢的分块
+- 同时在途（已读取未写出）的分块数有上限，内存占用与输入大小无关
+
+输出到文件时定期写入检查点（输出文件名 + .checkpoint），记录已连续完成的输入位置、输出文件长度和
+之后已写出的分块；中断后用 --resume 从检查点继续，截去检查点之后写出的不完整内容，已写出的分块不再重复处理。
+全部完成后删除检查点。
+
+--aggregate 时只统计词频，不输出各行的分词结果：每个分词进程累计自己处理的所有分块，结束时把计数表交给主进程合并，
+输出一个JSON词频表（与 /api/terms 的结果格式相同）。完整的词频表（--top-k 0，默认）可以用 --merge
+合并多台机器分别统计的结果。词频统计不写检查点。
+
+输出格式：
+    {"line": 行号, "tokens": [...]}                    # 单个分词模式
+    {"line": 行号, "results": {"精确": [...], ...}}     # 多个分词模式
+    {"line": 行号, "error": "错误信息"}                  # 无法处理的行
+JSONL输入中带有id字段时同时输出id。纯文本输入的空行跳过。
+
+使用方法（在仓库根目录执行）：
+python bulk.py corpus.txt -o tokens.jsonl
+python bulk.py corpus.jsonl -o tokens.jsonl --modes 精确,搜索引擎 --processes 16 --unordered
+python bulk.py corpus.jsonl -o tokens.jsonl --resume
+python bulk.py corpus.txt -o terms.json --aggregate --stopwords stopwords.txt --min-length 2
+python bulk.py --merge node1.json node2.json -o terms.json --top-k 1000
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+
+from app import cut_text, cut_text_modes, setup_jieba, term_words
+from config import get_config
+from terms import TermFilter, TermCounter, load_stopwords
+
+CHECKPOINT_SUFFIX = '.checkpoint'
+
+# 检查点中必须与本次运行一致的参数（决定分块划分和输出内容）
+_CHECKPOINT_PARAMS = ('input', 'format', 'modes', 'text_field', 'id_field', 'chunk_size', 'chunk_bytes', 'ordered')
+
+
+def detect_format(path):
+    """根据扩展名判断输入格式：.jsonl/.ndjson为JSONL，其他为纯文本"""
+    return 'jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'text'
+
+
+def _parse_record(raw, line, options):
+    """
+    解析一行输入
+
+    Returns:
+        tuple: (输出记录，空行时为None, 去除首尾空白的文本，无法处理时为None)
+    """
+    try:
+        content = raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return {'line': line, 'error': "输入不是有效的UTF-8文本"}, None
+
+    record = {'line': line}
+    if options['format'] == 'jsonl':
+        if not content.strip():
+            return None, None
+        try:
+            data = json.loads(content)
+        except ValueError:
+            return {'line': line, 'error': "JSON格式错误"}, None
+        if not isinstance(data, dict):
+            return {'line': line, 'error': "每行必须是JSON对象"}, None
+        if data.get(options['id_field']) is not None:
+            record['id'] = data[options['id_field']]
+        text = data.get(options['text_field'])
+        if not isinstance(text, str) or not text.strip():
+            record['error'] = f"{options['text_field']}字段必须是非空字符串"
+            return record, None
+    else:
+        text = content
+        if not text.strip():
+            return None, None
+    # 与接口相同的规范化：去除首尾空白，分词后过滤空白词
+    return record, text.strip()
+
+
+def _tokenize_record(raw, line, options):
+    """
+    处理一行输入
+
+    Returns:
+        tuple: (输出记录，空行时为None, 字符数)
+    """
+    record, text = _parse_record(raw, line, options)
+    if text is None:
+        return record, 0
+    modes = options['modes']
+    try:
+        if len(modes) == 1:
+            record['tokens'] = cut_text(text, modes[0])
+        else:
+            record['results'] = cut_text_modes(text, modes)
+    except Exception as e:
+        record['error'] = f"分词失败: {e}"
+        return record, 0
+    return record, len(text)
+
+
+def _count_chunk(counter, first_line, lines, options):
+    """把一个分块的词累计到本进程的词频计数中，返回 (条数, 字符数, 错误数, 跳过数)"""
+    docs = chars = errors = skipped = 0
+    mode = options['modes'][0]
+    for index, raw in enumerate(lines):
+        record, text = _parse_record(raw, first_line + index, options)
+        if record is None:
+            skipped += 1
+        elif text is None:
+            errors += 1
+        else:
+            try:
+                counter.add(term_words(text, mode, options['filter']))
+            except Exception:
+                errors += 1
+                continue
+            docs += 1
+            chars += len(text)
+    return docs, chars, errors, skipped
+
+
+def _worker(tasks, results, options):
+    """
+    分词进程：从任务队列取分块，输出 (序号, JSONL字节, 条数, 字符数, 错误数, 跳过数)
+
+    统计词频时每个分块只输出计数（JSONL为空），词频累计在本进程中，结束时输出 (None, 词频表, 0, 0, 0, 0)
+    """
+    import jieba
+    # 中断由主进程处理（保存检查点后终止子进程）
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if not jieba.dt.initialized:
+        # spawn方式启动时子进程需要自行加载词典（fork方式继承父进程已加载的词典）
+        setup_jieba()
+    counter = TermCounter() if options['filter'] is not None else None
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        seq, first_line, lines = task
+        if counter is not None:
+            results.put((seq, b'', *_count_chunk(counter, first_line, lines, options)))
+            continue
+        parts = []
+        docs = chars = errors = skipped = 0
+        for index, raw in enumerate(lines):
+            record, length = _tokenize_record(raw, first_line + index, options)
+            if record is None:
+                skipped += 1
+                continue
+            if 'error' in record:
+                errors += 1
+            else:
+                docs += 1
+                chars += length
+            parts.append(json.dumps(record, ensure_ascii=False))
+            parts.append('\n')
+        results.put((seq, ''.join(parts).encode('utf-8'), docs, chars, errors, skipped))
+    if counter is not None:
+        results.put((None, counter.to_dict(), 0, 0, 0, 0))
+
+
+def load_checkpoint(path):
+    """读取检查点，不存在时返回None"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(path, state):
+    """原子写入检查点（先写临时文件再替换）"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class BulkJob:
+    """
+    一次批量分词任务
+
+    Args:
+        input_path (str): 输入文件，'-'表示标准输入
+        output_path (str): 输出文件，'-'表示标准输出
+        modes (list): 分词模式
+        processes (int): 分词进程数
+        ordered (bool): 是否按输入顺序写出
+        input_format (str): 'text' 或 'jsonl'
+        text_field (str): JSONL中文本所在的字段
+        id_field (str): JSONL中原样输出的标识字段
+        chunk_size (int): 每个分块的最大条数
+        chunk_bytes (int): 每个分块的最大输入字节数
+        checkpoint_interval (float): 写入检查点的间隔（秒）
+        progress_interval (float): 输出进度的间隔（秒，0表示不输出）
+        term_filter (TermFilter): 指定时只统计词频（只能使用一个分词模式）
+        top_k (int): 统计词频时输出的词数，0表示完整的词频表
+    """
+
+    def __init__(self, input_path, output_path, modes, processes, ordered=True, input_format='text',
+                 text_field='text', id_field='id', chunk_size=256, chunk_bytes=4 * 1024 * 1024,
+                 checkpoint_interval=30.0, progress_interval=10.0, term_filter=None, top_k=0):
+        self.input_path = input_path
+        self.output_path = output_path
+        self.modes = modes
+        self.processes = processes
+        self.ordered = ordered
+        self.input_format = input_format
+        self.text_field = text_field
+        self.id_field = id_field
+        self.chunk_size = chunk_size
+        self.chunk_bytes = chunk_bytes
+        self.checkpoint_interval = checkpoint_interval
+        self.progress_interval = progress_interval
+        self.term_filter = term_filter
+        self.top_k = top_k
+        self.counter = TermCounter()
+        self.checkpoint_path = None
+        if input_path != '-' and output_path != '-' and term_filter is None:
+            self.checkpoint_path = output_path + CHECKPOINT_SUFFIX
+
+        # 已连续完成的分块前缀：序号、对应的输入字节位置和行号
+        self.next_prefix = 0
+        self.prefix_offset = 0
+        self.prefix_line = 0
+        self.done_after = set()  # 前缀之后已写出的分块（仅--unordered）
+        self.docs = self.chars = self.errors = self.skipped = 0
+        self.resumed_docs = self.resumed_chars = 0
+        self.elapsed_before = 0.0
+
+        self._chunk_ends = {}  # 分块序号 -> (输入结束位置, 结束行号)
+        self._total_chunks = None
+        self._reader_error = None
+        self._in_flight = threading.BoundedSemaphore(max(1, processes) * 4)
+        self._stop = threading.Event()
+
+    def _params(self):
+        return {
+            'input': os.path.abspath(self.input_path),
+            'format': self.input_format,
+            'modes': self.modes,
+            'text_field': self.text_field,
+            'id_field': self.id_field,
+            'chunk_size': self.chunk_size,
+            'chunk_bytes': self.chunk_bytes,
+            'ordered': self.ordered
+        }
+
+    def restore(self, checkpoint):
+        """
+        从检查点恢复进度
+
+        Raises:
+            ValueError: 检查点与本次运行的参数不一致
+        """
+        params = self._params()
+        mismatched = [name for name in _CHECKPOINT_PARAMS if checkpoint.get(name) != params[name]]
+        if mismatched:
+            raise ValueError(f"检查点与本次运行的参数不一致: {', '.join(mismatched)}")
+        self.next_prefix = checkpoint['seq']
+        self.prefix_offset = checkpoint['input_offset']
+        self.prefix_line = checkpoint['line']
+        self.done_after = set(checkpoint['done'])
+        self.docs = self.resumed_docs = checkpoint['docs']
+        self.chars = self.resumed_chars = checkpoint['chars']
+        self.errors = checkpoint['errors']
+        self.skipped = checkpoint['skipped']
+        self.elapsed_before = checkpoint.get('elapsed', 0.0)
+        return checkpoint['output_bytes']
+
+    def _read(self, source, tasks):
+        """读取线程：把输入切成分块放入任务队列（在途分块数达到上限时阻塞）"""
+        try:
+            offset, line = self.prefix_offset, self.prefix_line
+            seq = self.next_prefix
+            lines = []
+            size = 0
+            first_line = line + 1
+            for raw in source:
+                offset += len(raw)
+                line += 1
+                lines.append(raw)
+                size += len(raw)
+                if len(lines) >= self.chunk_size or size >= self.chunk_bytes:
+                    self._submit(tasks, seq, first_line, lines, offset, line)
+                    seq += 1
+                    lines, size, first_line = [], 0, line + 1
+                if self._stop.is_set():
+                    return
+            if lines:
+                self._submit(tasks, seq, first_line, lines, offset, line)
+                seq += 1
+            self._total_chunks = seq
+        except Exception as e:
+            self._reader_error = e
+        finally:
+            for _ in range(self.processes):
+                tasks.put(None)
+
+    def _submit(self, tasks, seq, first_line, lines, offset, line):
+        self._chunk_ends[seq] = (offset, line)
+        if seq in self.done_after:
+            return
+        self._in_flight.acquire()
+        tasks.put((seq, first_line, lines))
+
+    def _advance_prefix(self, seq=None):
+        """记录分块已写出，并推进连续完成的前缀（续传时跳过的分块在读取线程读过之后才能计入前缀）"""
+        if seq is not None:
+            self.done_after.add(seq)
+        while self.next_prefix in self.done_after and self.next_prefix in self._chunk_ends:
+            self.done_after.remove(self.next_prefix)
+            self.prefix_offset, self.prefix_line = self._chunk_ends.pop(self.next_prefix)
+            self.next_prefix += 1
+
+    def _checkpoint(self, output, elapsed):
+        output.flush()
+        os.fsync(output.fileno())
+        state = dict(self._params())
+        state.update({
+            'seq': self.next_prefix,
+            'input_offset': self.prefix_offset,
+            'line': self.prefix_line,
+            'done': sorted(self.done_after),
+            'output_bytes': output.tell(),
+            'docs': self.docs,
+            'chars': self.chars,
+            'errors': self.errors,
+            'skipped': self.skipped,
+            'elapsed': self.elapsed_before + elapsed,
+            'saved_at': time.time()
+        })
+        save_checkpoint(self.checkpoint_path, state)
+
+    def _rates(self, elapsed):
+        """本次运行的 (条/秒, 字/秒)"""
+        if elapsed <= 0:
+            return 0.0, 0.0
+        return (self.docs - self.resumed_docs) / elapsed, (self.chars - self.resumed_chars) / elapsed
+
+    def _report(self, elapsed, final=False):
+        rate, char_rate = self._rates(elapsed)
+        prefix = "完成" if final else "进度"
+        print(f"{prefix}: {self.docs} 条, {self.chars} 字, 错误 {self.errors}, 跳过空行 {self.skipped}, "
+              f"{rate:.1f} 条/秒, {char_rate:.0f} 字/秒, 耗时 {elapsed:.1f}s", file=sys.stderr, flush=True)
+
+    def run(self, resume=False):
+        """
+        执行任务
+
+        Returns:
+            dict: 条数、字符数、错误数、耗时和吞吐量
+        """
+        output_bytes = 0
+        if self.checkpoint_path is not None:
+            checkpoint = load_checkpoint(self.checkpoint_path) if resume else None
+            if checkpoint is not None:
+                output_bytes = self.restore(checkpoint)
+                print(f"从检查点继续: 第 {self.prefix_line} 行之后，已完成 {self.docs} 条",
+                      file=sys.stderr, flush=True)
+            elif os.path.exists(self.checkpoint_path):
+                os.remove(self.checkpoint_path)
+        elif resume:
+            raise ValueError("断点续传需要输入和输出都是文件，且不能用于词频统计")
+
+        if self.input_path == '-':
+            source = sys.stdin.buffer
+        else:
+            source = open(self.input_path, 'rb')
+            source.seek(self.prefix_offset)
+        if self.output_path == '-':
+            output = sys.stdout.buffer
+        elif output_bytes:
+            output = open(self.output_path, 'r+b')
+            output.truncate(output_bytes)
+            output.seek(output_bytes)
+        else:
+            output = open(self.output_path, 'wb')
+
+        options = {'format': self.input_format, 'modes': self.modes, 'filter': self.term_filter,
+                   'text_field': self.text_field, 'id_field': self.id_field}
+        queue_size = max(1, self.processes) * 2
+        tasks = multiprocessing.Queue(queue_size)
+        results = multiprocessing.Queue(queue_size)
+        # 先创建子进程再启动读取线程，fork时进程中没有其他线程
+        workers = [multiprocessing.Process(target=_worker, args=(tasks, results, options), daemon=True)
+                   for _ in range(max(1, self.processes))]
+        for worker in workers:
+            worker.start()
+        reader = threading.Thread(target=self._read, args=(source, tasks), daemon=True)
+        reader.start()
+
+        start = time.perf_counter()
+        last_checkpoint = last_report = start
+        pending = {}  # 按顺序写出时等待前面分块的结果
+        next_write = self.next_prefix
+        counters = 0  # 已收到的分词进程词频表数
+        try:
+            while True:
+                self._advance_prefix()
+                if self._reader_error is not None:
+                    raise self._reader_error
+                if self._total_chunks is not None and self.next_prefix >= self._total_chunks:
+                    if self.term_filter is None or counters == len(workers):
+                        break
+                try:
+                    seq, payload, docs, chars, errors, skipped = results.get(timeout=0.5)
+                except queue.Empty:
+                    dead = [worker for worker in workers if worker.exitcode not in (None, 0)]
+                    if dead:
+                        raise RuntimeError(f"分词进程异常退出 (exitcode: {dead[0].exitcode})")
+                    continue
+                if seq is None:
+                    # 分词进程处理完所有分块后交回的词频表
+                    self.counter.merge(TermCounter.from_dict(payload))
+                    counters += 1
+                    continue
+
+                if self.ordered:
+                    pending[seq] = (payload, docs, chars, errors, skipped)
+                    ready = []
+                    while next_write in pending:
+                        ready.append((next_write, pending.pop(next_write)))
+                        next_write += 1
+                else:
+                    ready = [(seq, (payload, docs, chars, errors, skipped))]
+                for seq, (payload, docs, chars, errors, skipped) in ready:
+                    output.write(payload)
+                    self.docs += docs
+                    self.chars += chars
+                    self.errors += errors
+                    self.skipped += skipped
+                    self._advance_prefix(seq)
+                    self._in_flight.release()
+
+                now = time.perf_counter()
+                if self.checkpoint_path is not None and now - last_checkpoint >= self.checkpoint_interval:
+                    self._checkpoint(output, now - start)
+                    last_checkpoint = now
+                if self.progress_interval and now - last_report >= self.progress_interval:
+                    self._report(now - start)
+                    last_report = now
+            if self.term_filter is not None:
+                output.write(json.dumps(self.counter.to_dict(self.top_k), ensure_ascii=False).encode('utf-8'))
+                output.write(b'\n')
+        except BaseException:
+            self._stop.set()
+            if self.checkpoint_path is not None:
+                self._checkpoint(output, time.perf_counter() - start)
+                print(f"已保存检查点 {self.checkpoint_path}，使用 --resume 继续", file=sys.stderr, flush=True)
+            for worker in workers:
+                worker.terminate()
+            # 子进程已终止，队列中未送出的数据直接丢弃，退出时不等待
+            tasks.cancel_join_thread()
+            results.cancel_join_thread()
+            raise
+        finally:
+            output.flush()
+            if output is not sys.stdout.buffer:
+                output.close()
+            if source is not sys.stdin.buffer:
+                source.close()
+
+        for worker in workers:
+            worker.join()
+        if self.checkpoint_path is not None and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+        elapsed = time.perf_counter() - start
+        self._report(elapsed, final=True)
+        rate, char_rate = self._rates(elapsed)
+        return {
+            'docs': self.docs,
+            'chars': self.chars,
+            'errors': self.errors,
+            'skipped': self.skipped,
+            'seconds': round(self.elapsed_before + elapsed, 3),
+            'docs_per_second': round(rate, 1),
+            'chars_per_second': round(char_rate, 1)
+        }
+
+
+def merge_term_files(paths, output_path, top_k=0):
+    """
+    合并多个词频统计结果（bulk.py --aggregate 的输出或 /api/terms 的响应）
+
+    Returns:
+        TermCounter: 合并后的计数
+    """
+    counter = TermCounter()
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if isinstance(data, dict) and isinstance(data.get('data'), dict):
+            data = data['data']
+        counter.merge(TermCounter.from_dict(data))
+    if not counter.complete:
+        print("警告: 部分输入只包含词频最高的词，合并结果不是精确值", file=sys.stderr)
+    content = json.dumps(counter.to_dict(top_k), ensure_ascii=False) + '\n'
+    if output_path == '-':
+        sys.stdout.write(content)
+    else:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+    return counter
+
+
+def main(argv=None):
+    app_config = get_config()
+
+    parser = argparse.ArgumentParser(description='离线批量分词（多进程流式处理，支持断点续传）')
+    parser.add_argument('input', nargs='?', help="输入文件（每行一条文本或JSONL），'-'表示标准输入")
+    parser.add_argument('-o', '--output', default='-', help="输出JSONL文件，'-'表示标准输出")
+    parser.add_argument('--modes', default=app_config.DEFAULT_TOKENIZE_MODE, help='分词模式，多个用逗号分隔')
+    parser.add_argument('--format', choices=('text', 'jsonl'), help='输入格式，默认按扩展名判断')
+    parser.add_argument('--text-field', default='text', help='JSONL中文本所在的字段')
+    parser.add_argument('--id-field', default='id', help='JSONL中原样输出的标识字段')
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help='分词进程数')
+    parser.add_argument('--unordered', action='store_true', help='按完成顺序写出（不等待慢的分块）')
+    parser.add_argument('--chunk-size', type=int, default=256, help='每个分块的最大条数')
+    parser.add_argument('--chunk-bytes', type=int, default=4 * 1024 * 1024, help='每个分块的最大输入字节数')
+    parser.add_argument('--checkpoint-interval', type=float, default=30.0, help='写入检查点的间隔（秒）')
+    parser.add_argument('--progress-interval', type=float, default=10.0, help='输出进度的间隔（秒，0表示不输出）')
+    parser.add_argument('--resume', action='store_true', help='从输出文件的检查点继续')
+    parser.add_argument('--aggregate', action='store_true', help='只统计词频，输出JSON词频表')
+    parser.add_argument('--top-k', type=int, default=0, help='词频表只保留词频最高的K个词（0表示完整，可合并）')
+    parser.add_argument('--stopwords', default=app_config.STOPWORDS_PATH, help='停用词文件（默认STOPWORDS_PATH）')
+    parser.add_argument('--min-length', type=int, default=1, help='参与词频统计的词的最小字符数')
+    parser.add_argument('--pos', help='只统计这些词性前缀的词，逗号分隔（如 n,v，仅精确模式）')
+    parser.add_argument('--merge', nargs='+', metavar='FILE', help='合并多个词频表文件（不分词）')
+    args = parser.parse_args(argv)
+
+    if args.top_k < 0 or args.min_length < 1:
+        parser.error("--top-k 不能为负数，--min-length 必须大于0")
+    if args.merge:
+        try:
+            merge_term_files(args.merge, args.output, args.top_k)
+        except (OSError, ValueError) as e:
+            print(f"错误: {e}", file=sys.stderr)
+            return 2
+        return 0
+    if args.input is None:
+        parser.error("需要指定输入文件")
+
+    modes = list(dict.fromkeys(mode.strip() for mode in args.modes.split(',') if mode.strip()))
+    invalid = [mode for mode in modes if mode not in app_config.TOKENIZE_MODES]
+    if not modes or invalid:
+        parser.error(f"不支持的分词模式: {', '.join(invalid) or args.modes}")
+    if args.processes <= 0 or args.chunk_size <= 0 or args.chunk_bytes <= 0:
+        parser.error("--processes、--chunk-size、--chunk-bytes 必须大于0")
+    term_filter = None
+    if args.aggregate:
+        pos = [item.strip() for item in args.pos.split(',') if item.strip()] if args.pos else None
+        if len(modes) != 1 or (pos and modes[0] != '精确'):
+            parser.error("词频统计只能使用一个分词模式，按词性过滤时只能使用精确模式")
+        try:
+            stopwords = load_stopwords(args.stopwords)
+        except OSError as e:
+            print(f"错误: {e}", file=sys.stderr)
+            return 2
+        term_filter = TermFilter(stopwords, args.min_length, pos)
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    setup_jieba(app_config)
+
+    job = BulkJob(
+        args.input, args.output, modes, args.processes,
+        ordered=not args.unordered,
+        input_format=args.format or detect_format(args.input),
+        text_field=args.text_field,
+        id_field=args.id_field,
+        chunk_size=args.chunk_size,
+        chunk_bytes=args.chunk_bytes,
+        checkpoint_interval=args.checkpoint_interval,
+        progress_interval=args.progress_interval,
+        term_filter=term_filter,
+        top_k=args.top_k
+    )
+    try:
+        job.run(resume=args.resume)
+    except (OSError, ValueError) as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+    except KeyboardInterrupt:
+        return 130
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
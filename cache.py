@@ -0,0 +1,1021 @@
+"""
+分词结果缓存
+
+提供两级缓存：
+- TokenCache：进程内线程安全的LRU缓存（L1），同时按条目数和估算内存字节数限制容量，
+  支持可选的过期时间，并按分词模式统计命中、未命中和淘汰次数。
+- SharedCache：基于本地SQLite文件的共享缓存（L2），同一主机上的所有gunicorn worker共用。
+- CompactTokens：原文 + 词语偏移数组的紧凑分词结果，命中时再还原为词语列表。
+- SingleFlight：合并同一缓存键的并发未命中，只有一个调用者执行分词，其余等待它的结果。
+- CacheSnapshotter：定期和退出时把L1缓存保存为快照文件，启动时用load_snapshot加载。
+
+使用方法：
+from cache import TokenCache, SharedCache, SingleFlight, CacheSnapshotter, load_snapshot, make_cache_key
+from cache import compact_value, expand_value, locate_tokens
+"""
+
+import asyncio
+import hashlib
+import logging
+import marshal
+import os
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+# OrderedDict节点、条目元组等固定开销的粗略估计（字节）
+_ENTRY_OVERHEAD = 160
+
+
+def make_cache_key(text, mode, namespace=None):
+    """
+    生成缓存键：分词模式 + 命名空间（如词典版本） + 文本内容摘要
+
+    使用blake2b摘要代替内置hash()，避免哈希碰撞和进程间随机化导致的键不一致。
+
+    Args:
+        text (str): 已去除首尾空白的文本
+        mode (str): 分词模式
+        namespace (str): 可选的命名空间，不同命名空间的条目互不影响
+
+    Returns:
+        str: 形如 "精确:<命名空间>:<32位十六进制摘要>" 的缓存键
+    """
+    digest = hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+    if namespace:
+        return f"{mode}:{namespace}:{digest}"
+    return f"{mode}:{digest}"
+
+
+def key_namespace(cache_key):
+    """从缓存键中取出命名空间，没有时返回None"""
+    parts = cache_key.split(':')
+    return parts[1] if len(parts) > 2 else None
+
+
+def key_mode(cache_key):
+    """从缓存键中取出分词模式"""
+    return cache_key.partition(':')[0]
+
+
+def estimate_size(value):
+    """
+    估算缓存值占用的内存字节数
+
+    Args:
+        value: 缓存值（字符串、列表/元组、字典或带nbytes属性的对象）
+
+    Returns:
+        int: 估算字节数
+    """
+    if isinstance(value, str):
+        return sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_size(k) + estimate_size(v) for k, v in value.items())
+    nbytes = getattr(value, 'nbytes', None)
+    if nbytes is not None:
+        return nbytes
+    return sys.getsizeof(value)
+
+
+def locate_tokens(text, tokens, contiguous=False):
+    """
+    求每个词在原文中的 [起始, 结束) 字符偏移
+
+    Args:
+        text (str): 原文（已去除首尾空白）
+        tokens (list): 分词结果，每个词都是原文的子串
+        contiguous (bool): 词语按原文顺序且互不重叠（精确模式）。此时从上一个词的结尾继续查找，
+            偏移是准确的；否则（全模式、搜索引擎模式的词语互相重叠）从上一个词的起点往前一个词长处开始查找，
+            原文中有重复子串时可能定位到另一处相同的子串，按偏移切片得到的词语不变
+
+    Returns:
+        array: 依次为各词的起始、结束偏移（原文不足65536字符时为uint16，否则为uint32）；
+               有词不是原文子串时返回None
+    """
+    offsets = array('H' if len(text) < 65536 else 'I')
+    append = offsets.append
+    find = text.find
+    start = end = 0
+    for token in tokens:
+        start = find(token, end if contiguous else max(0, start - len(token)))
+        if start < 0:
+            start = find(token)
+            if start < 0:
+                return None
+        end = start + len(token)
+        append(start)
+        append(end)
+    return offsets
+
+
+class CompactTokens:
+    """
+    紧凑保存的分词结果：原文 + 各词的字符偏移数组
+
+    列表中的每个词都是一个独立的str对象（约50字节固定开销），而分词结果中的词都是原文的子串，
+    用一个字符串和一段连续的整数数组保存，同样内存可以缓存数倍的条目；命中时按偏移切片还原为词语列表。
+    """
+
+    __slots__ = ('text', 'offsets')
+
+    def __init__(self, text, offsets):
+        self.text = text
+        self.offsets = offsets
+
+    @classmethod
+    def from_tokens(cls, text, tokens):
+        """由原文和分词结果构建，有词不是原文子串时返回None"""
+        offsets = locate_tokens(text, tokens)
+        return cls(text, offsets) if offsets is not None else None
+
+    def tokens(self):
+        """还原为词语列表"""
+        text = self.text
+        pairs = iter(self.offsets)
+        return [text[start:end] for start, end in zip(pairs, pairs)]
+
+    def spans(self):
+        """各词的 (起始, 结束) 偏移列表"""
+        pairs = iter(self.offsets)
+        return list(zip(pairs, pairs))
+
+    def __len__(self):
+        return len(self.offsets) // 2
+
+    @property
+    def nbytes(self):
+        return sys.getsizeof(self) + sys.getsizeof(self.text) + sys.getsizeof(self.offsets)
+
+    def pack(self):
+        """转换为可被marshal序列化的元组"""
+        return (self.text, self.offsets.typecode, self.offsets.tobytes())
+
+    @classmethod
+    def unpack(cls, data):
+        text, typecode, raw = data
+        offsets = array(typecode)
+        offsets.frombytes(raw)
+        return cls(text, offsets)
+
+
+def compact_value(text, value):
+    """
+    把分词结果（列表，或多模式的 {分词模式: 列表}）转换为CompactTokens，无法转换的部分保持原样
+
+    Args:
+        text (str): 分词的原文
+        value: 分词结果
+
+    Returns:
+        转换后的缓存值
+    """
+    if isinstance(value, dict):
+        return {mode: compact_value(text, tokens) for mode, tokens in value.items()}
+    if isinstance(value, list):
+        compact = CompactTokens.from_tokens(text, value)
+        if compact is not None:
+            return compact
+    return value
+
+
+def expand_value(value):
+    """把缓存值中的CompactTokens还原为词语列表"""
+    if isinstance(value, CompactTokens):
+        return value.tokens()
+    if isinstance(value, dict):
+        return {mode: expand_value(tokens) for mode, tokens in value.items()}
+    return value
+
+
+def _pack_value(value):
+    """序列化前把CompactTokens转换为元组（列表仍按列表保存，兼容已有的L2和快照数据）"""
+    if isinstance(value, CompactTokens):
+        return value.pack()
+    if isinstance(value, dict):
+        return {mode: _pack_value(tokens) for mode, tokens in value.items()}
+    return value
+
+
+def _unpack_value(value):
+    if isinstance(value, tuple):
+        return CompactTokens.unpack(value)
+    if isinstance(value, dict):
+        return {mode: _unpack_value(tokens) for mode, tokens in value.items()}
+    return value
+
+
+class _ModeStats:
+    """单个分词模式的缓存计数器"""
+
+    __slots__ = ('hits', 'misses', 'evictions')
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def to_dict(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+class TokenCache:
+    """
+    线程安全的LRU缓存
+
+    命中时将条目移动到末尾，淘汰时从头部移除，读写均为O(1)。
+    容量同时受条目数（max_entries）和估算内存（max_bytes，0表示不限）约束，
+    ttl大于0时条目在写入ttl秒后过期。
+    """
+
+    def __init__(self, max_entries=1000, max_bytes=0, ttl=0):
+        self._data = OrderedDict()  # key -> (value, size, expires_at)
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._mode_stats = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.writes = 0
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+    def configure(self, max_entries, max_bytes=0, ttl=0):
+        """调整容量和过期时间，超出新容量的条目会立即淘汰"""
+        with self._lock:
+            self.max_entries = max_entries
+            self.max_bytes = max_bytes
+            self.ttl = ttl
+            self._evict_locked()
+
+    def _stats_for(self, mode):
+        stats = self._mode_stats.get(mode)
+        if stats is None:
+            stats = self._mode_stats[mode] = _ModeStats()
+        return stats
+
+    def _remove_locked(self, key):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def _evict_locked(self):
+        while self._data and (len(self._data) > self.max_entries or
+                              (self.max_bytes and self._bytes > self.max_bytes)):
+            key, (_, size, _) = self._data.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            self._stats_for(key_mode(key)).evictions += 1
+
+    def get(self, key):
+        """
+        获取缓存值并刷新其LRU位置
+
+        Args:
+            key (str): 缓存键
+
+        Returns:
+            缓存值；不存在或已过期时返回None
+        """
+        with self._lock:
+            stats = self._stats_for(key_mode(key))
+            entry = self._data.get(key)
+            if entry is not None and entry[2] and entry[2] <= time.monotonic():
+                self._remove_locked(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                stats.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            stats.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        """
+        写入缓存值，必要时按LRU顺序淘汰旧条目
+
+        Args:
+            key (str): 缓存键
+            value: 缓存值
+
+        Returns:
+            bool: 是否写入（单个条目超过内存预算时不写入）
+        """
+        size = estimate_size(value) + sys.getsizeof(key) + _ENTRY_OVERHEAD
+        if self.max_bytes and size > self.max_bytes:
+            return False
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0
+        with self._lock:
+            if key in self._data:
+                self._remove_locked(key)
+            self._data[key] = (value, size, expires_at)
+            self._bytes += size
+            self.writes += 1
+            self._evict_locked()
+        return True
+
+    def clear(self):
+        """清空缓存（保留统计计数）"""
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def discard_if(self, predicate):
+        """
+        删除键满足条件的条目（如旧词典版本的缓存）
+
+        Args:
+            predicate (callable): 接收缓存键，返回True表示删除
+
+        Returns:
+            int: 删除的条目数
+        """
+        with self._lock:
+            keys = [key for key in self._data if predicate(key)]
+            for key in keys:
+                self._remove_locked(key)
+        return len(keys)
+
+    def items(self, limit=0):
+        """
+        按最近使用顺序取出未过期的条目（用于保存快照）
+
+        Args:
+            limit (int): 最多取出的条目数，0表示全部
+
+        Returns:
+            list: [(缓存键, 缓存值), ...]，最近使用的在前
+        """
+        now = time.monotonic()
+        entries = []
+        with self._lock:
+            for key in reversed(self._data):
+                value, _, expires_at = self._data[key]
+                if expires_at and expires_at <= now:
+                    continue
+                entries.append((key, value))
+                if limit and len(entries) >= limit:
+                    break
+        return entries
+
+    def load(self, entries):
+        """
+        批量写入条目（如快照），保持给定的最近使用顺序
+
+        Args:
+            entries (list): [(缓存键, 缓存值), ...]，最近使用的在前
+
+        Returns:
+            int: 写入后仍在缓存中的条目数
+        """
+        loaded = [key for key, value in reversed(entries) if self.set(key, value)]
+        with self._lock:
+            return sum(1 for key in loaded if key in self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """
+        获取缓存统计信息
+
+        Returns:
+            dict: 条目数、内存、命中率及按模式的计数
+        """
+        with self._lock:
+            total_requests = self.hits + self.misses
+            hit_rate = (self.hits / total_requests * 100) if total_requests > 0 else 0
+            return {
+                'cache_size': len(self._data),
+                'cache_hits': self.hits,
+                'cache_misses': self.misses,
+                'hit_rate': f"{hit_rate:.2f}%",
+                'max_size': self.max_entries,
+                'memory_bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'ttl': self.ttl,
+                'modes': {mode: s.to_dict() for mode, s in self._mode_stats.items()}
+            }
+
+
+class SharedCache:
+    """
+    基于SQLite文件的跨进程共享缓存（L2）
+
+    使用WAL模式允许多个worker并发读，每个线程持有独立连接（fork后自动重建）。
+    值使用marshal序列化；容量超限时按最近访问时间淘汰，每写入prune_interval次检查一次。
+    任何数据库错误都只记录日志并按未命中处理，不影响分词请求。
+
+    命中时只读数据库，不取写锁：访问时间和命中次数先记在进程内，累计touch_batch个键或距上次写回
+    超过touch_interval秒时批量写回（清理和取热点条目前也会写回）。淘汰和预热使用的访问时间、命中次数因此是近似值。
+    """
+
+    def __init__(self, path, max_entries=1000000, ttl=0, prune_interval=256, touch_batch=256, touch_interval=30.0):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.prune_interval = prune_interval
+        self.touch_batch = touch_batch
+        self.touch_interval = touch_interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes_since_prune = 0
+        self._accesses = {}  # 缓存键 -> (最近访问时间, 未写回的命中次数)
+        self._last_touch_flush = time.time()
+        self._approx_size = 0
+        # 计数器为当前进程视角
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.evictions = 0
+        self._init_schema()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _init_schema(self):
+        try:
+            conn = self._connect()
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS token_cache (
+                    key TEXT PRIMARY KEY,
+                    value BLOB NOT NULL,
+                    expires_at REAL NOT NULL DEFAULT 0,
+                    accessed_at REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_token_cache_accessed ON token_cache(accessed_at)')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS token_lease (
+                    key TEXT PRIMARY KEY,
+                    owner INTEGER NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+            conn.commit()
+            self._approx_size = conn.execute('SELECT COUNT(*) FROM token_cache').fetchone()[0]
+        except sqlite3.Error as e:
+            self.errors += 1
+            logging.warning(f"共享缓存初始化失败 {self.path}: {e}")
+
+    def get(self, key):
+        """
+        获取共享缓存值
+
+        Args:
+            key (str): 缓存键
+
+        Returns:
+            缓存值；不存在、已过期或读取失败时返回None
+        """
+        now = time.time()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                'SELECT value, expires_at FROM token_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or (row[1] and row[1] <= now):
+                self.misses += 1
+                return None
+            value = _unpack_value(marshal.loads(row[0]))
+        except (sqlite3.Error, ValueError, EOFError, TypeError) as e:
+            self.errors += 1
+            self.misses += 1
+            logging.warning(f"读取共享缓存失败: {e}")
+            return None
+        self.hits += 1
+        self._record_access(key, now)
+        return value
+
+    def _record_access(self, key, now):
+        """在进程内记录一次命中，攒够一批或超过写回间隔时批量写回"""
+        with self._lock:
+            entry = self._accesses.get(key)
+            self._accesses[key] = (now, entry[1] + 1 if entry else 1)
+            should_flush = (len(self._accesses) >= self.touch_batch
+                            or now - self._last_touch_flush >= self.touch_interval)
+        if should_flush:
+            self.flush_accesses()
+
+    def flush_accesses(self):
+        """把进程内记录的访问时间和命中次数批量写回数据库（一次事务）"""
+        with self._lock:
+            accesses, self._accesses = self._accesses, {}
+            self._last_touch_flush = time.time()
+        if not accesses:
+            return
+        try:
+            conn = self._connect()
+            conn.executemany(
+                'UPDATE token_cache SET accessed_at = MAX(accessed_at, ?), hits = hits + ? WHERE key = ?',
+                [(accessed_at, hits, key) for key, (accessed_at, hits) in accesses.items()]
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            self.errors += 1
+            logging.warning(f"写回共享缓存访问记录失败: {e}")
+
+    def peek(self, key):
+        """
+        读取共享缓存值（不计入命中统计，不更新访问时间），用于等待其他worker的结果
+
+        Returns:
+            缓存值；不存在、已过期或读取失败时返回None
+        """
+        try:
+            row = self._connect().execute(
+                'SELECT value, expires_at FROM token_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None or (row[1] and row[1] <= time.time()):
+                return None
+            return _unpack_value(marshal.loads(row[0]))
+        except (sqlite3.Error, ValueError, EOFError, TypeError) as e:
+            self.errors += 1
+            logging.warning(f"读取共享缓存失败: {e}")
+            return None
+
+    def acquire_lease(self, key, seconds):
+        """
+        登记当前进程正在计算某个键（租约），同一时刻每个键只有一个有效租约
+
+        Args:
+            key (str): 缓存键
+            seconds (float): 租约有效期，持有者退出或卡住时到期自动失效
+
+        Returns:
+            bool: 是否取得租约（读写失败时返回True，按没有其他worker在计算处理）
+        """
+        now = time.time()
+        try:
+            conn = self._connect()
+            cursor = conn.execute('''
+                INSERT INTO token_lease (key, owner, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                WHERE token_lease.expires_at <= ?
+            ''', (key, os.getpid(), now + seconds, now))
+            conn.commit()
+            return cursor.rowcount > 0
+        except sqlite3.Error as e:
+            self.errors += 1
+            logging.warning(f"登记共享缓存租约失败: {e}")
+            return True
+
+    def lease_active(self, key):
+        """某个键的租约是否仍然有效"""
+        try:
+            row = self._connect().execute(
+                'SELECT expires_at FROM token_lease WHERE key = ?', (key,)
+            ).fetchone()
+            return row is not None and row[0] > time.time()
+        except sqlite3.Error as e:
+            self.errors += 1
+            logging.warning(f"读取共享缓存租约失败: {e}")
+            return False
+
+    def release_lease(self, key):
+        """释放当前进程持有的租约"""
+        try:
+            conn = self._connect()
+            conn.execute('DELETE FROM token_lease WHERE key = ? AND owner = ?', (key, os.getpid()))
+            conn.commit()
+        except sqlite3.Error as e:
+            self.errors += 1
+            logging.warning(f"释放共享缓存租约失败: {e}")
+
+    def set(self, key, value):
+        """
+        写入共享缓存值
+
+        Args:
+            key (str): 缓存键
+            value: 缓存值（CompactTokens或可被marshal序列化的值）
+
+        Returns:
+            bool: 是否写入成功
+        """
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl else 0
+        try:
+            conn = self._connect()
+            conn.execute(
+                'INSERT OR REPLACE INTO token_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+                (key, marshal.dumps(_pack_value(value)), expires_at, now)
+            )
+            conn.commit()
+        except (sqlite3.Error, ValueError) as e:
+            self.errors += 1
+            logging.warning(f"写入共享缓存失败: {e}")
+            return False
+
+        with self._lock:
+            self._writes_since_prune += 1
+            should_prune = self._writes_since_prune >= self.prune_interval
+            if should_prune:
+                self._writes_since_prune = 0
+        if should_prune:
+            self.prune()
+        return True
+
+    def prune(self):
+        """删除过期条目，并按最近访问时间淘汰超出容量的条目"""
+        self.flush_accesses()
+        try:
+            conn = self._connect()
+            cursor = conn.execute(
+                'DELETE FROM token_cache WHERE expires_at > 0 AND expires_at <= ?', (time.time(),)
+            )
+            removed = cursor.rowcount
+            conn.execute('DELETE FROM token_lease WHERE expires_at <= ?', (time.time(),))
+            size = conn.execute('SELECT COUNT(*) FROM token_cache').fetchone()[0]
+            excess = size - self.max_entries
+            if excess > 0:
+                conn.execute('''
+                    DELETE FROM token_cache WHERE key IN (
+                        SELECT key FROM token_cache ORDER BY accessed_at LIMIT ?
+                    )
+                ''', (excess,))
+                removed += excess
+                size -= excess
+            conn.commit()
+            self.evictions += removed
+            self._approx_size = size
+        except sqlite3.Error as e:
+            self.errors += 1
+            logging.warning(f"清理共享缓存失败: {e}")
+
+    def hottest(self, limit):
+        """
+        取出命中次数最多的条目（用于启动时预热L1）
+
+        Args:
+            limit (int): 最多取出的条目数
+
+        Returns:
+            list: [(缓存键, 缓存值), ...]，命中次数多的在前；读取失败时返回空列表
+        """
+        self.flush_accesses()
+        try:
+            rows = self._connect().execute(
+                'SELECT key, value FROM token_cache WHERE expires_at = 0 OR expires_at > ? '
+                'ORDER BY hits DESC, accessed_at DESC LIMIT ?', (time.time(), limit)
+            ).fetchall()
+            return [(key, _unpack_value(marshal.loads(value))) for key, value in rows]
+        except (sqlite3.Error, ValueError, EOFError, TypeError) as e:
+            self.errors += 1
+            logging.warning(f"读取共享缓存热点条目失败: {e}")
+            return []
+
+    def clear(self):
+        """清空共享缓存（影响所有worker）"""
+        with self._lock:
+            self._accesses.clear()
+        try:
+            conn = self._connect()
+            conn.execute('DELETE FROM token_cache')
+            conn.execute('DELETE FROM token_lease')
+            conn.commit()
+            self._approx_size = 0
+        except sqlite3.Error as e:
+            self.errors += 1
+            logging.warning(f"清空共享缓存失败: {e}")
+
+    def stats(self):
+        """
+        获取共享缓存统计信息
+
+        Returns:
+            dict: 条目数（最近一次清理时的值）及当前进程的命中计数
+        """
+        total_requests = self.hits + self.misses
+        hit_rate = (self.hits / total_requests * 100) if total_requests > 0 else 0
+        return {
+            'path': self.path,
+            'cache_size': self._approx_size,
+            'max_size': self.max_entries,
+            'cache_hits': self.hits,
+            'cache_misses': self.misses,
+            'hit_rate': f"{hit_rate:.2f}%",
+            'evictions': self.evictions,
+            'errors': self.errors,
+            'ttl': self.ttl
+        }
+
+
+class SingleFlight:
+    """
+    合并同一缓存键的并发未命中（single-flight）
+
+    同一进程内，第一个未命中的调用者（leader）执行分词，同时到达的其他调用者（follower）
+    等待leader的Future。配置了共享缓存时，leader先在共享缓存中登记租约；租约已被其他worker
+    持有时，轮询共享缓存等待对方写入的结果，而不是再分词一次。
+
+    所有等待都有超时：leader卡住、失败或所在worker退出时，等待者超时后自行分词，不会被永久阻塞。
+    """
+
+    def __init__(self, timeout=10.0, shared=None, poll_interval=0.02):
+        self.timeout = timeout
+        self.shared = shared
+        self.poll_interval = poll_interval
+        self._flights = {}  # key -> Future
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+        self.shared_waits = 0
+        self.shared_hits = 0
+        self.timeouts = 0
+
+    def join(self, key):
+        """
+        加入某个键的计算
+
+        Returns:
+            tuple: (Future, 是否为leader)；leader结束后必须调用finish
+        """
+        with self._lock:
+            future = self._flights.get(key)
+            if future is not None:
+                self.followers += 1
+                return future, False
+            future = self._flights[key] = Future()
+            self.leaders += 1
+            return future, True
+
+    def finish(self, key, future, value=None, error=None):
+        """leader完成（或放弃）计算并唤醒等待者，重复调用时忽略"""
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+            if future.done():
+                return
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(value)
+
+    def _outcome(self, future):
+        if not future.done():
+            self.timeouts += 1
+            return None
+        if future.exception() is not None:
+            return None
+        return future.result()
+
+    def wait(self, future, timeout):
+        """
+        follower等待leader的结果
+
+        Returns:
+            leader的结果；超时或leader失败时返回None（由调用者自行分词）
+        """
+        try:
+            future.result(timeout)
+        except (FutureTimeout, Exception):
+            pass
+        return self._outcome(future)
+
+    async def wait_async(self, future, timeout):
+        """wait的异步版本：在事件循环上等待，不占用线程"""
+        # asyncio.wait超时时不会取消被等待的Future，不影响其他等待者
+        await asyncio.wait({asyncio.wrap_future(future)}, timeout=timeout)
+        return self._outcome(future)
+
+    def acquire_lease(self, key):
+        """在共享缓存中登记租约；没有共享缓存时总是返回True"""
+        if self.shared is None:
+            return True
+        return self.shared.acquire_lease(key, self.timeout)
+
+    def release_lease(self, key):
+        if self.shared is not None:
+            self.shared.release_lease(key)
+
+    def wait_shared(self, key, timeout):
+        """
+        其他worker持有租约时轮询共享缓存，直到取得结果、租约被释放或超时
+
+        Returns:
+            其他worker写入的结果；未取得时返回None
+        """
+        self.shared_waits += 1
+        deadline = time.monotonic() + timeout
+        while True:
+            value = self.shared.peek(key)
+            if value is not None:
+                self.shared_hits += 1
+                return value
+            if not self.shared.lease_active(key):
+                return None
+            if time.monotonic() >= deadline:
+                self.timeouts += 1
+                return None
+            time.sleep(self.poll_interval)
+
+    def stats(self):
+        """
+        Returns:
+            dict: 进行中的计算数及leader、follower、跨worker等待和超时计数
+        """
+        with self._lock:
+            in_flight = len(self._flights)
+        return {
+            'in_flight': in_flight,
+            'leaders': self.leaders,
+            'followers': self.followers,
+            'shared_waits': self.shared_waits,
+            'shared_hits': self.shared_hits,
+            'timeouts': self.timeouts,
+            'timeout': self.timeout
+        }
+
+
+# 快照文件格式：魔数 + zlib压缩的marshal数据
+_SNAPSHOT_MAGIC = b'JTCS1\n'
+
+
+def save_snapshot(path, entries, version):
+    """
+    保存缓存快照（先写临时文件再原子替换，多个worker同时保存时文件始终完整）
+
+    Args:
+        path (str): 快照文件路径
+        entries (list): [(缓存键, 缓存值), ...]
+        version (str): 词典版本，加载时版本不一致则整个快照作废
+
+    Returns:
+        int: 快照文件字节数
+    """
+    entries = [(key, _pack_value(value)) for key, value in entries]
+    payload = marshal.dumps({'version': version, 'created_at': time.time(), 'entries': entries})
+    data = _SNAPSHOT_MAGIC + zlib.compress(payload, 1)
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return len(data)
+
+
+def load_snapshot(path, version):
+    """
+    读取缓存快照
+
+    Args:
+        path (str): 快照文件路径
+        version (str): 当前词典版本
+
+    Returns:
+        list: [(缓存键, 缓存值), ...]；文件不存在、格式错误或词典版本不一致时返回空列表
+    """
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return []
+    except OSError as e:
+        logging.warning(f"读取缓存快照失败 {path}: {e}")
+        return []
+    if not data.startswith(_SNAPSHOT_MAGIC):
+        logging.warning(f"缓存快照格式不正确，已忽略: {path}")
+        return []
+    try:
+        snapshot = marshal.loads(zlib.decompress(data[len(_SNAPSHOT_MAGIC):]))
+    except (zlib.error, ValueError, EOFError, TypeError) as e:
+        logging.warning(f"缓存快照已损坏，已忽略 {path}: {e}")
+        return []
+    if snapshot.get('version') != version:
+        logging.info(f"缓存快照的词典版本 {snapshot.get('version')} 与当前版本 {version} 不一致，已忽略")
+        return []
+    try:
+        return [(key, _unpack_value(value)) for key, value in snapshot.get('entries', [])]
+    except (ValueError, TypeError) as e:
+        logging.warning(f"缓存快照已损坏，已忽略 {path}: {e}")
+        return []
+
+
+class CacheSnapshotter:
+    """
+    定期把L1缓存保存为快照
+
+    在处理请求的进程中调用ensure_started后才会保存：后台线程每interval秒保存一次，
+    进程退出时由stop保存最后一次。gunicorn preload时主进程只做启动预热、不处理请求，
+    不会在退出时用启动时的旧内容覆盖worker保存的快照。
+    缓存自上次保存后没有新写入时跳过；只保存当前词典版本的条目。
+    """
+
+    def __init__(self, cache, path, version_func, interval=300, max_entries=0):
+        self.cache = cache
+        self.path = path
+        self.version_func = version_func
+        self.interval = interval
+        self.max_entries = max_entries
+        self.saves = 0
+        self.failures = 0
+        self.last_entries = 0
+        self.last_bytes = 0
+        self.last_saved_at = None
+        self._saved_writes = None
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        """在当前进程中启用快照保存，并按进程启动定期保存线程（interval为0时只在退出时保存）"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+            self._thread = None
+            if self.interval:
+                self._thread = threading.Thread(target=self._run, name='cache-snapshot', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.save()
+
+    def save(self):
+        """
+        保存快照
+
+        Returns:
+            int: 保存的条目数；缓存没有变化或保存失败时返回0
+        """
+        with self._lock:
+            writes = self.cache.writes
+            if writes == self._saved_writes:
+                return 0
+            version = self.version_func()
+            entries = [(key, value) for key, value in self.cache.items(self.max_entries)
+                       if key_namespace(key) == version]
+            if not entries:
+                return 0
+            start = time.perf_counter()
+            try:
+                size = save_snapshot(self.path, entries, version)
+            except (OSError, ValueError) as e:
+                self.failures += 1
+                logging.warning(f"保存缓存快照失败 {self.path}: {e}")
+                return 0
+            self._saved_writes = writes
+            self.saves += 1
+            self.last_entries = len(entries)
+            self.last_bytes = size
+            self.last_saved_at = time.time()
+        logging.info(f"缓存快照已保存: {len(entries)}条, {size}字节, 耗时 {time.perf_counter() - start:.3f}s")
+        return len(entries)
+
+    def mark_saved(self):
+        """把当前缓存内容视为已保存（启动预热后调用，避免立即重写相同内容）"""
+        with self._lock:
+            self._saved_writes = self.cache.writes
+
+    def stop(self):
+        """停止定期保存线程并保存最后一次快照（进程退出时调用，未处理过请求的进程不保存）"""
+        if self._pid != os.getpid():
+            return
+        self._stop.set()
+        self._thread = None
+        self.save()
+
+    def stats(self):
+        return {
+            'path': self.path,
+            'interval': self.interval,
+            'saves': self.saves,
+            'failures': self.failures,
+            'last_entries': self.last_entries,
+            'last_bytes': self.last_bytes,
+            'last_saved_at': self.last_saved_at
+        }
@@ -1,5 +1,47 @@
 import os
+import re
 import logging
+import tempfile
+
+def parse_tenant_dicts(value):
+    """解析租户词典配置 "legal=/dicts/legal.txt,medical=/dicts/medical.txt" 为 {租户名: 路径}"""
+    tenant_dicts = {}
+    for item in (value or '').split(','):
+        name, sep, path = item.strip().partition('=')
+        if sep:
+            tenant_dicts[name.strip()] = path.strip()
+    return tenant_dicts
+
+_RATE_PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+def parse_rate_limit(value):
+    """
+    解析限流配置
+
+    Args:
+        value (str): "100"（每分钟）、"10/second"、"6000/hour" 等；"0"或空表示不限流
+
+    Returns:
+        tuple: (请求数, 周期秒数)；不限流时返回None
+
+    Raises:
+        ValueError: 格式错误
+    """
+    value = (value or '').strip().lower()
+    if not value or value == '0':
+        return None
+    match = re.fullmatch(r'(\d+)\s*(?:/\s*(second|minute|hour|day))?', value)
+    if not match:
+        raise ValueError(f"无法解析的限流配置: {value}")
+    count = int(match.group(1))
+    if count == 0:
+        return None
+    return count, _RATE_PERIODS[match.group(2) or 'minute']
+
+def default_admission_state_path():
+    """准入状态文件的默认路径：优先使用内存文件系统"""
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, 'jieba-admission.db')
 
 class Config:
     """应用配置类（优化版）"""
@@ -11,14 +53,56 @@ class Config:
     # jieba 配置
     JIEBA_DICT_PATH = os.environ.get('JIEBA_DICT_PATH')  # 自定义词典路径
     JIEBA_USER_DICT_PATH = os.environ.get('JIEBA_USER_DICT_PATH')  # 用户词典路径
+    JIEBA_PRECOMPILE = os.environ.get('JIEBA_PRECOMPILE', 'true').lower() == 'true'  # 使用预编译词典文件
+    JIEBA_CACHE_DIR = os.environ.get('JIEBA_CACHE_DIR', tempfile.gettempdir())  # 预编译词典文件目录
+
+    # 词典热加载配置：各worker按检查间隔读取共享版本文件，发现变化后在后台重载词典
+    DICT_VERSION_FILE = os.environ.get('DICT_VERSION_FILE',
+                                       os.path.join(JIEBA_CACHE_DIR, 'jieba-dict-version'))
+    DICT_CHECK_INTERVAL = float(os.environ.get('DICT_CHECK_INTERVAL', '5'))  # 秒
+    DICT_WATCH_FILES = os.environ.get('DICT_WATCH_FILES', 'false').lower() == 'true'  # 词典文件变化时自动重载
+
+    # 多词典租户配置：请求通过dict/tenant参数选择，在主词典之上叠加该租户的用户词典
+    TENANT_DICTS = parse_tenant_dicts(os.environ.get('TENANT_DICTS'))  # 租户名=用户词典路径，逗号分隔
+    TENANT_MAX_MEMORY = int(os.environ.get('TENANT_MAX_MEMORY', '1073741824'))  # 1GB，0表示不限
 
     # API 配置
     API_VERSION = os.environ.get('API_VERSION', 'v1')
     DEFAULT_TOKENIZE_MODE = os.environ.get('DEFAULT_TOKENIZE_MODE', '精确')
 
+    # 响应配置
+    JSON_ENSURE_ASCII = os.environ.get('JSON_ENSURE_ASCII', 'false').lower() == 'true'  # 是否把中文转义为\uXXXX
+
     # 缓存配置
     CACHE_MAX_SIZE = int(os.environ.get('CACHE_MAX_SIZE', '1000'))
     CACHE_ENABLED = os.environ.get('CACHE_ENABLED', 'true').lower() == 'true'
+    CACHE_MAX_BYTES = int(os.environ.get('CACHE_MAX_BYTES', '67108864'))  # 64MB，0表示不限
+    CACHE_TTL = int(os.environ.get('CACHE_TTL', '0'))  # 秒，0表示不过期
+    # 紧凑存储：缓存条目保存为原文 + 词语偏移数组，命中时再还原为词语列表
+    CACHE_COMPACT = os.environ.get('CACHE_COMPACT', 'true').lower() == 'true'
+
+    # 共享缓存（L2）配置：同一主机上的worker共用的SQLite缓存文件
+    CACHE_L2_ENABLED = os.environ.get('CACHE_L2_ENABLED', 'false').lower() == 'true'
+    CACHE_L2_PATH = os.environ.get('CACHE_L2_PATH', 'jieba_cache.db')
+    CACHE_L2_MAX_SIZE = int(os.environ.get('CACHE_L2_MAX_SIZE', '1000000'))
+    CACHE_L2_TTL = int(os.environ.get('CACHE_L2_TTL', '0'))  # 秒，0表示不过期
+
+    # 缓存粒度：document 按整段文本缓存；sentence 对长文本按句缓存，只对未命中的句子分词
+    CACHE_GRANULARITY = os.environ.get('CACHE_GRANULARITY', 'document').lower()
+    CACHE_SENTENCE_MIN_LENGTH = int(os.environ.get('CACHE_SENTENCE_MIN_LENGTH', '500'))  # 达到该长度的文本才按句缓存
+
+    # 合并并发的相同分词请求：同一文本、模式和词典同时未命中缓存时只分词一次，其余请求等待结果
+    COALESCE_ENABLED = os.environ.get('COALESCE_ENABLED', 'true').lower() == 'true'
+    COALESCE_TIMEOUT = float(os.environ.get('COALESCE_TIMEOUT', '10'))  # 秒，等待其他请求结果的上限
+
+    # 缓存快照与预热：L1缓存定期和退出时保存到快照文件，启动时加载（词典版本变化后快照作废）
+    CACHE_SNAPSHOT_PATH = os.environ.get('CACHE_SNAPSHOT_PATH')  # 未设置时不保存快照
+    CACHE_SNAPSHOT_INTERVAL = int(os.environ.get('CACHE_SNAPSHOT_INTERVAL', '300'))  # 秒，0表示只在退出时保存
+    CACHE_SNAPSHOT_MAX_ENTRIES = int(os.environ.get('CACHE_SNAPSHOT_MAX_ENTRIES', '0'))  # 只保存最近使用的N条，0表示全部
+    CACHE_WARM_FROM_L2 = int(os.environ.get('CACHE_WARM_FROM_L2', '0'))  # 启动时从L2加载命中次数最多的N条
+    CACHE_WARM_CORPUS = os.environ.get('CACHE_WARM_CORPUS')  # 预热语料文件，每行一条文本
+    CACHE_WARM_MODES = [mode.strip() for mode in os.environ.get('CACHE_WARM_MODES', '精确').split(',') if mode.strip()]
+    CACHE_WARM_LIMIT = int(os.environ.get('CACHE_WARM_LIMIT', '10000'))  # 预热语料最多使用的行数
 
     # 文本处理配置
     MAX_TEXT_LENGTH = int(os.environ.get('MAX_TEXT_LENGTH', '10000'))
@@ -31,16 +115,76 @@ class Config:
                                '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
     # 性能配置
-    REQUEST_TIMEOUT = int(os.environ.get('REQUEST_TIMEOUT', '30'))  # 秒
+    REQUEST_TIMEOUT = int(os.environ.get('REQUEST_TIMEOUT', '30'))  # 秒，请求截止时间，0表示不限
     WORKER_PROCESSES = int(os.environ.get('WORKER_PROCESSES', '4'))
 
+    # 性能诊断配置
+    SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', 'true').lower() == 'true'  # 返回Server-Timing响应头
+    PROFILE_SAMPLE_RATE = int(os.environ.get('PROFILE_SAMPLE_RATE', '0'))  # 每N个请求分析1个，0表示不采样
+    PROFILE_HEADER_ENABLED = os.environ.get('PROFILE_HEADER_ENABLED', 'false').lower() == 'true'  # 允许X-Profile: 1强制分析
+    PROFILE_MIN_DURATION = float(os.environ.get('PROFILE_MIN_DURATION', '0.5'))  # 只保存耗时超过该值（秒）的分析结果
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+    PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', '100'))
+
+    # 批量分词配置
+    BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', '1000'))  # 单次批量请求最大条数
+    BATCH_WORKER_PROCESSES = int(os.environ.get('BATCH_WORKER_PROCESSES', '0'))  # 0表示在当前进程内分词
+    BATCH_POOL_MIN_ITEMS = int(os.environ.get('BATCH_POOL_MIN_ITEMS', '16'))  # 未命中条数达到该值才使用进程池
+
+    # 词频统计配置（/api/terms 和 bulk.py --aggregate）
+    TERMS_TOP_K = int(os.environ.get('TERMS_TOP_K', '100'))  # 请求未指定top_k时返回的词数，0表示完整的词频表
+    STOPWORDS_PATH = os.environ.get('STOPWORDS_PATH', '')  # 停用词文件（每行一个词），默认不过滤
+
+    # 关键词提取配置（/api/keywords），IDF表编译后保存在JIEBA_CACHE_DIR中，各worker以mmap方式共享
+    KEYWORDS_TOP_K = int(os.environ.get('KEYWORDS_TOP_K', '20'))  # 请求未指定top_k时返回的关键词数
+    KEYWORDS_IDF_PATH = os.environ.get('KEYWORDS_IDF_PATH', '')  # 自定义IDF文件，默认使用jieba自带的IDF
+    TENANT_IDF = parse_tenant_dicts(os.environ.get('TENANT_IDF'))  # 租户名=IDF文件路径，逗号分隔
+
+    # 长文本并行分词配置（使用BATCH_WORKER_PROCESSES配置的进程池）
+    PARALLEL_TOKENIZE = os.environ.get('PARALLEL_TOKENIZE', 'false').lower() == 'true'  # 请求未指定parallel时的默认值
+    PARALLEL_MIN_LENGTH = int(os.environ.get('PARALLEL_MIN_LENGTH', '20000'))  # 文本达到该长度才并行
+    PARALLEL_MIN_PIECE_LENGTH = int(os.environ.get('PARALLEL_MIN_PIECE_LENGTH', '5000'))  # 每段最小字符数
+
+    # 流式分词配置（不受MAX_TEXT_LENGTH限制，请求体大小仍受MAX_CONTENT_LENGTH限制）
+    STREAM_READ_SIZE = int(os.environ.get('STREAM_READ_SIZE', '65536'))  # 每次读取的字节数
+    STREAM_MAX_SEGMENT_LENGTH = int(os.environ.get('STREAM_MAX_SEGMENT_LENGTH', '2000'))  # 单个片段最大字符数
+
+    # 异步（ASGI）模式配置：分词在两条有界线程池通道中执行，长文本不占用短文本的线程
+    ASYNC_SHORT_WORKERS = int(os.environ.get('ASYNC_SHORT_WORKERS', '4'))  # 短文本通道线程数
+    ASYNC_LONG_WORKERS = int(os.environ.get('ASYNC_LONG_WORKERS', '1'))  # 长文本通道线程数
+    ASYNC_LONG_TEXT_LENGTH = int(os.environ.get('ASYNC_LONG_TEXT_LENGTH', '2000'))  # 待分词字符数达到该值走长文本通道
+    ASYNC_QUEUE_LIMIT = int(os.environ.get('ASYNC_QUEUE_LIMIT', '64'))  # 每条通道最多排队的任务数，超出时返回503
+
     # 安全配置
     ENABLE_CORS = os.environ.get('ENABLE_CORS', 'false').lower() == 'true'
-    RATE_LIMIT = os.environ.get('RATE_LIMIT', '100')  # 每分钟请求数
+    RATE_LIMIT = os.environ.get('RATE_LIMIT', '100')  # 每分钟请求数，也可写作 10/second、6000/hour
+    RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'false').lower() == 'true'
+    RATE_LIMIT_BURST = int(os.environ.get('RATE_LIMIT_BURST', '0'))  # 令牌桶容量，0表示等于RATE_LIMIT的请求数
+    RATE_LIMIT_COST_CHARS = int(os.environ.get('RATE_LIMIT_COST_CHARS', '1000'))  # 每多少字符多消耗一个令牌
+    RATE_LIMIT_KEY_HEADER = os.environ.get('RATE_LIMIT_KEY_HEADER', 'X-API-Key')  # 按该请求头区分客户端，缺省时按IP
+
+    # 过载保护配置（准入状态与令牌桶共用一个文件，同一主机的worker需指向同一文件）
+    ADMISSION_STATE_PATH = os.environ.get('ADMISSION_STATE_PATH', default_admission_state_path())
+    ADMISSION_HEAVY_CHARS = int(os.environ.get('ADMISSION_HEAVY_CHARS', '20000'))  # 达到该字符数的请求为长文本请求
+    ADMISSION_MAX_HEAVY = int(os.environ.get('ADMISSION_MAX_HEAVY', '0'))  # 同时处理的长文本请求上限，0表示不限
+    ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')  # 管理接口令牌，未设置时禁用管理接口
 
     # 数据库配置
     DB_PATH = os.environ.get('DB_PATH', 'jieba_stats.db')
 
+    # 请求日志写入配置
+    LOG_DB_ASYNC = os.environ.get('LOG_DB_ASYNC', 'true').lower() == 'true'  # 后台批量写入
+    LOG_QUEUE_MAX_SIZE = int(os.environ.get('LOG_QUEUE_MAX_SIZE', '10000'))
+    LOG_FLUSH_INTERVAL = float(os.environ.get('LOG_FLUSH_INTERVAL', '1.0'))  # 秒
+    LOG_BATCH_SIZE = int(os.environ.get('LOG_BATCH_SIZE', '500'))
+    LOG_QUEUE_POLICY = os.environ.get('LOG_QUEUE_POLICY', 'drop')  # 队列满时: drop 丢弃 / block 短暂等待
+
+    # 请求日志保留配置（统计数据来自汇总表，清理原始日志不影响统计）
+    LOG_RETENTION_DAYS = int(os.environ.get('LOG_RETENTION_DAYS', '0'))  # 0表示永久保留
+    LOG_ARCHIVE_PATH = os.environ.get('LOG_ARCHIVE_PATH')  # 设置后过期日志先归档到该数据库
+    LOG_RETENTION_INTERVAL = int(os.environ.get('LOG_RETENTION_INTERVAL', '3600'))  # 秒
+    ROLLUP_MINUTE_RETENTION_HOURS = int(os.environ.get('ROLLUP_MINUTE_RETENTION_HOURS', '48'))
+
     # 支持的分词模式
     TOKENIZE_MODES = {
         '精确': 'cut',
@@ -57,12 +201,145 @@ class Config:
         if cls.MAX_TEXT_LENGTH <= 0 or cls.MAX_TEXT_LENGTH > 1000000:
             errors.append("MAX_TEXT_LENGTH 必须在 1-1000000 之间")
 
-        if cls.CACHE_MAX_SIZE <= 0 or cls.CACHE_MAX_SIZE > 10000:
-            errors.append("CACHE_MAX_SIZE 必须在 1-10000 之间")
+        if cls.CACHE_MAX_SIZE <= 0 or cls.CACHE_MAX_SIZE > 10000000:
+            errors.append("CACHE_MAX_SIZE 必须在 1-10000000 之间")
+
+        if cls.CACHE_MAX_BYTES < 0:
+            errors.append("CACHE_MAX_BYTES 不能为负数")
+
+        if cls.CACHE_TTL < 0:
+            errors.append("CACHE_TTL 不能为负数")
+
+        if cls.CACHE_L2_MAX_SIZE <= 0:
+            errors.append("CACHE_L2_MAX_SIZE 必须大于0")
+
+        if cls.CACHE_L2_TTL < 0:
+            errors.append("CACHE_L2_TTL 不能为负数")
+
+        if cls.CACHE_GRANULARITY not in ('document', 'sentence'):
+            errors.append("CACHE_GRANULARITY 必须是 document 或 sentence")
+
+        if cls.CACHE_SENTENCE_MIN_LENGTH <= 0:
+            errors.append("CACHE_SENTENCE_MIN_LENGTH 必须大于0")
+
+        if cls.COALESCE_TIMEOUT <= 0:
+            errors.append("COALESCE_TIMEOUT 必须大于0")
+
+        if cls.CACHE_SNAPSHOT_INTERVAL < 0 or cls.CACHE_SNAPSHOT_MAX_ENTRIES < 0:
+            errors.append("CACHE_SNAPSHOT_INTERVAL 和 CACHE_SNAPSHOT_MAX_ENTRIES 不能为负数")
+
+        if cls.CACHE_WARM_FROM_L2 < 0 or cls.CACHE_WARM_LIMIT < 0:
+            errors.append("CACHE_WARM_FROM_L2 和 CACHE_WARM_LIMIT 不能为负数")
+
+        invalid_modes = [mode for mode in cls.CACHE_WARM_MODES if mode not in cls.TOKENIZE_MODES]
+        if invalid_modes:
+            errors.append(f"CACHE_WARM_MODES 包含不支持的分词模式: {invalid_modes}")
+
+        if cls.BATCH_MAX_ITEMS <= 0 or cls.BATCH_MAX_ITEMS > 100000:
+            errors.append("BATCH_MAX_ITEMS 必须在 1-100000 之间")
+
+        if cls.BATCH_WORKER_PROCESSES < 0:
+            errors.append("BATCH_WORKER_PROCESSES 不能为负数")
+
+        if cls.TERMS_TOP_K < 0:
+            errors.append("TERMS_TOP_K 不能为负数")
+
+        if cls.STOPWORDS_PATH and not os.path.isfile(cls.STOPWORDS_PATH):
+            errors.append(f"STOPWORDS_PATH 文件不存在: {cls.STOPWORDS_PATH}")
+
+        if cls.KEYWORDS_TOP_K < 0:
+            errors.append("KEYWORDS_TOP_K 不能为负数")
+
+        if cls.KEYWORDS_IDF_PATH and not os.path.isfile(cls.KEYWORDS_IDF_PATH):
+            errors.append(f"KEYWORDS_IDF_PATH 文件不存在: {cls.KEYWORDS_IDF_PATH}")
+
+        for name, path in cls.TENANT_IDF.items():
+            if name not in cls.TENANT_DICTS:
+                errors.append(f"TENANT_IDF 中的租户未在 TENANT_DICTS 中配置: {name}")
+            elif not os.path.isfile(path):
+                errors.append(f"TENANT_IDF 文件不存在: {path}")
+
+        if cls.PARALLEL_MIN_LENGTH <= 0 or cls.PARALLEL_MIN_PIECE_LENGTH <= 0:
+            errors.append("PARALLEL_MIN_LENGTH 和 PARALLEL_MIN_PIECE_LENGTH 必须大于0")
+
+        if cls.ASYNC_SHORT_WORKERS <= 0 or cls.ASYNC_LONG_WORKERS <= 0:
+            errors.append("ASYNC_SHORT_WORKERS 和 ASYNC_LONG_WORKERS 必须大于0")
+
+        if cls.ASYNC_LONG_TEXT_LENGTH <= 0:
+            errors.append("ASYNC_LONG_TEXT_LENGTH 必须大于0")
+
+        if cls.ASYNC_QUEUE_LIMIT < 0:
+            errors.append("ASYNC_QUEUE_LIMIT 不能为负数")
+
+        try:
+            parse_rate_limit(cls.RATE_LIMIT)
+        except ValueError as e:
+            errors.append(f"RATE_LIMIT {e}")
+
+        if cls.RATE_LIMIT_BURST < 0:
+            errors.append("RATE_LIMIT_BURST 不能为负数")
+
+        if cls.RATE_LIMIT_COST_CHARS <= 0:
+            errors.append("RATE_LIMIT_COST_CHARS 必须大于0")
+
+        if cls.REQUEST_TIMEOUT < 0:
+            errors.append("REQUEST_TIMEOUT 不能为负数")
+
+        if cls.ADMISSION_HEAVY_CHARS <= 0:
+            errors.append("ADMISSION_HEAVY_CHARS 必须大于0")
+
+        if cls.ADMISSION_MAX_HEAVY < 0:
+            errors.append("ADMISSION_MAX_HEAVY 不能为负数")
+
+        if cls.DICT_CHECK_INTERVAL <= 0:
+            errors.append("DICT_CHECK_INTERVAL 必须大于0")
+
+        for name in cls.TENANT_DICTS:
+            if not re.fullmatch(r'[\w-]+', name):
+                errors.append(f"TENANT_DICTS 租户名只能包含字母、数字、下划线和连字符: {name}")
+
+        if cls.TENANT_MAX_MEMORY < 0:
+            errors.append("TENANT_MAX_MEMORY 不能为负数")
+
+        if cls.PROFILE_SAMPLE_RATE < 0:
+            errors.append("PROFILE_SAMPLE_RATE 不能为负数")
+
+        if cls.PROFILE_MIN_DURATION < 0:
+            errors.append("PROFILE_MIN_DURATION 不能为负数")
+
+        if cls.PROFILE_MAX_FILES <= 0:
+            errors.append("PROFILE_MAX_FILES 必须大于0")
+
+        if cls.STREAM_READ_SIZE <= 0:
+            errors.append("STREAM_READ_SIZE 必须大于0")
+
+        if cls.STREAM_MAX_SEGMENT_LENGTH <= 0:
+            errors.append("STREAM_MAX_SEGMENT_LENGTH 必须大于0")
 
         if cls.DEFAULT_TOKENIZE_MODE not in cls.TOKENIZE_MODES:
             errors.append(f"DEFAULT_TOKENIZE_MODE 必须是: {list(cls.TOKENIZE_MODES.keys())}")
 
+        if cls.LOG_QUEUE_MAX_SIZE <= 0:
+            errors.append("LOG_QUEUE_MAX_SIZE 必须大于0")
+
+        if cls.LOG_FLUSH_INTERVAL <= 0:
+            errors.append("LOG_FLUSH_INTERVAL 必须大于0")
+
+        if cls.LOG_BATCH_SIZE <= 0:
+            errors.append("LOG_BATCH_SIZE 必须大于0")
+
+        if cls.LOG_QUEUE_POLICY not in ('drop', 'block'):
+            errors.append("LOG_QUEUE_POLICY 必须是: ['drop', 'block']")
+
+        if cls.LOG_RETENTION_DAYS < 0:
+            errors.append("LOG_RETENTION_DAYS 不能为负数")
+
+        if cls.LOG_RETENTION_INTERVAL <= 0:
+            errors.append("LOG_RETENTION_INTERVAL 必须大于0")
+
+        if cls.ROLLUP_MINUTE_RETENTION_HOURS <= 0:
+            errors.append("ROLLUP_MINUTE_RETENTION_HOURS 必须大于0")
+
         # 验证日志级别
         valid_log_levels = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
         if cls.LOG_LEVEL not in valid_log_levels:
@@ -0,0 +1,340 @@
+"""
+jieba词典加载
+
+把主词典和用户词典合并后的前缀词典（FREQ、total、词性表）预编译为marshal文件，
+同一主机上的进程只需构建一次，之后直接加载，避免每个worker重复解析词典文本和逐条添加用户词。
+配合gunicorn的preload_app，worker可通过copy-on-write共享主进程加载好的词典。
+
+DictionaryManager负责词典热加载：在后台构建新的分词器后原子替换，并维护词典版本号。
+
+使用方法：
+from dictionary import build_tokenizer, DictionaryManager, get_memory_usage
+"""
+
+import hashlib
+import logging
+import marshal
+import os
+import tempfile
+import threading
+import time
+
+import jieba
+from jieba import finalseg
+
+# 预编译文件格式版本，格式变化时递增以使旧文件失效
+_COMPILED_FORMAT = 1
+
+
+def _file_signature(path):
+    """文件的绝对路径、大小和修改时间，用于判断预编译文件是否过期"""
+    abs_path = os.path.abspath(path)
+    stat = os.stat(abs_path)
+    return f"{abs_path}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def dictionary_fingerprint(dict_path=None, user_dict_path=None):
+    """
+    计算词典组合的指纹，任一词典文件变化时指纹随之变化
+
+    Args:
+        dict_path (str): 主词典路径，None表示jieba自带词典
+        user_dict_path (str): 用户词典路径
+
+    Returns:
+        str: 十六进制指纹
+    """
+    parts = [f"format:{_COMPILED_FORMAT}", f"jieba:{jieba.__version__}"]
+    parts.append(_file_signature(dict_path) if dict_path else 'default')
+    parts.append(_file_signature(user_dict_path) if user_dict_path else 'no-user-dict')
+    return hashlib.blake2b('|'.join(parts).encode('utf-8'), digest_size=12).hexdigest()
+
+
+def _load_compiled(tokenizer, path):
+    """从预编译文件加载前缀词典，成功返回True"""
+    try:
+        with open(path, 'rb') as f:
+            fmt, freq, total, tag_tab, force_split = marshal.load(f)
+    except FileNotFoundError:
+        return False
+    except (OSError, ValueError, EOFError, TypeError) as e:
+        logging.warning(f"预编译词典文件无法读取，将重新构建 {path}: {e}")
+        return False
+    if fmt != _COMPILED_FORMAT:
+        return False
+    with tokenizer.lock:
+        tokenizer.FREQ = freq
+        tokenizer.total = total
+        # 保持对象不变，jieba.user_word_tag_tab等模块级别名仍然有效
+        tokenizer.user_word_tag_tab.clear()
+        tokenizer.user_word_tag_tab.update(tag_tab)
+        tokenizer.initialized = True
+    for word in force_split:
+        finalseg.add_force_split(word)
+    return True
+
+
+def _save_compiled(tokenizer, path, force_split):
+    """原子地写入预编译文件（先写临时文件再改名，并发构建时不会读到半个文件）"""
+    directory = os.path.dirname(path)
+    try:
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.jieba-compiled-')
+        with os.fdopen(fd, 'wb') as f:
+            marshal.dump((_COMPILED_FORMAT, tokenizer.FREQ, tokenizer.total,
+                          dict(tokenizer.user_word_tag_tab), sorted(force_split)), f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"写入预编译词典文件失败 {path}: {e}")
+
+
+def build_tokenizer(dict_path=None, user_dict_path=None, cache_dir=None, tokenizer=None):
+    """
+    创建并立即初始化jieba分词器，优先从预编译词典文件加载
+
+    Args:
+        dict_path (str): 主词典路径，None表示jieba自带词典
+        user_dict_path (str): 用户词典路径
+        cache_dir (str): 预编译文件目录，None表示不使用预编译文件
+        tokenizer (jieba.Tokenizer): 要初始化的已有分词器（如jieba.dt），None时新建
+
+    Returns:
+        jieba.Tokenizer: 已加载词典的分词器
+    """
+    if tokenizer is None:
+        tokenizer = jieba.Tokenizer(dict_path) if dict_path else jieba.Tokenizer()
+    elif dict_path:
+        tokenizer.set_dictionary(dict_path)
+
+    compiled_path = None
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        fingerprint = dictionary_fingerprint(dict_path, user_dict_path)
+        compiled_path = os.path.join(cache_dir, f"jieba-compiled-{fingerprint}.marshal")
+        if _load_compiled(tokenizer, compiled_path):
+            logging.info(f"已从预编译文件加载词典: {compiled_path}")
+            return tokenizer
+        tokenizer.tmp_dir = cache_dir
+
+    force_split_before = set(finalseg.Force_Split_Words)
+    tokenizer.initialize()
+    if user_dict_path:
+        tokenizer.load_userdict(user_dict_path)
+    force_split = set(finalseg.Force_Split_Words) - force_split_before
+
+    if compiled_path:
+        _save_compiled(tokenizer, compiled_path, force_split)
+        logging.info(f"已构建预编译词典文件: {compiled_path}")
+    return tokenizer
+
+
+class DictionaryManager:
+    """
+    管理当前使用的分词器和词典版本，支持后台热加载
+
+    词典版本形如 "代数.指纹"：代数保存在共享版本文件中，管理接口每次要求重载时加一；
+    指纹由词典文件的大小和修改时间计算。同一主机上的worker读取相同的版本文件和词典文件，
+    因而收敛到相同的版本号，缓存键中带上版本号后，只有旧版本的缓存条目会失效。
+
+    重载时在后台线程构建新的分词器，构建完成后一次性替换 (分词器, 版本) 元组；
+    正在处理的请求继续使用它们已取得的旧分词器，不会被阻塞。
+    """
+
+    def __init__(self, dict_path=None, user_dict_path=None, cache_dir=None, version_file=None,
+                 check_interval=5.0, watch_files=False):
+        self.dict_path = dict_path
+        self.user_dict_path = user_dict_path
+        self.cache_dir = cache_dir
+        self.version_file = version_file
+        self.check_interval = check_interval
+        self.watch_files = watch_files
+        self._current = (jieba.dt, None)
+        self._generation = 0
+        self._fingerprint = None
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._next_check = 0
+        self._listeners = []
+        self.loaded_at = None
+        self.load_seconds = None
+        self.reload_count = 0
+        self.last_error = None
+
+    @property
+    def tokenizer(self):
+        """当前分词器"""
+        return self._current[0]
+
+    @property
+    def version(self):
+        """当前词典版本"""
+        return self._current[1]
+
+    @property
+    def generation(self):
+        """当前词典代数（管理接口每次触发重载加一）"""
+        return self._generation
+
+    def current(self):
+        """
+        同时取得当前分词器和版本，保证二者一致
+
+        Returns:
+            tuple: (jieba.Tokenizer, 版本字符串)
+        """
+        return self._current
+
+    def add_listener(self, callback):
+        """注册词典替换后的回调 callback(旧版本, 新版本)"""
+        self._listeners.append(callback)
+
+    def _read_generation(self):
+        if not self.version_file:
+            return 0
+        try:
+            with open(self.version_file) as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _write_generation(self, generation):
+        directory = os.path.dirname(os.path.abspath(self.version_file))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.jieba-dict-version-')
+        with os.fdopen(fd, 'w') as f:
+            f.write(str(generation))
+        os.replace(tmp_path, self.version_file)
+
+    @staticmethod
+    def _make_version(generation, fingerprint):
+        return f"{generation}.{fingerprint[:8]}"
+
+    def _swap(self, tokenizer, generation, fingerprint, load_seconds):
+        old_version = self.version
+        new_version = self._make_version(generation, fingerprint)
+        self._generation = generation
+        self._fingerprint = fingerprint
+        self._current = (tokenizer, new_version)
+        self.loaded_at = time.time()
+        self.load_seconds = load_seconds
+        for callback in self._listeners:
+            try:
+                callback(old_version, new_version)
+            except Exception as e:
+                logging.warning(f"词典替换回调执行失败: {e}")
+
+    def load(self, tokenizer=None):
+        """
+        同步加载词典（启动时调用）
+
+        Args:
+            tokenizer (jieba.Tokenizer): 要初始化的已有分词器（如jieba.dt），None时新建
+        """
+        generation = self._read_generation()
+        fingerprint = dictionary_fingerprint(self.dict_path, self.user_dict_path)
+        start_time = time.time()
+        tokenizer = build_tokenizer(self.dict_path, self.user_dict_path,
+                                    cache_dir=self.cache_dir, tokenizer=tokenizer)
+        self._swap(tokenizer, generation, fingerprint, time.time() - start_time)
+        self._next_check = time.monotonic() + self.check_interval
+
+    def check(self):
+        """按检查间隔对比共享版本文件（及词典文件），发现变化时在后台重新加载"""
+        now = time.monotonic()
+        if now < self._next_check or self._reloading:
+            return
+        self._next_check = now + self.check_interval
+        generation = self._read_generation()
+        if generation == self._generation and not self.watch_files:
+            return
+        try:
+            fingerprint = dictionary_fingerprint(self.dict_path, self.user_dict_path)
+        except OSError as e:
+            logging.warning(f"检查词典文件失败: {e}")
+            return
+        if generation != self._generation or fingerprint != self._fingerprint:
+            self._start_reload(generation)
+
+    def request_reload(self):
+        """
+        要求所有worker重新加载词典：共享版本文件代数加一，并立即在本进程后台重载
+
+        Returns:
+            str: 重载完成后的目标版本
+        """
+        generation = self._read_generation() + 1
+        if self.version_file:
+            self._write_generation(generation)
+        self._start_reload(generation)
+        return self._make_version(generation, dictionary_fingerprint(self.dict_path, self.user_dict_path))
+
+    def _start_reload(self, generation):
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+        thread = threading.Thread(target=self._reload, args=(generation,), name='dictionary-reload', daemon=True)
+        thread.start()
+
+    def _reload(self, generation):
+        try:
+            fingerprint = dictionary_fingerprint(self.dict_path, self.user_dict_path)
+            start_time = time.time()
+            tokenizer = build_tokenizer(self.dict_path, self.user_dict_path, cache_dir=self.cache_dir)
+            load_seconds = time.time() - start_time
+            self._swap(tokenizer, generation, fingerprint, load_seconds)
+            self.reload_count += 1
+            self.last_error = None
+            logging.info(f"词典已热加载，版本: {self.version}, 耗时: {load_seconds:.3f}s")
+        except Exception as e:
+            self.last_error = str(e)
+            logging.error(f"词典热加载失败，继续使用版本 {self.version}: {e}")
+        finally:
+            self._reloading = False
+
+    def stats(self):
+        """获取词典加载状态"""
+        return {
+            'version': self.version,
+            'dict_path': self.dict_path,
+            'user_dict_path': self.user_dict_path,
+            'loaded_at': int(self.loaded_at) if self.loaded_at else None,
+            'load_seconds': round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            'reloading': self._reloading,
+            'reload_count': self.reload_count,
+            'last_error': self.last_error
+        }
+
+
+def get_memory_usage():
+    """
+    获取当前进程的内存占用
+
+    Returns:
+        dict: rss为常驻内存；pss为按共享进程数分摊后的内存（仅Linux可用，否则为None），
+              preload_app下多个worker共享词典页时pss明显小于rss
+    """
+    rss = pss = None
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                if line.startswith('Rss:'):
+                    rss = int(line.split()[1]) * 1024
+                elif line.startswith('Pss:'):
+                    pss = int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if rss is None:
+        import resource
+        # ru_maxrss在Linux上单位为KB，在macOS上为字节；这里只作为近似值
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return {'rss': rss, 'pss': pss}
+
+
+def format_memory_usage(usage=None):
+    """把内存占用格式化为日志文本"""
+    usage = usage or get_memory_usage()
+    text = f"RSS {usage['rss'] / 1048576:.1f}MB"
+    if usage['pss'] is not None:
+        text += f", PSS {usage['pss'] / 1048576:.1f}MB"
+    return text
+
@@ -0,0 +1,143 @@
+"""
+响应格式
+
+支持按Accept请求头协商响应编码：
+- application/json：默认，UTF-8输出，不把中文转义为\\uXXXX
+- application/msgpack：MessagePack编码的完整响应（需要安装可选依赖msgpack）
+- application/x-jieba-tokens：长度前缀的二进制分词结果，只包含词语本身
+
+二进制格式（小端序）：
+    uint32 列表数
+    每个列表: uint32 词数（失败条目为0xFFFFFFFF，之后没有词语）
+              每个词: uint32 UTF-8字节数 + UTF-8字节
+
+使用方法：
+from formats import negotiate, parse_fields, select_fields, encode_token_lists
+"""
+
+import struct
+
+try:
+    import msgpack
+except ImportError:  # 可选依赖，未安装时不提供MessagePack格式
+    msgpack = None
+
+MIME_JSON = 'application/json'
+MIME_MSGPACK = 'application/msgpack'
+MIME_TOKENS = 'application/x-jieba-tokens'
+
+# 失败条目的词数标记
+FAILED_COUNT = 0xFFFFFFFF
+
+_U32 = struct.Struct('<I')
+
+
+def negotiate(accept_mimetypes, binary=False):
+    """
+    根据Accept请求头选择响应格式，无法满足时返回JSON
+
+    Args:
+        accept_mimetypes: werkzeug的MIMEAccept对象（request.accept_mimetypes）
+        binary (bool): 当前接口是否支持二进制分词结果格式
+
+    Returns:
+        str: 选中的MIME类型
+    """
+    offered = [MIME_JSON]
+    if msgpack is not None:
+        offered.extend([MIME_MSGPACK, 'application/x-msgpack'])
+    if binary:
+        offered.append(MIME_TOKENS)
+    best = accept_mimetypes.best_match(offered, default=MIME_JSON)
+    return MIME_MSGPACK if best == 'application/x-msgpack' else best
+
+
+def parse_fields(value):
+    """
+    解析字段选择参数
+
+    Args:
+        value: 逗号分隔的字符串、字符串列表或None
+
+    Returns:
+        set: 字段名集合；未指定时返回None（表示返回全部字段）
+
+    Raises:
+        ValueError: 参数类型不正确
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.split(',')
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ValueError("fields参数必须是逗号分隔的字符串或字符串数组")
+    return {item.strip() for item in value if item.strip()}
+
+
+def wants_field(fields, name):
+    """字段是否需要返回（用于跳过不需要的计算，如缓存统计）"""
+    return fields is None or name in fields
+
+
+def select_fields(data, fields):
+    """只保留选中的字段，fields为None时原样返回"""
+    if fields is None:
+        return data
+    return {key: value for key, value in data.items() if key in fields}
+
+
+def encode_msgpack(obj):
+    """把响应对象编码为MessagePack"""
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def encode_token_lists(token_lists):
+    """
+    把若干分词结果编码为长度前缀的二进制格式
+
+    Args:
+        token_lists (list): 分词结果列表，失败条目为None
+
+    Returns:
+        bytes: 编码结果
+    """
+    pack = _U32.pack
+    parts = [pack(len(token_lists))]
+    for tokens in token_lists:
+        if tokens is None:
+            parts.append(pack(FAILED_COUNT))
+            continue
+        parts.append(pack(len(tokens)))
+        for token in tokens:
+            data = token.encode('utf-8')
+            parts.append(pack(len(data)))
+            parts.append(data)
+    return b''.join(parts)
+
+
+def decode_token_lists(data):
+    """
+    解码长度前缀的二进制分词结果（供客户端和测试使用）
+
+    Args:
+        data (bytes): encode_token_lists的输出
+
+    Returns:
+        list: 分词结果列表，失败条目为None
+    """
+    unpack = _U32.unpack_from
+    view = memoryview(data)
+    (list_count,), offset = unpack(view, 0), 4
+    token_lists = []
+    for _ in range(list_count):
+        (count,), offset = unpack(view, offset), offset + 4
+        if count == FAILED_COUNT:
+            token_lists.append(None)
+            continue
+        tokens = []
+        for _ in range(count):
+            (size,), offset = unpack(view, offset), offset + 4
+            tokens.append(bytes(view[offset:offset + size]).decode('utf-8'))
+            offset += size
+        token_lists.append(tokens)
+    return token_lists
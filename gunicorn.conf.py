@@ -0,0 +1,48 @@
+"""
+gunicorn配置
+
+启用preload_app：主进程在fork worker之前调用create_app()加载好jieba词典，
+worker通过copy-on-write共享这部分内存，而不是各自重新构建一份。
+
+Prometheus多进程模式：在加载应用（导入prometheus_client）之前设置 PROMETHEUS_MULTIPROC_DIR
+并清空上次运行留下的指标文件，worker退出时清理它的实时指标。
+
+使用方法：
+gunicorn -c gunicorn.conf.py "app:create_app()"
+"""
+
+import gc
+import os
+import shutil
+import tempfile
+
+from dictionary import format_memory_usage
+
+_metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR',
+                                     os.path.join(tempfile.gettempdir(), 'jieba-prometheus'))
+shutil.rmtree(_metrics_dir, ignore_errors=True)
+os.makedirs(_metrics_dir, exist_ok=True)
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WORKER_PROCESSES', '4'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '120'))
+preload_app = os.environ.get('PRELOAD_APP', 'true').lower() == 'true'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+accesslog = '-'
+errorlog = '-'
+
+
+def pre_fork(server, worker):
+    """fork前冻结主进程中已有对象，避免worker中的垃圾回收扫描写脏共享的词典内存页"""
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """记录每个worker启动时的内存占用（PSS反映分摊后的实际占用）"""
+    server.log.info(f"worker {worker.pid} 已启动，内存: {format_memory_usage()}")
+
+
+def child_exit(server, worker):
+    """worker退出后清理其Prometheus实时指标（如正在处理的请求数）"""
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid)
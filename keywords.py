@@ -0,0 +1,278 @@
+"""
+关键词提取
+
+提供与jieba.analyse相同算法的TF-IDF和TextRank关键词提取，但不自行分词：调用方传入（通常来自缓存的）
+分词结果或词性标注结果，避免对刚分过词的文本重复分词。
+
+IDF表编译为紧凑的二进制文件（按UTF-8字节序排序的词语 + 偏移数组 + IDF值数组），以只读mmap方式打开，
+同一主机上的所有worker共享操作系统页缓存中的同一份数据，不再各自把几十万词条的IDF表解析成Python字典。
+文件头中保存IDF中位数，用作未登录词的IDF（与jieba.analyse一致）。
+
+使用方法：
+from keywords import IdfIndex, extract_tfidf, extract_textrank, default_idf_path, analyse_stopwords
+"""
+
+import hashlib
+import heapq
+import logging
+import mmap
+import os
+import struct
+import tempfile
+from array import array
+from collections import defaultdict
+from operator import itemgetter
+
+# 文件头：魔数、格式版本、词条数、词语区字节数、IDF中位数
+_HEADER = struct.Struct('<8sIIQd')
+_MAGIC = b'JIEBAIDF'
+# 编译文件格式版本，格式变化时递增以使旧文件失效
+_COMPILED_FORMAT = 1
+
+# TextRank的共现窗口和默认词性（与jieba.analyse.TextRank相同）
+TEXTRANK_SPAN = 5
+TEXTRANK_POS = ('ns', 'n', 'vn', 'v')
+
+
+def default_idf_path():
+    """jieba自带的IDF文件路径"""
+    from jieba.analyse.tfidf import DEFAULT_IDF
+    return DEFAULT_IDF
+
+
+def analyse_stopwords():
+    """jieba.analyse默认的停用词（英文虚词）"""
+    from jieba.analyse.tfidf import KeywordExtractor
+    return frozenset(KeywordExtractor.STOP_WORDS)
+
+
+def _idf_fingerprint(path):
+    """IDF文件的绝对路径、大小和修改时间的摘要，文件变化时编译文件随之失效"""
+    abs_path = os.path.abspath(path)
+    stat = os.stat(abs_path)
+    signature = f"format:{_COMPILED_FORMAT}|{abs_path}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.blake2b(signature.encode('utf-8'), digest_size=12).hexdigest()
+
+
+def parse_idf_file(path):
+    """
+    读取IDF文本文件（每行 "词 IDF值"，忽略空行和格式错误的行）
+
+    Returns:
+        dict: 词 -> IDF值
+    """
+    idf = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) != 2:
+                continue
+            try:
+                idf[parts[0]] = float(parts[1])
+            except ValueError:
+                continue
+    return idf
+
+
+def compile_idf(idf, path):
+    """
+    把IDF表写成编译文件（先写临时文件再改名，并发编译时不会读到半个文件）
+
+    Args:
+        idf (dict): 词 -> IDF值
+        path (str): 编译文件路径
+    """
+    entries = sorted((word.encode('utf-8'), value) for word, value in idf.items())
+    values = sorted(idf.values())
+    median = values[len(values) // 2] if values else 0.0
+
+    blob = b''.join(word for word, _ in entries)
+    weights = array('d', (value for _, value in entries))
+    offsets = array('I', [0])
+    position = 0
+    for word, _ in entries:
+        position += len(word)
+        offsets.append(position)
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix='.jieba-idf-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, _COMPILED_FORMAT, len(entries), len(blob), median))
+            # IDF值放在偏移数组之前，两者都按各自的元素大小对齐
+            f.write(weights.tobytes())
+            f.write(offsets.tobytes())
+            f.write(blob)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class IdfIndex:
+    """
+    只读mmap的IDF表，按二分查找取词的IDF
+
+    Attributes:
+        path (str): IDF文本文件路径
+        compiled_path (str): 编译文件路径
+        median (float): IDF中位数（未登录词的IDF）
+    """
+
+    def __init__(self, path, compiled_path):
+        self.path = path
+        self.compiled_path = compiled_path
+        with open(compiled_path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, fmt, count, blob_size, median = _HEADER.unpack_from(self._mm, 0)
+        if magic != _MAGIC or fmt != _COMPILED_FORMAT:
+            self._mm.close()
+            raise ValueError(f"IDF编译文件格式不正确: {compiled_path}")
+        self._count = count
+        self.median = median
+        view = memoryview(self._mm)
+        start = _HEADER.size
+        self._weights = view[start:start + count * 8].cast('d')
+        start += count * 8
+        self._offsets = view[start:start + (count + 1) * 4].cast('I')
+        self._blob_start = start + (count + 1) * 4
+        if len(self._mm) < self._blob_start + blob_size:
+            raise ValueError(f"IDF编译文件不完整: {compiled_path}")
+
+    @classmethod
+    def load(cls, path, cache_dir):
+        """
+        打开IDF文件对应的编译文件，不存在或已过期时先编译
+
+        Args:
+            path (str): IDF文本文件路径
+            cache_dir (str): 编译文件目录
+
+        Returns:
+            IdfIndex: IDF表
+        """
+        os.makedirs(cache_dir, exist_ok=True)
+        compiled_path = os.path.join(cache_dir, f"jieba-idf-{_idf_fingerprint(path)}.bin")
+        if os.path.exists(compiled_path):
+            try:
+                return cls(path, compiled_path)
+            except (OSError, ValueError, struct.error) as e:
+                logging.warning(f"IDF编译文件无法读取，将重新编译 {compiled_path}: {e}")
+        compile_idf(parse_idf_file(path), compiled_path)
+        logging.info(f"已编译IDF文件: {path} -> {compiled_path}")
+        return cls(path, compiled_path)
+
+    def __len__(self):
+        return self._count
+
+    def get(self, word, default=None):
+        """
+        Args:
+            word (str): 词
+            default: 未登录词的返回值，None表示IDF中位数
+
+        Returns:
+            float: IDF值
+        """
+        key = word.encode('utf-8')
+        mm, offsets, base = self._mm, self._offsets, self._blob_start
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            probe = mm[base + offsets[mid]:base + offsets[mid + 1]]
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                return self._weights[mid]
+        return self.median if default is None else default
+
+    @property
+    def nbytes(self):
+        """编译文件大小（映射的字节数，多个进程共享）"""
+        return len(self._mm)
+
+
+def _is_candidate(word, stopwords):
+    return len(word.strip()) >= 2 and word.lower() not in stopwords
+
+
+def top_keywords(weights, top_k):
+    """
+    按权重取前K个关键词（堆选择，不对全部候选词排序）
+
+    Args:
+        weights (dict): 词 -> 权重
+        top_k (int): 关键词数，0表示全部
+
+    Returns:
+        list: [(词, 权重), ...]，按权重降序
+    """
+    if top_k and top_k < len(weights):
+        return heapq.nlargest(top_k, weights.items(), key=itemgetter(1))
+    return sorted(weights.items(), key=itemgetter(1), reverse=True)
+
+
+def extract_tfidf(words, idf, top_k=20, stopwords=frozenset(), flags=None, allow_pos=None):
+    """
+    TF-IDF关键词（算法与jieba.analyse.extract_tags相同）
+
+    Args:
+        words (list): 精确模式的分词结果（按词性过滤时为词性标注的词语列表）
+        idf (IdfIndex): IDF表
+        top_k (int): 关键词数，0表示全部
+        stopwords (frozenset): 停用词（按小写比较）
+        flags (list): 与words对应的词性，allow_pos不为空时必需
+        allow_pos (iterable): 只保留这些词性的词
+
+    Returns:
+        list: [(词, 权重), ...]，按权重降序
+    """
+    freq = defaultdict(int)
+    if allow_pos:
+        allowed = frozenset(allow_pos)
+        for word, flag in zip(words, flags):
+            if flag in allowed and _is_candidate(word, stopwords):
+                freq[word] += 1
+    else:
+        for word in words:
+            if _is_candidate(word, stopwords):
+                freq[word] += 1
+    total = sum(freq.values())
+    if not total:
+        return []
+    weights = {word: count * idf.get(word) / total for word, count in freq.items()}
+    return top_keywords(weights, top_k)
+
+
+def extract_textrank(words, flags, top_k=20, stopwords=frozenset(), allow_pos=TEXTRANK_POS):
+    """
+    TextRank关键词（算法与jieba.analyse.textrank相同：共现窗口内的词构成无向带权图）
+
+    Args:
+        words (list): 词性标注的词语列表（未过滤空白，与jieba.posseg.cut的结果一致）
+        flags (list): 与words对应的词性
+        top_k (int): 关键词数，0表示全部
+        stopwords (frozenset): 停用词（按小写比较）
+        allow_pos (iterable): 参与构图的词性
+
+    Returns:
+        list: [(词, 权重), ...]，按权重降序
+    """
+    from jieba.analyse.textrank import UndirectWeightedGraph
+    allowed = frozenset(allow_pos)
+    keep = [flag in allowed and _is_candidate(word, stopwords) for word, flag in zip(words, flags)]
+    cooccurrence = defaultdict(int)
+    for i, word in enumerate(words):
+        if not keep[i]:
+            continue
+        for j in range(i + 1, min(i + TEXTRANK_SPAN, len(words))):
+            if keep[j]:
+                cooccurrence[(word, words[j])] += 1
+    if not cooccurrence:
+        return []
+    graph = UndirectWeightedGraph()
+    for (start, end), weight in cooccurrence.items():
+        graph.addEdge(start, end, weight)
+    return top_keywords(graph.rank(), top_k)
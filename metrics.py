@@ -0,0 +1,166 @@
+"""
+Prometheus指标
+
+在gunicorn下使用prometheus_client的多进程模式：各worker把计数写入 PROMETHEUS_MULTIPROC_DIR
+目录中的mmap文件，抓取/metrics时合并所有文件，结果覆盖全部worker，且不访问请求日志数据库。
+环境变量必须在导入prometheus_client之前设置（gunicorn.conf.py负责）；未设置时为单进程模式。
+
+使用方法：
+from metrics import observe_request, render_metrics
+"""
+
+import os
+import threading
+
+from prometheus_client import (CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, REGISTRY)
+from prometheus_client import multiprocess
+
+from config import get_config
+from models import LATENCY_BUCKETS
+
+TEXT_LENGTH_BUCKETS = (10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000, 1000000)
+
+REQUEST_LATENCY = Histogram(
+    'jieba_request_duration_seconds', '请求处理耗时', ['endpoint', 'mode'], buckets=LATENCY_BUCKETS)
+REQUESTS = Counter(
+    'jieba_requests_total', '请求数', ['endpoint', 'method', 'status'])
+TEXT_LENGTH = Histogram(
+    'jieba_text_length_chars', '请求文本长度（字符）', ['endpoint'], buckets=TEXT_LENGTH_BUCKETS)
+IN_FLIGHT = Gauge(
+    'jieba_requests_in_flight', '正在处理的请求数', multiprocess_mode='livesum')
+
+TOKENS = Counter(
+    'jieba_tokens_total', '实际分词产生的词数（不含缓存命中）', ['mode'])
+TOKENIZE_SECONDS = Counter(
+    'jieba_tokenize_seconds_total', '实际分词耗时', ['mode'])
+CHARS = Counter(
+    'jieba_tokenized_chars_total', '实际分词的字符数', ['mode'])
+
+STAGE_LATENCY = Histogram(
+    'jieba_stage_duration_seconds', '请求各处理阶段耗时', ['endpoint', 'stage'], buckets=LATENCY_BUCKETS)
+
+CACHE_HITS = Counter('jieba_cache_hits_total', '缓存命中次数', ['level'])
+CACHE_MISSES = Counter('jieba_cache_misses_total', '缓存未命中次数', ['level'])
+CACHE_EVICTIONS = Counter('jieba_cache_evictions_total', '缓存淘汰（含过期）条目数', ['level'])
+
+DICTIONARY_LOAD_SECONDS = Gauge(
+    'jieba_dictionary_load_seconds', '最近一次词典加载耗时', ['dict'], multiprocess_mode='max')
+DICTIONARY_LOADS = Counter('jieba_dictionary_loads_total', '词典加载次数', ['dict'])
+
+EXECUTOR_PENDING = Gauge(
+    'jieba_executor_pending', '异步模式分词通道中排队和执行中的任务数', ['lane'], multiprocess_mode='livesum')
+EXECUTOR_REJECTED = Counter('jieba_executor_rejected_total', '异步模式分词通道排队已满而拒绝的请求数', ['lane'])
+
+ADMISSION_REJECTED = Counter(
+    'jieba_admission_rejected_total', '准入控制拒绝或提前结束的请求数', ['reason'])
+
+COALESCED = Counter(
+    'jieba_coalesced_total', '未命中缓存时合并到其他请求的分词次数', ['source'])
+
+# 缓存淘汰数由缓存对象内部累计，这里记录已上报的值，只上报增量
+_reported_evictions = {}
+_reported_lock = threading.Lock()
+
+
+def mode_label(mode):
+    """
+    分词模式的指标标签
+
+    模式来自客户端输入，只有配置的分词模式才作为标签值，其他值记为'invalid'，
+    避免任意字符串各自产生新的时间序列（多进程模式下还会写入各worker的mmap文件）。
+
+    Returns:
+        str: 分词模式、'invalid'，未指定模式时为''
+    """
+    if mode is None or mode == '':
+        return ''
+    if isinstance(mode, str) and mode in get_config().TOKENIZE_MODES:
+        return mode
+    return 'invalid'
+
+
+def observe_request(endpoint, method, status, duration, mode=None, text_length=None):
+    """记录一次请求的耗时、状态和文本长度"""
+    REQUEST_LATENCY.labels(endpoint, mode_label(mode)).observe(duration)
+    REQUESTS.labels(endpoint, method, str(status)).inc()
+    if text_length is not None:
+        TEXT_LENGTH.labels(endpoint).observe(text_length)
+
+
+def observe_tokenize(mode, token_count, char_count, seconds):
+    """记录一次实际分词（缓存未命中）的词数、字符数和耗时，用于计算每秒词数"""
+    mode = mode_label(mode)
+    TOKENS.labels(mode).inc(token_count)
+    CHARS.labels(mode).inc(char_count)
+    TOKENIZE_SECONDS.labels(mode).inc(seconds)
+
+
+def observe_stages(endpoint, timings):
+    """记录一个请求各阶段的耗时 {阶段: 秒}"""
+    for name, seconds in timings.items():
+        STAGE_LATENCY.labels(endpoint, name).observe(seconds)
+
+
+def observe_cache(level, hit):
+    """记录一次缓存查询结果"""
+    (CACHE_HITS if hit else CACHE_MISSES).labels(level).inc()
+
+
+def observe_cache_evictions(level, total):
+    """
+    上报缓存淘汰数的增量
+
+    Args:
+        level (str): 缓存级别（l1/l2）
+        total (int): 缓存对象累计的淘汰数
+    """
+    with _reported_lock:
+        delta = total - _reported_evictions.get(level, 0)
+        _reported_evictions[level] = total
+    if delta > 0:
+        CACHE_EVICTIONS.labels(level).inc(delta)
+
+
+def observe_dictionary_load(name, seconds):
+    """记录一次词典加载耗时"""
+    DICTIONARY_LOAD_SECONDS.labels(name).set(seconds)
+    DICTIONARY_LOADS.labels(name).inc()
+
+
+def observe_executor(lane, pending, rejected=False):
+    """记录异步模式分词通道的任务数，rejected为True时记一次拒绝"""
+    EXECUTOR_PENDING.labels(lane).set(pending)
+    if rejected:
+        EXECUTOR_REJECTED.labels(lane).inc()
+
+
+def observe_admission_rejected(reason):
+    """记录一次准入拒绝（rate_limit限流 / heavy长文本名额 / deadline请求时限）"""
+    ADMISSION_REJECTED.labels(reason).inc()
+
+
+def observe_coalesced(source):
+    """记录一次合并结果（local同进程其他请求的结果 / shared其他worker的结果 / fallback超时或失败后自行分词）"""
+    COALESCED.labels(source).inc()
+
+
+def render_metrics():
+    """
+    生成Prometheus文本格式的指标
+
+    Returns:
+        tuple: (指标文本, Content-Type)
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """worker退出后清理其livesum等实时指标文件（gunicorn child_exit钩子调用）"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
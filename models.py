@@ -2,16 +2,50 @@
 数据库模型定义
 
 使用方法：
-from models import init_db, save_request_log
+from models import init_db, save_request_log, enqueue_request_log
 """
 
+import atexit
+import bisect
+import logging
+import queue
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timedelta
 from contextlib import closing
 import os
 
 DB_PATH = os.environ.get('DB_PATH', 'jieba_stats.db')
 
+# 响应时间直方图的桶上界（秒），最后一列统计超过最大上界的请求
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+_HIST_COLUMNS = [f'h{i}' for i in range(len(LATENCY_BUCKETS) + 1)]
+
+# 汇总粒度 -> 时间桶格式
+ROLLUP_GRANULARITIES = {
+    'minute': '%Y-%m-%d %H:%M',
+    'hour': '%Y-%m-%d %H:00'
+}
+
+_REQUEST_LOG_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS {schema}request_log (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp DATETIME NOT NULL,
+        endpoint TEXT NOT NULL,
+        method TEXT NOT NULL,
+        status_code INTEGER NOT NULL,
+        response_time REAL NOT NULL,
+        mode TEXT,
+        text_length INTEGER
+    )
+'''
+
+# 原始日志保留策略（由configure_retention设置）
+_retention_days = 0
+_archive_path = None
+_minute_rollup_hours = 48
+
 def get_db_connection():
     """获取数据库连接"""
     conn = sqlite3.connect(DB_PATH)
@@ -21,59 +55,426 @@ def get_db_connection():
 def init_db():
     """初始化数据库"""
     with closing(get_db_connection()) as conn:
-        conn.execute('''
-            CREATE TABLE IF NOT EXISTS request_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp DATETIME NOT NULL,
-                endpoint TEXT NOT NULL,
-                method TEXT NOT NULL,
-                status_code INTEGER NOT NULL,
-                response_time REAL NOT NULL,
-                mode TEXT,
-                text_length INTEGER
-            )
-        ''')
+        # WAL模式下读写互不阻塞，多worker写日志时不易出现 database is locked
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(_REQUEST_LOG_SCHEMA.format(schema=''))
         conn.execute('CREATE INDEX IF NOT EXISTS idx_timestamp ON request_log(timestamp)')
         conn.execute('CREATE INDEX IF NOT EXISTS idx_mode ON request_log(mode)')
+        # 按分钟/小时和分词模式预聚合的统计，写日志时同步累加，统计查询只读该表
+        hist_columns = ', '.join(f'{column} INTEGER NOT NULL DEFAULT 0' for column in _HIST_COLUMNS)
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS request_rollup (
+                granularity TEXT NOT NULL,
+                bucket TEXT NOT NULL,
+                mode TEXT NOT NULL DEFAULT '',
+                count INTEGER NOT NULL DEFAULT 0,
+                latency_sum REAL NOT NULL DEFAULT 0,
+                latency_min REAL,
+                latency_max REAL,
+                {hist_columns},
+                PRIMARY KEY (granularity, bucket, mode)
+            )
+        ''')
+        conn.commit()
+        _backfill_rollups(conn)
+
+def _backfill_rollups(conn):
+    """汇总表为空而原始日志有数据时（升级后首次启动），从原始日志一次性生成汇总"""
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        if (conn.execute('SELECT 1 FROM request_rollup LIMIT 1').fetchone() is None and
+                conn.execute('SELECT 1 FROM request_log LIMIT 1').fetchone() is not None):
+            bounds = (0,) + LATENCY_BUCKETS
+            hist_exprs = [
+                f'SUM(CASE WHEN response_time > {low} AND response_time <= {high} THEN 1 ELSE 0 END)'
+                for low, high in zip(bounds, LATENCY_BUCKETS)
+            ]
+            # 第一个桶包含响应时间为0的请求
+            hist_exprs[0] = f'SUM(CASE WHEN response_time <= {LATENCY_BUCKETS[0]} THEN 1 ELSE 0 END)'
+            hist_exprs.append(f'SUM(CASE WHEN response_time > {LATENCY_BUCKETS[-1]} THEN 1 ELSE 0 END)')
+            for granularity, bucket_format in ROLLUP_GRANULARITIES.items():
+                conn.execute(f'''
+                    INSERT INTO request_rollup (granularity, bucket, mode, count, latency_sum,
+                                                latency_min, latency_max, {', '.join(_HIST_COLUMNS)})
+                    SELECT ?, strftime(?, timestamp) AS bucket, COALESCE(mode, '') AS rollup_mode,
+                           COUNT(*), SUM(response_time), MIN(response_time), MAX(response_time),
+                           {', '.join(hist_exprs)}
+                    FROM request_log
+                    GROUP BY bucket, rollup_mode
+                ''', (granularity, bucket_format))
+            logging.info("已从原始请求日志生成统计汇总")
         conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+_UPSERT_ROLLUP_SQL = f'''
+    INSERT INTO request_rollup (granularity, bucket, mode, count, latency_sum, latency_min, latency_max,
+                                {', '.join(_HIST_COLUMNS)})
+    VALUES (?, ?, ?, ?, ?, ?, ?, {', '.join('?' for _ in _HIST_COLUMNS)})
+    ON CONFLICT (granularity, bucket, mode) DO UPDATE SET
+        count = count + excluded.count,
+        latency_sum = latency_sum + excluded.latency_sum,
+        latency_min = MIN(latency_min, excluded.latency_min),
+        latency_max = MAX(latency_max, excluded.latency_max),
+        {', '.join(f'{column} = {column} + excluded.{column}' for column in _HIST_COLUMNS)}
+'''
+
+def _apply_rollups(conn, rows):
+    """把一批日志行累加到汇总表（需在调用方的事务中执行）"""
+    aggregates = {}
+    for timestamp, _, _, _, response_time, mode, _ in rows:
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        bucket_index = bisect.bisect_left(LATENCY_BUCKETS, response_time)
+        for granularity, bucket_format in ROLLUP_GRANULARITIES.items():
+            key = (granularity, timestamp.strftime(bucket_format), mode or '')
+            agg = aggregates.get(key)
+            if agg is None:
+                agg = aggregates[key] = [0, 0.0, response_time, response_time] + [0] * len(_HIST_COLUMNS)
+            agg[0] += 1
+            agg[1] += response_time
+            agg[2] = min(agg[2], response_time)
+            agg[3] = max(agg[3], response_time)
+            agg[4 + bucket_index] += 1
+    conn.executemany(_UPSERT_ROLLUP_SQL, [key + tuple(agg) for key, agg in aggregates.items()])
+
+_INSERT_LOG_SQL = '''
+    INSERT INTO request_log (timestamp, endpoint, method, status_code, response_time, mode, text_length)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
 
 def save_request_log(endpoint, method, status_code, response_time, mode=None, text_length=None):
     """保存请求日志"""
-    with closing(get_db_connection()) as conn:
-        conn.execute('''
-            INSERT INTO request_log (timestamp, endpoint, method, status_code, response_time, mode, text_length)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (datetime.now(), endpoint, method, status_code, response_time, mode, text_length))
+    save_request_logs([(datetime.now(), endpoint, method, status_code, response_time, mode, text_length)])
+
+def save_request_logs(rows, conn=None):
+    """
+    在一个事务中批量保存请求日志
+
+    Args:
+        rows (list): (timestamp, endpoint, method, status_code, response_time, mode, text_length) 元组列表
+        conn (sqlite3.Connection): 可复用的数据库连接，为None时临时创建
+    """
+    if not rows:
+        return
+    if conn is None:
+        with closing(get_db_connection()) as conn:
+            save_request_logs(rows, conn)
+        return
+    with conn:
+        conn.executemany(_INSERT_LOG_SQL, rows)
+        _apply_rollups(conn, rows)
+
+class RequestLogWriter:
+    """
+    请求日志后台写入器
+
+    请求线程只把日志行放入有界内存队列，由后台线程按批次（batch_size条或flush_interval秒）
+    用executemany在单个事务中写入。队列满时按policy处理：
+    - 'drop': 立即丢弃并计数，请求线程永不阻塞
+    - 'block': 最多等待block_timeout秒，仍无空位再丢弃
+
+    写入线程在首次提交时按进程启动，gunicorn fork出的worker会各自启动自己的线程。
+    """
+
+    _STOP = object()
+
+    def __init__(self, max_queue_size=10000, flush_interval=1.0, batch_size=500,
+                 policy='drop', block_timeout=0.5, retention_interval=3600):
+        self.max_queue_size = max_queue_size
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.retention_interval = retention_interval
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            if self._pid != os.getpid():
+                # fork后父进程的队列和线程都不可用，重新创建
+                self._queue = queue.Queue(maxsize=self.max_queue_size)
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='request-log-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, row):
+        """
+        提交一条日志行
+
+        Args:
+            row (tuple): 与save_request_logs相同格式的日志行
+
+        Returns:
+            bool: 是否成功入队
+        """
+        self._ensure_started()
+        try:
+            if self.policy == 'block':
+                self._queue.put(row, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _run(self):
+        log_queue = self._queue
+        conn = get_db_connection()
+        conn.execute('PRAGMA synchronous=NORMAL')
+        next_retention = time.monotonic() + self.retention_interval
+        try:
+            stopping = False
+            while not stopping:
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.batch_size:
+                    timeout = deadline - time.monotonic()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = log_queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                    if item is self._STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                if stopping:
+                    # 停止前取出队列中剩余的日志
+                    while True:
+                        try:
+                            item = log_queue.get_nowait()
+                        except queue.Empty:
+                            break
+                        if item is not self._STOP:
+                            batch.append(item)
+                self._write(conn, batch)
+                if not stopping and time.monotonic() >= next_retention:
+                    next_retention = time.monotonic() + self.retention_interval
+                    run_retention(conn)
+        finally:
+            conn.close()
+
+    def _write(self, conn, batch):
+        if not batch:
+            return
+        try:
+            save_request_logs(batch, conn)
+            self.written += len(batch)
+            return
+        except sqlite3.Error as e:
+            logging.warning(f"批量写入请求日志失败（{len(batch)}条），改为逐条写入: {e}")
+        # 逐条重试，个别无法写入的行不影响同批的其他日志
+        for row in batch:
+            try:
+                save_request_logs([row], conn)
+                self.written += 1
+            except sqlite3.Error as e:
+                self.failed += 1
+                logging.warning(f"写入请求日志失败: {e}")
+
+    def stop(self, timeout=5.0):
+        """停止写入线程，并在超时前写完队列中剩余的日志"""
+        thread = self._thread
+        if thread is None or self._pid != os.getpid() or not thread.is_alive():
+            return
+        try:
+            self._queue.put(self._STOP, timeout=timeout)
+        except queue.Full:
+            logging.warning("请求日志队列已满，停止时可能丢失部分日志")
+        thread.join(timeout)
+        self._thread = None
+
+    def stats(self):
+        """获取写入器统计信息（当前进程）"""
+        return {
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed
+        }
+
+_log_writer = None
+
+def setup_log_writer(enabled=True, max_queue_size=10000, flush_interval=1.0, batch_size=500, policy='drop',
+                     retention_interval=3600):
+    """
+    配置请求日志的写入方式
+
+    Args:
+        enabled (bool): 是否启用后台批量写入，False时每个请求同步写入
+        max_queue_size (int): 内存队列容量
+        flush_interval (float): 最长刷新间隔（秒）
+        batch_size (int): 单个事务的最大行数
+        policy (str): 队列满时的处理策略（'drop' 或 'block'）
+        retention_interval (float): 后台线程执行日志保留策略的间隔（秒）
+    """
+    global _log_writer
+    if _log_writer is not None:
+        _log_writer.stop()
+    _log_writer = RequestLogWriter(max_queue_size, flush_interval, batch_size, policy,
+                                   retention_interval=retention_interval) if enabled else None
+
+def enqueue_request_log(endpoint, method, status_code, response_time, mode=None, text_length=None):
+    """记录请求日志：启用后台写入时入队，否则同步写入"""
+    # mode来自客户端JSON，可能是任意类型，只记录字符串
+    if not isinstance(mode, str):
+        mode = None
+    if _log_writer is None:
+        save_request_log(endpoint, method, status_code, response_time, mode, text_length)
+        return
+    _log_writer.submit((datetime.now(), endpoint, method, status_code, response_time, mode, text_length))
+
+def flush_request_logs(timeout=5.0):
+    """停止后台写入线程并写完剩余日志（进程退出时自动调用）"""
+    if _log_writer is not None:
+        _log_writer.stop(timeout)
+
+def get_log_writer_stats():
+    """获取后台写入器统计信息，未启用时返回None"""
+    return _log_writer.stats() if _log_writer is not None else None
+
+atexit.register(flush_request_logs)
+
+def configure_retention(days=0, archive_path=None, minute_rollup_hours=48):
+    """
+    配置原始日志保留策略
+
+    Args:
+        days (int): 原始请求日志保留天数，0表示永久保留
+        archive_path (str): 归档数据库路径，设置后过期日志先复制到该库再删除
+        minute_rollup_hours (int): 分钟级汇总的保留小时数（小时级汇总永久保留）
+    """
+    global _retention_days, _archive_path, _minute_rollup_hours
+    _retention_days = days
+    _archive_path = archive_path or None
+    _minute_rollup_hours = minute_rollup_hours
+
+def prune_request_log(conn, days, archive_path=None, batch_size=5000):
+    """
+    删除（或归档后删除）超过保留期的原始日志，分批提交以缩短写锁时间
+
+    汇总表已包含这些日志的统计，删除后统计数据不受影响。
+
+    Args:
+        conn (sqlite3.Connection): 数据库连接
+        days (int): 保留天数
+        archive_path (str): 归档数据库路径，为None时直接删除
+        batch_size (int): 每批处理的行数
+
+    Returns:
+        int: 处理的行数
+    """
+    cutoff = datetime.now() - timedelta(days=days)
+    if archive_path:
+        conn.execute('ATTACH DATABASE ? AS archive', (archive_path,))
+        conn.execute(_REQUEST_LOG_SCHEMA.format(schema='archive.'))
         conn.commit()
+    removed = 0
+    try:
+        while True:
+            ids = [row[0] for row in conn.execute(
+                'SELECT id FROM request_log WHERE timestamp < ? ORDER BY id LIMIT ?', (cutoff, batch_size)
+            )]
+            if not ids:
+                break
+            placeholders = ', '.join('?' for _ in ids)
+            with conn:
+                if archive_path:
+                    conn.execute(f'INSERT OR IGNORE INTO archive.request_log SELECT * FROM main.request_log '
+                                 f'WHERE id IN ({placeholders})', ids)
+                conn.execute(f'DELETE FROM request_log WHERE id IN ({placeholders})', ids)
+            removed += len(ids)
+    finally:
+        if archive_path:
+            conn.execute('DETACH DATABASE archive')
+    return removed
+
+def run_retention(conn=None):
+    """按configure_retention的设置清理原始日志和过期的分钟级汇总"""
+    if conn is None:
+        with closing(get_db_connection()) as conn:
+            return run_retention(conn)
+    try:
+        removed = 0
+        if _retention_days > 0:
+            removed = prune_request_log(conn, _retention_days, _archive_path)
+        minute_cutoff = (datetime.now() - timedelta(hours=_minute_rollup_hours)).strftime(
+            ROLLUP_GRANULARITIES['minute'])
+        with conn:
+            conn.execute("DELETE FROM request_rollup WHERE granularity = 'minute' AND bucket < ?",
+                         (minute_cutoff,))
+        if removed:
+            logging.info(f"已{'归档并' if _archive_path else ''}清理过期请求日志 {removed} 条")
+        return removed
+    except sqlite3.Error as e:
+        logging.warning(f"清理过期请求日志失败: {e}")
+        return 0
 
 def get_stats():
-    """获取统计数据"""
+    """获取统计数据（只读取汇总表和最近的原始日志，不扫描全表）"""
     with closing(get_db_connection()) as conn:
-        total = conn.execute('SELECT COUNT(*) as count FROM request_log').fetchone()['count']
-        avg_time = conn.execute('SELECT AVG(response_time) as avg FROM request_log').fetchone()['avg'] or 0
+        hist_sums = ', '.join(f'COALESCE(SUM({column}), 0) AS {column}' for column in _HIST_COLUMNS)
+        summary = conn.execute(f'''
+            SELECT COALESCE(SUM(count), 0) AS total, COALESCE(SUM(latency_sum), 0) AS latency_sum,
+                   MIN(latency_min) AS min_time, MAX(latency_max) AS max_time, {hist_sums}
+            FROM request_rollup
+            WHERE granularity = 'hour'
+        ''').fetchone()
+        total = summary['total']
+        avg_time = summary['latency_sum'] / total if total else 0
         hourly = conn.execute('''
-            SELECT strftime('%Y-%m-%d %H:00', timestamp) as hour, COUNT(*) as count
-            FROM request_log
-            GROUP BY hour
-            ORDER BY hour DESC
+            SELECT bucket as hour, SUM(count) as count
+            FROM request_rollup
+            WHERE granularity = 'hour'
+            GROUP BY bucket
+            ORDER BY bucket DESC
             LIMIT 24
         ''').fetchall()
+        minutely = conn.execute('''
+            SELECT bucket as minute, SUM(count) as count, SUM(latency_sum) / SUM(count) as avg_time
+            FROM request_rollup
+            WHERE granularity = 'minute'
+            GROUP BY bucket
+            ORDER BY bucket DESC
+            LIMIT 60
+        ''').fetchall()
         mode_dist = conn.execute('''
-            SELECT mode, COUNT(*) as count
-            FROM request_log
-            WHERE mode IS NOT NULL
+            SELECT mode, SUM(count) as count
+            FROM request_rollup
+            WHERE granularity = 'hour' AND mode != ''
             GROUP BY mode
         ''').fetchall()
         recent = conn.execute('''
             SELECT * FROM request_log
-            ORDER BY timestamp DESC
+            ORDER BY id DESC
             LIMIT 50
         ''').fetchall()
 
+        upper_bounds = [str(bound) for bound in LATENCY_BUCKETS] + ['+Inf']
         return {
             'total': total,
             'avg_time': round(avg_time, 3),
+            'min_time': round(summary['min_time'] or 0, 3),
+            'max_time': round(summary['max_time'] or 0, 3),
+            'latency_histogram': [
+                {'le': bound, 'count': summary[column]} for bound, column in zip(upper_bounds, _HIST_COLUMNS)
+            ],
             'hourly': [dict(row) for row in hourly],
+            'minutely': [dict(row) for row in minutely],
             'mode_dist': [dict(row) for row in mode_dist],
             'recent': [dict(row) for row in recent]
         }
@@ -0,0 +1,125 @@
+"""
+多模式分词
+
+jieba的精确模式和全模式按相同的规则（re_han_default）把文本拆成词块，并且都要为每个词块构建一次
+前缀词典DAG；搜索引擎模式则是在精确模式结果上追加词典中存在的二字、三字子词。
+cut_modes 对每个词块只构建一次DAG，在其上同时计算需要的模式，搜索引擎模式直接由精确模式结果派生，
+结果与分别调用 cut、cut(cut_all=True)、cut_for_search 完全一致。
+
+词块的切分复用jieba内部的 __cut_DAG / __cut_all（传入使用预先构建的DAG的代理对象），
+当前jieba版本没有这些内部函数时退回逐个模式调用公开接口。
+
+使用方法：
+from multicut import cut_modes
+"""
+
+import jieba
+
+MODE_PRECISE = '精确'
+MODE_FULL = '全模式'
+MODE_SEARCH = '搜索引擎'
+
+_cut_dag = getattr(jieba.Tokenizer, '_Tokenizer__cut_DAG', None)
+_cut_all = getattr(jieba.Tokenizer, '_Tokenizer__cut_all', None)
+
+
+class _BlockTokenizer:
+    """get_DAG返回预先构建好的DAG，其余属性转发给原分词器"""
+
+    __slots__ = ('_tokenizer', '_dag')
+
+    def __init__(self, tokenizer, dag):
+        self._tokenizer = tokenizer
+        self._dag = dag
+
+    def get_DAG(self, sentence):
+        return self._dag
+
+    def __getattr__(self, name):
+        return getattr(self._tokenizer, name)
+
+
+def search_words(words, freq):
+    """
+    由精确模式的结果派生搜索引擎模式（与 Tokenizer.cut_for_search 的规则相同）
+
+    Args:
+        words (iterable): 精确模式分词结果
+        freq (dict): 分词器的词频表
+
+    Yields:
+        str: 搜索引擎模式的词
+    """
+    for word in words:
+        if len(word) > 2:
+            for i in range(len(word) - 1):
+                gram2 = word[i:i + 2]
+                if freq.get(gram2):
+                    yield gram2
+        if len(word) > 3:
+            for i in range(len(word) - 2):
+                gram3 = word[i:i + 3]
+                if freq.get(gram3):
+                    yield gram3
+        yield word
+
+
+def _cut_modes_separately(text, modes, tokenizer):
+    results = {}
+    if MODE_PRECISE in modes or MODE_SEARCH in modes:
+        results[MODE_PRECISE] = list(tokenizer.cut(text))
+    if MODE_FULL in modes:
+        results[MODE_FULL] = list(tokenizer.cut(text, cut_all=True))
+    return results
+
+
+def cut_modes(text, modes, tokenizer):
+    """
+    一次遍历计算多个分词模式
+
+    Args:
+        text (str): 待分词文本
+        modes (iterable): 需要的分词模式（'精确'、'全模式'、'搜索引擎'）
+        tokenizer (jieba.Tokenizer): 分词器
+
+    Returns:
+        dict: {分词模式: 原始分词结果列表（未过滤空白）}，只包含modes中的模式
+    """
+    modes = set(modes)
+    want_precise = MODE_PRECISE in modes or MODE_SEARCH in modes
+    want_full = MODE_FULL in modes
+
+    if _cut_dag is None or _cut_all is None:
+        results = _cut_modes_separately(text, modes, tokenizer)
+    else:
+        precise = []
+        full = []
+        re_han = jieba.re_han_default
+        re_skip = jieba.re_skip_default
+        for block in re_han.split(text):
+            if not block:
+                continue
+            if re_han.match(block):
+                proxy = _BlockTokenizer(tokenizer, tokenizer.get_DAG(block))
+                if want_precise:
+                    precise.extend(_cut_dag(proxy, block))
+                if want_full:
+                    full.extend(_cut_all(proxy, block))
+                continue
+            # 非词块部分：空白作为整体，其他字符精确模式逐字输出、全模式整体输出
+            for piece in re_skip.split(block):
+                if re_skip.match(piece):
+                    precise.append(piece)
+                    full.append(piece)
+                else:
+                    precise.extend(piece)
+                    full.append(piece)
+        results = {}
+        if want_precise:
+            results[MODE_PRECISE] = precise
+        if want_full:
+            results[MODE_FULL] = full
+
+    if MODE_SEARCH in modes:
+        results[MODE_SEARCH] = list(search_words(results[MODE_PRECISE], tokenizer.FREQ))
+    return {mode: results[mode] for mode in modes}
@@ -0,0 +1,171 @@
+"""
+请求阶段计时与采样性能分析
+
+- 阶段计时：分词热路径的各阶段（输入验证、缓存查询、jieba分词、过滤、序列化、日志写入等）
+  把耗时累加到当前请求上下文，请求结束时写入Server-Timing响应头并上报指标。
+  不在请求上下文中（如进程池子进程、命令行调用）时计时为空操作。
+- 采样分析：按 1/N 的比例或根据 X-Profile 请求头对请求启用cProfile，耗时超过阈值的请求
+  把分析结果写入目录（pstats格式，可用snakeviz、flameprof、gprof2dot等工具查看或生成火焰图）。
+
+使用方法：
+from profiling import stage, record_stage, setup_profiling, start_profile, finish_profile
+"""
+
+import cProfile
+import logging
+import os
+import random
+import re
+import time
+
+from flask import g, has_app_context
+
+_sample_rate = 0
+_min_duration = 0.0
+_profile_dir = None
+_header_enabled = False
+_max_files = 100
+
+
+def record_stage(name, seconds):
+    """把阶段耗时累加到当前请求（同一阶段多次执行时累计）"""
+    if not has_app_context():
+        return
+    timings = g.get('stage_timings')
+    if timings is None:
+        timings = g.stage_timings = {}
+    timings[name] = timings.get(name, 0.0) + seconds
+
+
+class stage:
+    """
+    阶段计时上下文管理器
+
+    with stage('cache_get'):
+        result = get_from_cache(key)
+    """
+
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        record_stage(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def get_stage_timings():
+    """当前请求已记录的阶段耗时 {阶段: 秒}"""
+    if not has_app_context():
+        return {}
+    return g.get('stage_timings') or {}
+
+
+def format_server_timing(timings, total=None):
+    """
+    格式化为Server-Timing响应头（单位毫秒）
+
+    Args:
+        timings (dict): {阶段: 秒}
+        total (float): 请求总耗时（秒），None时不输出
+
+    Returns:
+        str: 如 "validate;dur=0.012, cut;dur=1.530, total;dur=2.100"
+    """
+    parts = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in timings.items()]
+    if total is not None:
+        parts.append(f"total;dur={total * 1000:.3f}")
+    return ', '.join(parts)
+
+
+def setup_profiling(sample_rate=0, min_duration=0.0, directory=None, header_enabled=False, max_files=100):
+    """
+    配置采样性能分析
+
+    Args:
+        sample_rate (int): 每N个请求分析1个，0表示不按比例采样
+        min_duration (float): 只保存耗时不低于该值（秒）的分析结果
+        directory (str): 分析结果目录
+        header_enabled (bool): 是否允许请求通过 X-Profile: 1 请求头强制分析
+        max_files (int): 目录中最多保留的分析文件数，超出时删除最旧的
+    """
+    global _sample_rate, _min_duration, _profile_dir, _header_enabled, _max_files
+    _sample_rate = sample_rate
+    _min_duration = min_duration
+    _profile_dir = directory
+    _header_enabled = header_enabled
+    _max_files = max_files
+    if directory and (sample_rate or header_enabled):
+        os.makedirs(directory, exist_ok=True)
+        logging.info(f"采样性能分析已启用 - 采样: {f'1/{sample_rate}' if sample_rate else '仅请求头'}, "
+                     f"耗时阈值: {min_duration}s, 目录: {directory}")
+
+
+def start_profile(headers):
+    """
+    判断当前请求是否需要分析，需要时启动cProfile
+
+    Args:
+        headers: 请求头
+
+    Returns:
+        cProfile.Profile: 已启动的分析器；不分析时返回None
+    """
+    if not _profile_dir:
+        return None
+    forced = _header_enabled and headers.get('X-Profile') == '1'
+    if not forced and not (_sample_rate and random.randrange(_sample_rate) == 0):
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # 同一线程已有其他分析器在运行
+        return None
+    return profiler
+
+
+def finish_profile(profiler, duration, label):
+    """
+    停止分析，耗时达到阈值时把结果写入文件
+
+    Args:
+        profiler (cProfile.Profile): start_profile的返回值
+        duration (float): 请求耗时（秒）
+        label (str): 文件名标识（如请求路径和request_id）
+
+    Returns:
+        str: 写入的文件路径；未写入时返回None
+    """
+    profiler.disable()
+    if duration < _min_duration:
+        return None
+    safe_label = re.sub(r'[^\w.-]+', '_', label).strip('_')
+    path = os.path.join(_profile_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{int(duration * 1000)}ms-{safe_label}.prof")
+    try:
+        profiler.dump_stats(path)
+        _prune_profiles()
+    except OSError as e:
+        logging.warning(f"写入性能分析文件失败 {path}: {e}")
+        return None
+    logging.info(f"慢请求性能分析已保存: {path} (耗时: {duration:.3f}s)")
+    return path
+
+
+def _prune_profiles():
+    """只保留最新的_max_files个分析文件"""
+    files = [os.path.join(_profile_dir, name) for name in os.listdir(_profile_dir) if name.endswith('.prof')]
+    if len(files) <= _max_files:
+        return
+    files.sort(key=os.path.getmtime)
+    for path in files[:len(files) - _max_files]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
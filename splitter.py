@@ -0,0 +1,120 @@
+"""
+文本安全切分
+
+jieba分词时先用 re_han_default 把文本拆成"词块"（汉字、字母、数字及 +#&._%- ）和其他字符，
+各词块独立分词。因此在"非词块字符 → 词块字符"的交界处切开文本，各段分词结果按顺序拼接后
+与整段分词（精确、全模式、搜索引擎三种模式）完全一致，不会切断任何词。
+
+使用方法：
+from splitter import split_text, split_sentences, iter_segments
+"""
+
+import re
+
+# 与 jieba.re_han_default 的字符集保持一致
+_BLOCK_CHARS = '\u4E00-\u9FD5a-zA-Z0-9+#&\\._%\\-'
+
+# 句末标点之后紧跟词块字符：优先在这里切分
+_SENTENCE_BOUNDARY = re.compile(f'(?<=[。！？!?；;…\\n])(?=[{_BLOCK_CHARS}])')
+
+# 任意非词块字符之后紧跟词块字符（逗号、空格等）：没有句子边界时使用
+_BLOCK_BOUNDARY = re.compile(f'(?<=[^{_BLOCK_CHARS}])(?=[{_BLOCK_CHARS}])')
+
+
+def _last_boundary(pattern, text, start, end):
+    """返回text[start:end]范围内（不含start）最后一个切分位置，没有时返回None"""
+    position = None
+    for match in pattern.finditer(text, start + 1, end):
+        position = match.start()
+    return position
+
+
+def _first_boundary(pattern, text, start):
+    """返回start之后第一个切分位置，没有时返回None"""
+    match = pattern.search(text, start + 1)
+    return match.start() if match else None
+
+
+def split_text(text, max_length):
+    """
+    在安全边界处把文本切成若干段，各段分词结果拼接后与整体分词一致
+
+    每段尽量不超过max_length字符：优先在句末标点后切分，其次在其他非词块字符后切分；
+    超长且没有安全边界的片段保持完整，不强行切断。
+
+    Args:
+        text (str): 待切分文本
+        max_length (int): 每段的目标最大长度
+
+    Returns:
+        list: 文本片段列表，''.join(结果) == text
+    """
+    segments = []
+    start = 0
+    length = len(text)
+    while length - start > max_length:
+        limit = start + max_length + 1
+        cut = (_last_boundary(_SENTENCE_BOUNDARY, text, start, limit) or
+               _last_boundary(_BLOCK_BOUNDARY, text, start, limit) or
+               _first_boundary(_BLOCK_BOUNDARY, text, start))
+        if cut is None:
+            break
+        segments.append(text[start:cut])
+        start = cut
+    if start < length:
+        segments.append(text[start:])
+    return segments
+
+
+def split_sentences(text):
+    """
+    在每个句子边界（句末标点或换行之后）切分文本，各句分词结果拼接后与整体分词一致
+
+    与split_text不同，切分位置只取决于句子本身而不受长度合并影响：文档中修改一句，
+    其余句子的切分结果不变，适合作为句级缓存的单位。没有句子边界的长句保持完整。
+
+    Args:
+        text (str): 待切分文本
+
+    Returns:
+        list: 句子列表，''.join(结果) == text
+    """
+    sentences = []
+    start = 0
+    for match in _SENTENCE_BOUNDARY.finditer(text, 1):
+        sentences.append(text[start:match.start()])
+        start = match.start()
+    sentences.append(text[start:])
+    return sentences
+
+
+def iter_segments(chunks, max_length):
+    """
+    从增量到达的文本块中按句切分，适合流式处理
+
+    每收到一个文本块就输出缓冲区内已完整的句子；缓冲区超过max_length且没有句子边界时，
+    退而在其他安全边界切分；连安全边界都没有时在max_length处强制切分（仅此情况下
+    可能切断词语），以保证内存占用有上界。
+
+    Args:
+        chunks (iterable): 依次到达的文本块
+        max_length (int): 缓冲区的最大长度
+
+    Yields:
+        str: 文本片段，按顺序拼接等于全部输入
+    """
+    buffer = ''
+    for chunk in chunks:
+        if not chunk:
+            continue
+        buffer += chunk
+        cut = _last_boundary(_SENTENCE_BOUNDARY, buffer, 0, len(buffer))
+        if cut is not None:
+            yield from split_text(buffer[:cut], max_length)
+            buffer = buffer[cut:]
+        while len(buffer) > max_length:
+            cut = _last_boundary(_BLOCK_BOUNDARY, buffer, 0, max_length + 1) or max_length
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+    if buffer:
+        yield buffer
@@ -0,0 +1,211 @@
+"""
+多词典租户
+
+不同业务领域（法律、医疗、电商等）各自使用"主词典 + 领域用户词典"。TenantPool为每个租户
+按需创建独立的jieba.Tokenizer：首次使用时加载，总估算内存超过上限时按LRU卸载最久未用的租户，
+并记录每个租户的加载耗时、内存估算和命中次数。
+
+租户的缓存命名空间形如 "租户名@代数.指纹"，不同租户、不同词典版本的缓存互不影响。
+
+使用方法：
+from tenants import TenantPool
+"""
+
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from dictionary import build_tokenizer, dictionary_fingerprint
+
+
+def estimate_tokenizer_bytes(tokenizer):
+    """
+    估算分词器前缀词典占用的内存字节数（词条字符串、词频和字典本身）
+
+    Args:
+        tokenizer (jieba.Tokenizer): 已初始化的分词器
+
+    Returns:
+        int: 估算字节数
+    """
+    freq = tokenizer.FREQ
+    return sys.getsizeof(freq) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in freq.items())
+
+
+class _TenantEntry:
+    """单个租户的分词器及统计信息（卸载后统计信息保留）"""
+
+    __slots__ = ('tokenizer', 'namespace', 'memory_bytes', 'load_seconds', 'loaded_at',
+                 'last_used', 'hits', 'loads', 'evictions')
+
+    def __init__(self):
+        self.tokenizer = None
+        self.namespace = None
+        self.memory_bytes = 0
+        self.load_seconds = None
+        self.loaded_at = None
+        self.last_used = None
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    def to_dict(self):
+        return {
+            'loaded': self.tokenizer is not None,
+            'namespace': self.namespace,
+            'memory_bytes': self.memory_bytes,
+            'load_seconds': round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            'loaded_at': int(self.loaded_at) if self.loaded_at else None,
+            'last_used': int(self.last_used) if self.last_used else None,
+            'hits': self.hits,
+            'loads': self.loads,
+            'evictions': self.evictions
+        }
+
+
+class TenantPool:
+    """
+    按租户延迟加载、按LRU淘汰的分词器池
+
+    所有租户共用主词典（manager.dict_path）和预编译目录，各自叠加自己的用户词典。
+    max_bytes大于0时，已加载租户的估算内存总和超过上限就卸载最久未用的租户
+    （至少保留刚加载的一个）；正在处理的请求仍持有旧分词器的引用，不受卸载影响。
+    """
+
+    def __init__(self, manager, tenant_dicts, max_bytes=0):
+        """
+        Args:
+            manager (DictionaryManager): 默认词典管理器，提供主词典路径、预编译目录和词典代数
+            tenant_dicts (dict): 租户名 -> 用户词典路径
+            max_bytes (int): 已加载租户的内存上限（字节，0表示不限）
+        """
+        self.manager = manager
+        self.tenant_dicts = dict(tenant_dicts)
+        self.max_bytes = max_bytes
+        self._entries = {name: _TenantEntry() for name in self.tenant_dicts}
+        self._load_locks = {name: threading.Lock() for name in self.tenant_dicts}
+        self._loaded = OrderedDict()  # 已加载的租户名，按最近使用排序
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """注册租户加载完成后的回调 callback(租户名, 加载耗时秒数)"""
+        self._listeners.append(callback)
+
+    def names(self):
+        """已配置的租户名列表"""
+        return list(self.tenant_dicts)
+
+    def get(self, name):
+        """
+        取得租户的分词器和缓存命名空间，未加载时同步加载
+
+        Args:
+            name (str): 租户名
+
+        Returns:
+            tuple: (jieba.Tokenizer, 命名空间字符串)
+
+        Raises:
+            ValueError: 租户不存在
+        """
+        entry = self._entries.get(name)
+        if entry is None:
+            raise ValueError(f"未知的词典: {name}")
+
+        current = self._touch(name, entry)
+        if current is not None:
+            return current
+
+        # 同一租户只加载一次，其他租户的请求不受影响
+        with self._load_locks[name]:
+            current = self._touch(name, entry)
+            if current is not None:
+                return current
+            return self._load(name, entry)
+
+    def _touch(self, name, entry):
+        with self._lock:
+            if entry.tokenizer is None:
+                return None
+            self._loaded.move_to_end(name)
+            entry.hits += 1
+            entry.last_used = time.time()
+            return entry.tokenizer, entry.namespace
+
+    def _load(self, name, entry):
+        user_dict_path = self.tenant_dicts[name]
+        generation = self.manager.generation
+        fingerprint = dictionary_fingerprint(self.manager.dict_path, user_dict_path)
+        start_time = time.time()
+        tokenizer = build_tokenizer(self.manager.dict_path, user_dict_path, cache_dir=self.manager.cache_dir)
+        load_seconds = time.time() - start_time
+        memory_bytes = estimate_tokenizer_bytes(tokenizer)
+        namespace = f"{name}@{generation}.{fingerprint[:8]}"
+
+        with self._lock:
+            entry.tokenizer = tokenizer
+            entry.namespace = namespace
+            entry.memory_bytes = memory_bytes
+            entry.load_seconds = load_seconds
+            entry.loaded_at = entry.last_used = time.time()
+            entry.loads += 1
+            entry.hits += 1
+            self._loaded[name] = True
+            self._bytes += memory_bytes
+            evicted = self._evict_locked()
+
+        logging.info(f"已加载租户词典 {name}: {user_dict_path}, 版本: {namespace}, "
+                     f"耗时: {load_seconds:.3f}s, 估算内存: {memory_bytes / 1048576:.1f}MB")
+        if evicted:
+            logging.info(f"租户词典内存超过上限，已卸载: {', '.join(evicted)}")
+        for callback in self._listeners:
+            try:
+                callback(name, load_seconds)
+            except Exception as e:
+                logging.warning(f"租户加载回调执行失败: {e}")
+        return tokenizer, namespace
+
+    def _unload_locked(self, name):
+        entry = self._entries[name]
+        del self._loaded[name]
+        self._bytes -= entry.memory_bytes
+        entry.tokenizer = None
+
+    def _evict_locked(self):
+        evicted = []
+        while self.max_bytes and self._bytes > self.max_bytes and len(self._loaded) > 1:
+            name = next(iter(self._loaded))
+            self._unload_locked(name)
+            self._entries[name].evictions += 1
+            evicted.append(name)
+        return evicted
+
+    def is_current(self, namespace):
+        """命名空间是否属于当前词典代数（词典重载后旧代数的租户缓存不再写入）"""
+        generation = namespace.rpartition('@')[2].partition('.')[0]
+        return generation == str(self.manager.generation)
+
+    def clear(self):
+        """卸载所有租户（词典重载后调用，下次使用时按新版本重新加载）"""
+        with self._lock:
+            for name in list(self._loaded):
+                self._unload_locked(name)
+
+    def stats(self):
+        """
+        获取租户池统计信息
+
+        Returns:
+            dict: 内存占用、上限及每个租户的加载耗时、内存估算和命中次数
+        """
+        with self._lock:
+            return {
+                'memory_bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'loaded': list(self._loaded),
+                'tenants': {name: entry.to_dict() for name, entry in self._entries.items()}
+            }
@@ -0,0 +1,158 @@
+"""
+词频统计
+
+按停用词、最小长度和词性过滤分词结果并累计词频。进程之间只传递计数表而不是词语列表；
+计数表可以合并：各进程（或各节点）分别统计后合并，结果与一次统计全部文本相同。
+
+使用方法：
+from terms import TermFilter, TermCounter, load_stopwords
+"""
+
+import heapq
+import logging
+from collections import Counter
+
+
+def load_stopwords(path):
+    """
+    读取停用词文件（每行一个词，忽略空行和#开头的注释行）
+
+    Args:
+        path (str): 停用词文件路径，为空时返回空集合
+
+    Returns:
+        frozenset: 停用词集合
+    """
+    if not path:
+        return frozenset()
+    words = set()
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            word = line.strip()
+            if word and not word.startswith('#'):
+                words.add(word)
+    logging.info(f"已加载停用词 {len(words)} 个: {path}")
+    return frozenset(words)
+
+
+class TermFilter:
+    """
+    词频统计的过滤条件
+
+    Args:
+        stopwords (iterable): 不计入统计的词
+        min_length (int): 词的最小字符数
+        pos (iterable): 只统计词性以这些前缀开头的词（如 n 包括 nr、ns、nz），None表示不按词性过滤
+    """
+
+    __slots__ = ('stopwords', 'min_length', 'pos')
+
+    def __init__(self, stopwords=(), min_length=1, pos=None):
+        self.stopwords = frozenset(stopwords)
+        self.min_length = min_length
+        self.pos = tuple(pos) if pos else None
+
+    def accepts(self, word, flag=None):
+        """词（及其词性）是否计入统计"""
+        if len(word) < self.min_length or word in self.stopwords:
+            return False
+        return self.pos is None or (flag is not None and flag.startswith(self.pos))
+
+
+def _rank_key(item):
+    # 按词频降序，词频相同时按词排序，合并顺序不同时结果也一致
+    return -item[1], item[0]
+
+
+class TermCounter:
+    """
+    可合并的词频计数
+
+    Attributes:
+        counts (Counter): 词 -> 出现次数
+        documents (int): 统计的文本数
+        tokens (int): 计入统计的词的总数
+        complete (bool): 是否为完整的计数表（由截断的前K个词恢复时为False，合并结果不再精确）
+    """
+
+    __slots__ = ('counts', 'documents', 'tokens', 'complete')
+
+    def __init__(self):
+        self.counts = Counter()
+        self.documents = 0
+        self.tokens = 0
+        self.complete = True
+
+    def add(self, words, weight=1):
+        """
+        累计一篇文本的词
+
+        Args:
+            words (list): 已过滤的词
+            weight (int): 相同文本出现的次数
+        """
+        if weight == 1:
+            self.counts.update(words)
+        else:
+            counts = self.counts
+            for word in words:
+                counts[word] += weight
+        self.documents += weight
+        self.tokens += len(words) * weight
+
+    def merge(self, other):
+        """合并另一个计数，返回self"""
+        self.counts.update(other.counts)
+        self.documents += other.documents
+        self.tokens += other.tokens
+        self.complete = self.complete and other.complete
+        return self
+
+    def top(self, k=0):
+        """
+        Args:
+            k (int): 返回的词数，0表示全部
+
+        Returns:
+            list: [(词, 词频), ...]，按词频降序
+        """
+        if k and k < len(self.counts):
+            return heapq.nsmallest(k, self.counts.items(), key=_rank_key)
+        return sorted(self.counts.items(), key=_rank_key)
+
+    def to_dict(self, top_k=0):
+        """
+        转换为可序列化的结果
+
+        Args:
+            top_k (int): 只返回词频最高的K个词，0表示完整的计数表
+
+        Returns:
+            dict: documents、tokens、unique、complete 和 terms（[[词, 词频], ...]）
+        """
+        terms = self.top(top_k)
+        return {
+            'documents': self.documents,
+            'tokens': self.tokens,
+            'unique': len(self.counts),
+            'complete': self.complete and len(terms) == len(self.counts),
+            'terms': [[word, count] for word, count in terms]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        由to_dict的结果恢复（用于合并其他进程或节点的统计）
+
+        Raises:
+            ValueError: 格式不正确
+        """
+        try:
+            counter = cls()
+            counter.counts.update({word: int(count) for word, count in data['terms']})
+            counter.documents = int(data['documents'])
+            counter.tokens = int(data['tokens'])
+            counter.complete = bool(data.get('complete', True))
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"词频统计结果格式不正确: {e}")
+        return counter
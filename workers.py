@@ -0,0 +1,114 @@
+"""
+分词进程池管理
+
+为批量分词等CPU密集型任务提供可配置的进程池。进程池在首次使用时按需创建，
+并记录创建时的进程号，gunicorn fork出的worker会各自重建自己的进程池。
+
+使用方法：
+from workers import setup_workers, get_pool, reset_pool, retire_pool
+"""
+
+import atexit
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import jieba
+
+from dictionary import build_tokenizer
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_pool_processes = 0
+_dict_path = None
+_user_dict_path = None
+_dict_cache_dir = None
+
+
+def _init_worker(dict_path, user_dict_path, cache_dir):
+    """子进程初始化：加载与主进程一致的jieba词典"""
+    if jieba.dt.initialized:
+        # fork方式启动时已继承父进程加载好的词典
+        return
+    build_tokenizer(dict_path, user_dict_path, cache_dir=cache_dir, tokenizer=jieba.dt)
+
+
+def setup_workers(app_config):
+    """根据配置初始化进程池参数（进程池本身延迟创建）"""
+    global _pool_processes, _dict_path, _user_dict_path, _dict_cache_dir
+    shutdown_pool()
+    _pool_processes = app_config.BATCH_WORKER_PROCESSES
+    _dict_path = app_config.JIEBA_DICT_PATH
+    _user_dict_path = app_config.JIEBA_USER_DICT_PATH
+    _dict_cache_dir = app_config.JIEBA_CACHE_DIR if app_config.JIEBA_PRECOMPILE else None
+    logging.info(f"分词进程池配置 - 进程数: {_pool_processes or '不启用'}")
+
+
+def pool_size():
+    """返回配置的进程数，0表示不使用进程池"""
+    return _pool_processes
+
+
+def get_pool():
+    """
+    获取当前进程的分词进程池
+
+    Returns:
+        ProcessPoolExecutor: 进程池；未启用时返回None
+    """
+    global _pool, _pool_pid
+    if _pool_processes <= 0:
+        return None
+
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            _pool = ProcessPoolExecutor(
+                max_workers=_pool_processes,
+                initializer=_init_worker,
+                initargs=(_dict_path, _user_dict_path, _dict_cache_dir)
+            )
+            _pool_pid = pid
+            logging.info(f"分词进程池已创建 (pid: {pid}, 进程数: {_pool_processes})")
+    return _pool
+
+
+def reset_pool():
+    """丢弃当前进程池（例如子进程异常退出后），下次使用时重建"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        pool, _pool, _pool_pid = _pool, None, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def retire_pool():
+    """
+    换用新进程池（例如词典热加载后），旧进程池在后台线程中执行完已提交的任务后再关闭
+
+    正在使用旧进程池的请求不会因任务被取消而失败；之后提交的任务由新进程池处理。
+    """
+    global _pool, _pool_pid
+    with _pool_lock:
+        pool, owner = _pool, _pool_pid
+        _pool, _pool_pid = None, None
+    if pool is not None and owner == os.getpid():
+        threading.Thread(target=pool.shutdown, kwargs={'wait': True}, name='retire-pool', daemon=True).start()
+
+
+def shutdown_pool():
+    """关闭本进程创建的进程池"""
+    global _pool, _pool_pid
+    with _pool_lock:
+        pool, owner = _pool, _pool_pid
+        _pool, _pool_pid = None, None
+    if pool is not None and owner == os.getpid():
+        pool.shutdown(wait=True)
+
+
+atexit.register(shutdown_pool)